@@ -0,0 +1,53 @@
+from dataclasses import asdict, dataclass
+from typing import Any, ClassVar, Dict, List, Optional, Union
+
+
+@dataclass
+class PlanReady:
+    """Plano pronto (ou vazio) antes da execução"""
+    plan: List[Dict[str, Any]]
+    seconds: float
+    type: ClassVar[str] = "plan_ready"
+
+
+@dataclass
+class StepStarted:
+    """Uma etapa do plano começou a executar"""
+    step_id: str
+    tool: str
+    description: str
+    type: ClassVar[str] = "step_started"
+
+
+@dataclass
+class StepFinished:
+    """Uma etapa do plano terminou"""
+    step_id: str
+    tool: str
+    seconds: float
+    ok: bool
+    type: ClassVar[str] = "step_finished"
+
+
+@dataclass
+class SynthesisDelta:
+    """Trecho da resposta final gerado pelo LLM"""
+    text: str
+    type: ClassVar[str] = "synthesis_delta"
+
+
+@dataclass
+class ResponseComplete:
+    """Resposta final completa"""
+    response: str
+    seconds: float
+    error: Optional[str] = None  # A solicitação falhou; `response` traz a mensagem para o usuário
+    type: ClassVar[str] = "response_complete"
+
+
+AgentEvent = Union[PlanReady, StepStarted, StepFinished, SynthesisDelta, ResponseComplete]
+
+
+def event_to_dict(event: AgentEvent) -> Dict[str, Any]:
+    """Serializa um evento para JSON (modo servidor)"""
+    return {"type": event.type, **asdict(event)}
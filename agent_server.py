@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import math
+import time
+import uuid
+import weakref
+
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from agent_events import AgentEvent, event_to_dict
+from groq_mcp_agent import GroqMcpAgent
+from llm_scheduler import set_deadline
+from tracing import tracer
+
+logger = logging.getLogger("mcp-groq-client")
+
+
+class ServerOverloaded(Exception):
+    """A fila de admissão está cheia"""
+
+
+class AdmissionController:
+    """Admissão limitada: até `max_concurrent` em execução e `max_queue` aguardando"""
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Reserva uma vaga; rejeita de imediato se a fila estiver cheia (backpressure)"""
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ServerOverloaded(f"{self.in_flight} em execução e {self.queued} na fila")
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+class AdmittedStream:
+    """Eventos de uma solicitação já admitida.
+
+    O lock da conversa e a vaga são devolvidos quando os eventos acabam,
+    falham ou o stream é fechado com `aclose` — inclusive se nenhum evento
+    chegou a ser pedido, caso em que o gerador nem começou e seu `finally`
+    não rodaria.
+    """
+
+    def __init__(self, events: AsyncIterator[AgentEvent], stack: AsyncExitStack):
+        self._events = events
+        self._stack = stack
+
+    def __aiter__(self) -> "AdmittedStream":
+        return self
+
+    async def __anext__(self) -> AgentEvent:
+        try:
+            return await self._events.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        try:
+            await self._events.aclose()
+        finally:
+            await self._stack.aclose()
+
+
+class AgentServer:
+    """Serve várias solicitações concorrentes sobre um único GroqMcpAgent.
+
+    Todas as solicitações compartilham os pools de sessões MCP e o cliente
+    Groq do agente; o histórico é isolado por `conversation_id` e solicitações
+    da mesma conversação são serializadas.
+    """
+
+    def __init__(
+        self,
+        agent: GroqMcpAgent,
+        max_concurrent: int = 8,
+        max_queue: int = 32,
+        request_timeout: float = 120.0,
+    ):
+        self.agent = agent
+        self.admission = AdmissionController(max_concurrent, max_queue)
+        self.request_timeout = request_timeout
+        self._conversation_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _conversation_lock(self, conversation_id: str) -> asyncio.Lock:
+        lock = self._conversation_locks.get(conversation_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._conversation_locks[conversation_id] = lock
+        return lock
+
+    async def handle(self, user_request: str, conversation_id: str, timeout: Optional[float] = None) -> str:
+        """Processa uma solicitação com admissão, isolamento e timeout.
+
+        O timeout cobre a espera na fila e a execução. Lança `ServerOverloaded`
+        ou `asyncio.TimeoutError`.
+        """
+        timeout = timeout or self.request_timeout
+        lock = self._conversation_lock(conversation_id)
+
+        async def run() -> str:
+            # Chamadas ao LLM que não caberiam no prazo falham logo em vez de esperar na fila
+            set_deadline(asyncio.get_running_loop().time() + timeout)
+            # Lock da conversa antes da vaga: solicitações enfileiradas na mesma conversa não ocupam vagas
+            async with lock:
+                async with self.admission.admit():
+                    return await self.agent.process_request(user_request, conversation_id)
+
+        return await asyncio.wait_for(run(), timeout=timeout)
+
+    async def open_stream(
+        self, user_request: str, conversation_id: str, timeout: Optional[float] = None
+    ) -> AdmittedStream:
+        """Versão em streaming de `handle`.
+
+        O lock da conversa e a admissão são obtidos antes de retornar o
+        stream, para que sobrecarga e timeout na fila ainda possam virar
+        503/504; depois disso, estourar o prazo encerra o stream. Quem chama
+        deve consumir o stream até o fim ou fechá-lo com `aclose` para
+        liberar o lock e a vaga.
+        """
+        timeout = timeout or self.request_timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        stack = AsyncExitStack()
+
+        async def enter():
+            # Mesma ordem de `handle`: a vaga só é ocupada por quem já tem a vez na conversa
+            await stack.enter_async_context(self._conversation_lock(conversation_id))
+            await stack.enter_async_context(self.admission.admit())
+
+        try:
+            await asyncio.wait_for(enter(), timeout=timeout)
+        except BaseException:
+            await stack.aclose()
+            raise
+
+        async def events() -> AsyncIterator[AgentEvent]:
+            set_deadline(deadline)
+            stream = self.agent.process_request_stream(user_request, conversation_id)
+            try:
+                while True:
+                    try:
+                        event = await asyncio.wait_for(stream.__anext__(), timeout=deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    yield event
+            finally:
+                await stream.aclose()
+
+        return AdmittedStream(events(), stack)
+
+    # Endpoints HTTP
+
+    async def _read_body(self, request: Request) -> Tuple[Optional[Dict[str, Any]], Optional[JSONResponse]]:
+        """Valida o corpo JSON comum aos endpoints de solicitação"""
+        try:
+            body = await request.json()
+        except ValueError:
+            return None, JSONResponse({"error": "JSON inválido"}, status_code=400)
+
+        user_request = body.get("request") if isinstance(body, dict) else None
+        if not isinstance(user_request, str) or not user_request.strip():
+            return None, JSONResponse({"error": "Campo 'request' é obrigatório"}, status_code=400)
+
+        # O cliente pode pedir um prazo menor, nunca maior que o do operador
+        timeout = body.get("timeout")
+        if timeout is not None:
+            if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not 0 < timeout < math.inf:
+                return None, JSONResponse({"error": "Campo 'timeout' deve ser um número positivo"}, status_code=400)
+            timeout = min(float(timeout), self.request_timeout)
+
+        return {
+            "request": user_request.strip(),
+            "conversation_id": str(body.get("conversation_id") or uuid.uuid4().hex),
+            "timeout": timeout,
+        }, None
+
+    @staticmethod
+    def _overloaded(error: ServerOverloaded) -> JSONResponse:
+        logger.warning(f"Solicitação rejeitada: {error}")
+        return JSONResponse({"error": "Servidor sobrecarregado"}, status_code=503, headers={"Retry-After": "1"})
+
+    @staticmethod
+    def _timed_out(conversation_id: str) -> JSONResponse:
+        return JSONResponse({"error": "Tempo limite excedido", "conversation_id": conversation_id}, status_code=504)
+
+    async def _post_request(self, request: Request) -> JSONResponse:
+        body, error = await self._read_body(request)
+        if error:
+            return error
+
+        conversation_id = body["conversation_id"]
+        start = time.perf_counter()
+        try:
+            response = await self.handle(body["request"], conversation_id, body["timeout"])
+        except ServerOverloaded as e:
+            return self._overloaded(e)
+        except asyncio.TimeoutError:
+            return self._timed_out(conversation_id)
+
+        return JSONResponse({
+            "conversation_id": conversation_id,
+            "response": response,
+            "seconds": round(time.perf_counter() - start, 3),
+        })
+
+    async def _post_request_stream(self, request: Request):
+        """Como /v1/requests, mas responde com eventos NDJSON à medida que acontecem"""
+        body, error = await self._read_body(request)
+        if error:
+            return error
+
+        conversation_id = body["conversation_id"]
+        try:
+            events = await self.open_stream(body["request"], conversation_id, body["timeout"])
+        except ServerOverloaded as e:
+            return self._overloaded(e)
+        except asyncio.TimeoutError:
+            return self._timed_out(conversation_id)
+
+        async def body_lines():
+            try:
+                yield json.dumps({"type": "conversation", "conversation_id": conversation_id}) + "\n"
+                async for event in events:
+                    yield json.dumps(event_to_dict(event), ensure_ascii=False) + "\n"
+            except asyncio.TimeoutError:
+                yield json.dumps({"type": "error", "error": "Tempo limite excedido"}) + "\n"
+            finally:
+                # Cliente desconectado antes do primeiro evento também devolve a vaga
+                await events.aclose()
+
+        return StreamingResponse(body_lines(), media_type="application/x-ndjson")
+
+    async def _delete_conversation(self, request: Request) -> JSONResponse:
+        conversation_id = request.path_params["conversation_id"]
+        self.agent.end_conversation(conversation_id)
+        return JSONResponse({"conversation_id": conversation_id, "deleted": True})
+
+    async def _health(self, request: Request) -> JSONResponse:
+        return JSONResponse({
+            "status": "ok",
+            "in_flight": self.admission.in_flight,
+            "queued": self.admission.queued,
+            "rejected": self.admission.rejected,
+            "tools": len(self.agent.get_available_tools()),
+            "conversations": len(self.agent.memory),
+            "tool_cache": self.agent.get_cache_stats(),
+            "plan_cache": self.agent.plan_cache.stats if self.agent.plan_cache else None,
+            "llm": {**self.agent.llm_scheduler.stats, "queued": self.agent.llm_scheduler.queue_depth},
+            "servers": self.agent.get_server_health(),
+            "latency_ms": tracer.summary(),
+        })
+
+    @asynccontextmanager
+    async def _lifespan(self, app: Starlette) -> AsyncIterator[None]:
+        await self.agent.connect_servers()
+        try:
+            yield
+        finally:
+            await self.agent.close()
+
+    def build_app(self) -> Starlette:
+        """Cria a aplicação ASGI do modo servidor"""
+        return Starlette(
+            routes=[
+                Route("/v1/requests", self._post_request, methods=["POST"]),
+                Route("/v1/requests/stream", self._post_request_stream, methods=["POST"]),
+                Route("/v1/conversations/{conversation_id}", self._delete_conversation, methods=["DELETE"]),
+                Route("/health", self._health, methods=["GET"]),
+            ],
+            lifespan=self._lifespan,
+        )
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, uds: Optional[str] = None):
+        """Inicia o servidor HTTP local (TCP ou Unix socket)"""
+        config = uvicorn.Config(self.build_app(), host=host, port=port, uds=uds, log_level="info")
+        endpoint = uds or f"http://{host}:{port}"
+        logger.info(f"Servidor do Agent ouvindo em {endpoint}")
+        await uvicorn.Server(config).serve()
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Set, TextIO
+
+from agent_events import ResponseComplete
+from groq_mcp_agent import GroqMcpAgent
+
+logger = logging.getLogger("mcp-groq-client")
+
+# Campos aceitos na entrada, em ordem de preferência
+ID_FIELDS = ("id", "request_id")
+TEXT_FIELDS = ("request", "prompt", "body", "text")
+
+
+@dataclass
+class BatchItem:
+    """Uma linha da entrada"""
+    id: str
+    line: int
+    text: Optional[str]
+    error: Optional[str] = None
+
+
+def parse_line(line: str, line_no: int) -> BatchItem:
+    """Aceita uma string JSON ou um objeto com um dos campos de TEXT_FIELDS"""
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        return BatchItem(id=f"line-{line_no}", line=line_no, text=None, error=f"JSON inválido: {e}")
+
+    if isinstance(data, str):
+        return BatchItem(id=f"line-{line_no}", line=line_no, text=data)
+    if not isinstance(data, dict):
+        return BatchItem(id=f"line-{line_no}", line=line_no, text=None, error="Linha não é objeto nem string")
+
+    item_id = next((str(data[f]) for f in ID_FIELDS if data.get(f) is not None), f"line-{line_no}")
+    text = next((data[f] for f in TEXT_FIELDS if isinstance(data.get(f), str) and data[f].strip()), None)
+    if text is None:
+        return BatchItem(id=item_id, line=line_no, text=None, error=f"Nenhum dos campos {TEXT_FIELDS} encontrado")
+    if data.get("title") and text == data.get("body"):
+        text = f"{data['title']}\n\n{text}"
+    return BatchItem(id=item_id, line=line_no, text=text)
+
+
+def read_items(path: str) -> Iterator[BatchItem]:
+    """Lê a entrada linha a linha (memória constante)"""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                yield parse_line(line, line_no)
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Ids já concluídos com sucesso no arquivo de saída (linhas truncadas são ignoradas)"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and "id" in record and "error" not in record:
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """Processa um arquivo JSONL de solicitações num único GroqMcpAgent.
+
+    A entrada é lida em streaming e no máximo `concurrency` solicitações ficam
+    em voo; cada resultado é gravado (e descarregado) na saída assim que fica
+    pronto, então a memória não cresce com o tamanho do arquivo. Solicitações
+    idênticas (a menos de espaços) são executadas uma vez só; chamadas de
+    ferramentas repetidas entre solicitações são colapsadas pelo cache de
+    ferramentas do agent. O próprio arquivo de saída serve de checkpoint:
+    com `resume=True`, ids já concluídos são pulados.
+    """
+
+    def __init__(
+        self,
+        agent: GroqMcpAgent,
+        concurrency: int = 8,
+        dedupe_entries: int = 10000,
+        tool_cache_ttl: Optional[float] = None,
+    ):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.dedupe_entries = dedupe_entries
+        if tool_cache_ttl is not None:
+            # Um lote costuma caber numa janela só: reaproveita leituras pelo lote inteiro
+            agent.tool_cache.default_ttl = tool_cache_ttl
+            agent.tool_cache.ttls = {pattern: tool_cache_ttl for pattern in agent.tool_cache.ttls}
+        self._completed: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._output: Optional[TextIO] = None
+        self.stats = {"processed": 0, "deduplicated": 0, "skipped": 0, "errors": 0}
+
+    async def run(self, input_path: str, output_path: str, resume: bool = False) -> Dict[str, Any]:
+        done = load_checkpoint(output_path) if resume else set()
+        if done:
+            logger.info(f"Retomando lote: {len(done)} solicitações já concluídas")
+
+        start = time.perf_counter()
+        slots = asyncio.Semaphore(self.concurrency)
+        pending: Set[asyncio.Task] = set()
+
+        self._output = self._open_output(output_path, resume)
+        try:
+            for item in read_items(input_path):
+                if item.id in done:
+                    self.stats["skipped"] += 1
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(self._process(item))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: slots.release())
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            self._output.close()
+            self._output = None
+
+        return {**self.stats, "seconds": time.perf_counter() - start}
+
+    @staticmethod
+    def _open_output(path: str, resume: bool) -> TextIO:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        output = open(path, "a" if resume else "w", encoding="utf-8")
+        # Uma queda no meio da escrita deixa a última linha sem quebra
+        if resume and output.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    output.write("\n")
+        return output
+
+    def _write(self, record: Dict[str, Any]):
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+
+    async def _process(self, item: BatchItem):
+        record: Dict[str, Any] = {"id": item.id, "line": item.line}
+        if item.error:
+            self.stats["errors"] += 1
+            self._write({**record, "error": item.error})
+            return
+
+        record["request"] = item.text
+        # Só espaços são ignorados: caixa e acentos podem mudar o sentido (caminhos, ids)
+        key = hashlib.sha256(" ".join(item.text.split()).encode()).hexdigest()
+        start = time.perf_counter()
+        try:
+            original = await self._resolve(key, item)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Solicitação {item.id} falhou: {e}")
+            self._write({**record, "error": str(e) or type(e).__name__})
+            return
+
+        record["response"] = original["response"]
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        if original["id"] != item.id:
+            self.stats["deduplicated"] += 1
+            record["deduplicated_from"] = original["id"]
+        else:
+            self.stats["processed"] += 1
+        self._write(record)
+
+    async def _resolve(self, key: str, item: BatchItem) -> Dict[str, Any]:
+        """Resultado da primeira solicitação equivalente (executa se for a primeira)"""
+        if key in self._completed:
+            self._completed.move_to_end(key)
+            return self._completed[key]
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        conversation_id = f"batch-{item.id}"
+        try:
+            response, error = "", None
+            async for event in self.agent.process_request_stream(item.text, conversation_id):
+                if isinstance(event, ResponseComplete):
+                    response, error = event.response, event.error
+            if error:
+                # Sem exceção, a falha seria gravada como resposta e o --resume não a repetiria
+                raise RuntimeError(error)
+            result = {"id": item.id, "response": response}
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            # Evita o aviso de exceção não recuperada quando ninguém mais espera
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self.agent.end_conversation(conversation_id)
+            if not future.done():
+                future.cancel()
+
+        self._completed[key] = result
+        if len(self._completed) > self.dedupe_entries:
+            self._completed.popitem(last=False)
+        return result
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Servidor MCP sintético (stdio, SSE ou streamable HTTP) para o benchmark offline
+Latência e tamanho de payload das ferramentas configuráveis por argumento
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+
+from mcp.server.fastmcp import FastMCP
+from mcp.types import ToolAnnotations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor MCP sintético para benchmark")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latência de cada chamada de ferramenta")
+    parser.add_argument("--payload-bytes", type=int, default=2048, help="Tamanho da resposta de fetch_data")
+    parser.add_argument("--slow-every", type=int, default=0, help="A cada N chamadas, uma é lenta (cauda de latência)")
+    parser.add_argument("--slow-ms", type=float, default=1000.0, help="Latência das chamadas lentas")
+    parser.add_argument("--transport", choices=["stdio", "sse", "streamable-http"], default="stdio")
+    parser.add_argument("--port", type=int, default=8931, help="Porta HTTP (transports sse/streamable-http)")
+    return parser.parse_args()
+
+
+def make_payload(key: str, size: int) -> str:
+    """Texto determinístico de `size` bytes derivado de `key`"""
+    seed = hashlib.sha256(key.encode()).hexdigest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+def build_server(
+    latency_ms: float, payload_bytes: int, port: int = 8931, slow_every: int = 0, slow_ms: float = 1000.0
+) -> FastMCP:
+    server = FastMCP("bench", log_level="WARNING", port=port)
+    calls = itertools.count(1)
+
+    async def simulate_latency():
+        slow = slow_every and next(calls) % slow_every == 0
+        await asyncio.sleep((slow_ms if slow else latency_ms) / 1000)
+
+    @server.tool(annotations=ToolAnnotations(readOnlyHint=True))
+    async def fetch_data(key: str) -> str:
+        """Fetch the record stored under a key"""
+        await simulate_latency()
+        return make_payload(key, payload_bytes)
+
+    @server.tool(annotations=ToolAnnotations(readOnlyHint=True))
+    async def combine(parts: str) -> str:
+        """Combine previously fetched records into a digest"""
+        await simulate_latency()
+        return f"digest:{hashlib.sha256(parts.encode()).hexdigest()} ({len(parts)} bytes)"
+
+    return server
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build_server(args.latency_ms, args.payload_bytes, args.port, args.slow_every, args.slow_ms).run(args.transport)
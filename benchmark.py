@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline do Agent (sem Groq nem Brave)
+Roda process_request de ponta a ponta contra um servidor MCP sintético e um LLM falso
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from typing import Any, Dict, List, Optional
+
+
+from agent_events import ResponseComplete
+from catalog_snapshot import CatalogSnapshot
+from fake_llm import FakeChatCompletions, make_fake_groq_client
+from groq_mcp_agent import GroqMcpAgent
+from mcp_server import McpServer
+from tracing import format_summary, tracer
+
+logger = logging.getLogger("mcp-groq-client")
+
+BENCH_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_mcp_server.py")
+
+# Solicitações enviadas ao agent em cada carga de trabalho
+WORKLOADS = {
+    "fan-out": "Busque e combine os registros do lote {i}",
+    "single": "Obtenha o registro da chave record-{i}",
+}
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do Agent MCP")
+    parser.add_argument("--requests", type=int, default=50, help="Solicitações medidas")
+    parser.add_argument("--warmup", type=int, default=5, help="Solicitações de aquecimento (não medidas)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Solicitações simultâneas")
+    parser.add_argument("--fan-out", type=int, default=3, help="Etapas paralelas por plano")
+    parser.add_argument("--tool-latency-ms", type=float, default=20.0)
+    parser.add_argument("--payload-bytes", type=int, default=2048)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--response-words", type=int, default=60)
+    parser.add_argument("--pool-size", type=int, default=2, help="Sessões MCP do servidor sintético")
+    parser.add_argument("--transport", choices=["stdio", "sse", "streamable-http"], default="stdio",
+                        help="Como falar com o servidor sintético (sse/http sobe um processo compartilhado)")
+    parser.add_argument("--port", type=int, default=8931, help="Porta do servidor sintético remoto")
+    parser.add_argument("--requests-per-session", type=int, help="Requisições em voo por sessão MCP")
+    parser.add_argument("--mode", choices=["plan", "tools"], default="plan", help="Modo de execução do agent")
+    parser.add_argument("--no-speculation", action="store_true", help="Desliga a execução especulativa do plano")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="fan-out",
+                        help="fan-out: buscas + combinação (planner pesado); single: busca de um registro")
+    parser.add_argument("--no-router", action="store_true", help="Desliga o roteamento para o planner rápido")
+    parser.add_argument("--lazy-start", metavar="SNAPSHOT",
+                        help="Startup preguiçoso com snapshot do catálogo neste arquivo (padrão: inicia e espera o servidor)")
+    parser.add_argument("--llm-rpm", type=int, help="Limite de requisições por minuto do LLM falso (429 ao exceder)")
+    parser.add_argument("--llm-tpm", type=int, help="Limite de tokens por minuto do LLM falso (429 ao exceder)")
+    parser.add_argument("--tool-slow-every", type=int, default=0, help="A cada N chamadas de ferramenta, uma é lenta")
+    parser.add_argument("--tool-slow-ms", type=float, default=1000.0, help="Latência das chamadas lentas")
+    parser.add_argument("--hedge", action="store_true", help="Duplica chamadas lentas em outra sessão do pool")
+    parser.add_argument("--plan-cache", action="store_true", help="Mantém o cache de planos ligado")
+    parser.add_argument("--output", default="benchmark_results.json", help="Arquivo JSON de resultados")
+    parser.add_argument("--compare", help="Resultados anteriores para comparar")
+    parser.add_argument("--max-regression", type=float,
+                        help="Falha (código 1) se req/s cair ou p95 subir mais que este percentual")
+    return parser.parse_args(argv)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Pico de memória residente (MB) do processo e dos filhos já encerrados"""
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def build_agent(args, backend: FakeChatCompletions) -> GroqMcpAgent:
+    agent = GroqMcpAgent(groq_client=make_fake_groq_client(backend), llm_concurrency=max(8, args.concurrency * 2))
+    agent.execution_mode = args.mode
+    agent.speculative_execution = not args.no_speculation
+    if args.no_router:
+        agent.plan_router = None
+    if not args.plan_cache:
+        agent.plan_cache.close()
+        agent.plan_cache = None
+    agent.lazy_servers = bool(args.lazy_start)
+    agent.catalog_snapshot = CatalogSnapshot(args.lazy_start) if args.lazy_start else None
+    if args.transport == "stdio":
+        agent.add_server(McpServer.stdio(
+            "bench",
+            command=sys.executable,
+            args=[BENCH_SERVER, *server_args(args)],
+            pool_size=args.pool_size,
+            requests_per_session=args.requests_per_session,
+            hedge=args.hedge,
+        ))
+    else:
+        path = "/sse" if args.transport == "sse" else "/mcp"
+        agent.add_server(McpServer(
+            name="bench",
+            transport=args.transport,
+            url=f"http://127.0.0.1:{args.port}{path}",
+            pool_size=args.pool_size,
+            requests_per_session=args.requests_per_session,
+            hedge=args.hedge,
+        ))
+    return agent
+
+
+def server_args(args) -> List[str]:
+    return [
+        "--latency-ms", str(args.tool_latency_ms), "--payload-bytes", str(args.payload_bytes),
+        "--slow-every", str(args.tool_slow_every), "--slow-ms", str(args.tool_slow_ms),
+    ]
+
+
+def start_remote_server(args, timeout: float = 30.0) -> subprocess.Popen:
+    """Sobe o servidor sintético em SSE/HTTP e espera a porta aceitar conexões"""
+    process = subprocess.Popen(
+        [sys.executable, BENCH_SERVER, *server_args(args), "--transport", args.transport, "--port", str(args.port)],
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Servidor sintético encerrou com código {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", args.port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Servidor sintético não abriu a porta {args.port} em {timeout:.0f}s")
+
+
+async def run_requests(agent: GroqMcpAgent, count: int, concurrency: int, prefix: str, workload: str) -> int:
+    """Executa `count` solicitações com até `concurrency` simultâneas; retorna quantas falharam"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(count):
+        queue.put_nowait(i)
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            conversation_id = f"{prefix}-{i}"
+            error = None
+            try:
+                # O agent devolve a falha no evento final em vez de lançar a exceção
+                async for event in agent.process_request_stream(WORKLOADS[workload].format(i=i), conversation_id):
+                    if isinstance(event, ResponseComplete):
+                        error = event.error
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            finally:
+                agent.end_conversation(conversation_id)
+            if error:
+                errors += 1
+                logger.error(f"Solicitação {conversation_id} falhou: {error}")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return errors
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    backend = FakeChatCompletions(
+        fan_out=args.fan_out,
+        latency_ms=args.llm_latency_ms,
+        response_words=args.response_words,
+        rate_limit_rpm=args.llm_rpm,
+        rate_limit_tpm=args.llm_tpm,
+    )
+    remote = start_remote_server(args) if args.transport != "stdio" else None
+    agent = build_agent(args, backend)
+    try:
+        startup = time.perf_counter()
+        await agent.connect_servers()
+        startup_seconds = time.perf_counter() - startup
+        if agent.startup_report["bench"]["status"] not in ("ok", "snapshot", "starting"):
+            raise RuntimeError(f"Servidor sintético não iniciou: {agent.startup_report['bench']['error']}")
+
+        await run_requests(agent, args.warmup, args.concurrency, "warmup", args.workload)
+        tracer.recent.clear()
+
+        start = time.perf_counter()
+        errors = await run_requests(agent, args.requests, args.concurrency, "bench", args.workload)
+        wall_seconds = time.perf_counter() - start
+        stages = tracer.summary()
+        llm = {**agent.llm_scheduler.stats, "rejected_429": backend.rate_limited}
+        servers = agent.get_server_health()
+    finally:
+        await agent.close()
+        if remote:
+            remote.terminate()
+            remote.wait()
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "fan_out": args.fan_out,
+            "tool_latency_ms": args.tool_latency_ms,
+            "payload_bytes": args.payload_bytes,
+            "llm_latency_ms": args.llm_latency_ms,
+            "response_words": args.response_words,
+            "pool_size": args.pool_size,
+            "transport": args.transport,
+            "requests_per_session": args.requests_per_session,
+            "mode": args.mode,
+            "speculation": not args.no_speculation,
+            "workload": args.workload,
+            "router": not args.no_router,
+            "lazy_start": bool(args.lazy_start),
+            "plan_cache": args.plan_cache,
+            "llm_rpm": args.llm_rpm,
+            "llm_tpm": args.llm_tpm,
+            "tool_slow_every": args.tool_slow_every,
+            "hedge": args.hedge,
+        },
+        "startup_seconds": startup_seconds,
+        "wall_seconds": wall_seconds,
+        "errors": errors,
+        "requests_per_second": args.requests / wall_seconds if wall_seconds else 0.0,
+        "stages": stages,
+        "llm": llm,
+        "servers": servers,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Linhas de comparação por métrica (variação em %)"""
+    def delta(new: float, old: float) -> float:
+        return (new - old) / old * 100 if old else 0.0
+
+    lines = [f"Comparação com {baseline.get('revision') or 'base'} ({baseline.get('timestamp', '?')}):"]
+    rps = delta(current["requests_per_second"], baseline["requests_per_second"])
+    lines.append(f"  req/s: {baseline['requests_per_second']:.2f} -> {current['requests_per_second']:.2f} ({rps:+.1f}%)")
+    for name, stats in current["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        lines.append(
+            f"  {name:<20} p50 {old['p50']:8.1f} -> {stats['p50']:8.1f} ({delta(stats['p50'], old['p50']):+.1f}%)"
+            f"   p95 {old['p95']:8.1f} -> {stats['p95']:8.1f} ({delta(stats['p95'], old['p95']):+.1f}%)"
+        )
+    return lines
+
+
+def regressions(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    found = []
+    old_rps = baseline["requests_per_second"]
+    if old_rps and (old_rps - current["requests_per_second"]) / old_rps * 100 > threshold:
+        found.append("requests_per_second")
+    for name, stats in current["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old and old["p95"] and (stats["p95"] - old["p95"]) / old["p95"] * 100 > threshold:
+            found.append(f"{name}.p95")
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    for name in ("mcp-groq-client", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = asyncio.run(run_benchmark(args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print(f"Solicitações: {args.requests} ({results['errors']} com erro), concorrência {args.concurrency}")
+    print(f"Startup: {results['startup_seconds']:.2f}s | Throughput: {results['requests_per_second']:.2f} req/s")
+    print(f"Pico de RSS: {results['peak_rss_mb']['self']:.1f} MB (agent), "
+          f"{results['peak_rss_mb']['children']:.1f} MB (servidores encerrados)")
+    print(f"LLM: {results['llm']['calls']} chamadas, {results['llm']['retries']} retries, "
+          f"{results['llm']['rejected_429']} respostas 429")
+    bench = results["servers"]["bench"]
+    print(f"Servidor: circuito {bench['state']}, {bench['hedged']} hedges ({bench['hedge_wins']} venceram)")
+    print(format_summary(results["stages"]))
+    print(f"Resultados salvos em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        print("\n".join(compare(results, baseline)))
+        if args.max_regression is not None:
+            found = regressions(results, baseline, args.max_regression)
+            if found:
+                print(f"Regressões acima de {args.max_regression:.0f}%: {', '.join(found)}")
+                return 1
+    return 1 if results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
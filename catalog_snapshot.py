@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+
+from mcp_server import McpServer
+from plan_cache import catalog_hash
+from tool_info import ToolInfo
+
+logger = logging.getLogger("mcp-groq-client")
+
+SNAPSHOT_FORMAT = 1
+
+
+def server_fingerprint(server: McpServer) -> str:
+    """Hash da configuração que determina as ferramentas de um servidor.
+
+    Do ambiente entram só os nomes das variáveis: trocar uma chave de API não
+    muda as ferramentas e o valor não deve parar no disco.
+    """
+    params = server.params
+    config = {
+        "transport": server.transport,
+        "url": server.url,
+        "command": params.command if params is not None else server.command,
+        "args": list(params.args if params is not None else server.args),
+        "env": sorted((params.env if params is not None else server.env) or {}),
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class CatalogSnapshot:
+    """Catálogo de ferramentas descoberto, salvo em disco por servidor.
+
+    Cada servidor é gravado com o fingerprint da sua configuração e o hash do
+    seu catálogo; mudar comando, argumentos ou URL invalida a entrada. Com o
+    snapshot, o agent planeja sem iniciar os servidores (que sobem no primeiro
+    uso) e atualiza a entrada quando a descoberta real encontra outro catálogo.
+    """
+
+    def __init__(self, path: str, max_age: Optional[float] = None):
+        self.path = path
+        self.max_age = max_age  # Segundos até o snapshot de um servidor expirar (None: não expira)
+        self._servers: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def load(self, server: McpServer) -> Optional[Dict[str, ToolInfo]]:
+        """Ferramentas salvas do servidor, ou None se não houver snapshot válido"""
+        entry = self._entries().get(server.name)
+        if not entry or entry.get("fingerprint") != server_fingerprint(server):
+            return None
+        if self.max_age is not None and time.time() - entry.get("saved_at", 0) > self.max_age:
+            return None
+        try:
+            return {key: ToolInfo(**tool) for key, tool in entry["tools"].items()}
+        except (KeyError, TypeError) as e:
+            logger.warning(f"Ignorando snapshot corrompido de {server.name}: {e}")
+            return None
+
+    def save(self, server: McpServer, tools: Dict[str, ToolInfo]) -> bool:
+        """Grava o catálogo do servidor; retorna se ele mudou em relação ao snapshot"""
+        entries = self._entries()
+        fingerprint = server_fingerprint(server)
+        version = catalog_hash(tools)
+        previous = entries.get(server.name) or {}
+        changed = previous.get("fingerprint") != fingerprint or previous.get("catalog_hash") != version
+        entries[server.name] = {
+            "fingerprint": fingerprint,
+            "catalog_hash": version,
+            "saved_at": time.time(),
+            "tools": {key: asdict(tool) for key, tool in tools.items()},
+        }
+        self._write(entries)
+        return changed
+
+    def _entries(self) -> Dict[str, Dict[str, Any]]:
+        if self._servers is None:
+            self._servers = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        data = json.load(f)
+                    if data.get("format") == SNAPSHOT_FORMAT:
+                        self._servers = data.get("servers", {})
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignorando snapshot de ferramentas ilegível ({self.path}): {e}")
+        return self._servers
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"format": SNAPSHOT_FORMAT, "servers": entries}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Falha ao gravar snapshot de ferramentas: {e}")
@@ -0,0 +1,193 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from urllib.parse import quote
+
+from llm_scheduler import without_deadline
+from text_utils import estimate_tokens
+
+logger = logging.getLogger("mcp-groq-client")
+
+# (resumo anterior, mensagens a incorporar, max_tokens) -> novo resumo
+SummarizeFn = Callable[[str, str, int], Awaitable[str]]
+
+ROLE_LABELS = {"user": "Usuário", "assistant": "Assistente"}
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def format_messages(messages) -> str:
+    return "\n".join(f"{ROLE_LABELS.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+@dataclass
+class ConversationMemory:
+    """Estado de uma conversação: resumo acumulado + janela das mensagens recentes"""
+    conversation_id: str
+    summary: str = ""
+    window: Deque[Dict[str, str]] = field(default_factory=deque)
+    pending: Deque[Dict[str, str]] = field(default_factory=deque)  # Saíram da janela, ainda não resumidas
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "summary": self.summary,
+            "window": list(self.window),
+            "pending": list(self.pending),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationMemory":
+        return cls(
+            conversation_id=data["conversation_id"],
+            summary=data.get("summary", ""),
+            window=deque(data.get("window", [])),
+            pending=deque(data.get("pending", [])),
+        )
+
+
+class ConversationStore:
+    """Memória de conversações com tamanho constante por sessão.
+
+    Cada conversação guarda só as mensagens recentes que cabem em
+    `window_tokens`; as que saem da janela são incorporadas, em segundo plano,
+    a um resumo de até `summary_tokens`. Se o resumo atrasar, as mensagens
+    pendentes também têm teto (as mais antigas são descartadas). Com
+    `persist_dir`, cada conversação é gravada num arquivo JSON e recarregada
+    sob demanda; no máximo `max_conversations` ficam em memória (LRU).
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[SummarizeFn] = None,
+        window_tokens: int = 1500,
+        summary_tokens: int = 300,
+        persist_dir: Optional[str] = None,
+        max_conversations: int = 1000,
+    ):
+        self.summarize = summarize
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.persist_dir = persist_dir
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, ConversationMemory]" = OrderedDict()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def get(self, conversation_id: str) -> ConversationMemory:
+        memory = self._conversations.get(conversation_id)
+        if memory is None:
+            memory = self._load(conversation_id) or ConversationMemory(conversation_id)
+            self._conversations[conversation_id] = memory
+            self._evict()
+        else:
+            self._conversations.move_to_end(conversation_id)
+        return memory
+
+    def context(self, conversation_id: str) -> str:
+        """Contexto compacto para os prompts (vazio numa conversação nova)"""
+        memory = self.get(conversation_id)
+        parts = []
+        if memory.summary:
+            parts.append(f"Resumo da conversa até aqui: {memory.summary}")
+        if memory.window:
+            parts.append(f"Mensagens recentes:\n{format_messages(memory.window)}")
+        return "\n\n".join(parts)
+
+    def history(self, conversation_id: str) -> List[Dict[str, str]]:
+        return list(self.get(conversation_id).window)
+
+    def append(self, conversation_id: str, role: str, content: str):
+        memory = self.get(conversation_id)
+        memory.window.append({"role": role, "content": _clip(content, self.window_tokens)})
+
+        while len(memory.window) > 1 and self._tokens(memory.window) > self.window_tokens:
+            memory.pending.append(memory.window.popleft())
+        while memory.pending and self._tokens(memory.pending) > self.window_tokens:
+            dropped = memory.pending.popleft()
+            logger.debug(f"Mensagem descartada sem resumo em {conversation_id}: {dropped['content'][:80]}")
+
+        if memory.pending and self.summarize and (memory.task is None or memory.task.done()):
+            memory.task = asyncio.create_task(without_deadline(functools.partial(self._summarize_pending, memory)))
+        self._save(memory)
+
+    def end(self, conversation_id: str):
+        """Esquece a conversação (inclusive no disco)"""
+        memory = self._conversations.pop(conversation_id, None)
+        if memory and memory.task and not memory.task.done():
+            memory.task.cancel()
+        path = self._path(conversation_id)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    async def close(self):
+        """Interrompe resumos em andamento e grava o estado (pendências incluídas)"""
+        tasks = [m.task for m in self._conversations.values() if m.task and not m.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for memory in self._conversations.values():
+            self._save(memory)
+
+    async def _summarize_pending(self, memory: ConversationMemory):
+        while memory.pending:
+            batch = list(memory.pending)
+            try:
+                summary = await self.summarize(memory.summary, format_messages(batch), self.summary_tokens)
+            except Exception as e:
+                logger.warning(f"Falha ao resumir conversa {memory.conversation_id}: {e}")
+                return
+            memory.summary = _clip(summary.strip(), self.summary_tokens)
+            # Novas mensagens podem ter chegado durante o resumo; tira só as resumidas
+            for _ in range(min(len(batch), len(memory.pending))):
+                memory.pending.popleft()
+            self._save(memory)
+
+    def _evict(self):
+        while len(self._conversations) > self.max_conversations:
+            _, memory = self._conversations.popitem(last=False)
+            if memory.task and not memory.task.done():
+                memory.task.cancel()
+            self._save(memory)
+
+    @staticmethod
+    def _tokens(messages) -> int:
+        return sum(estimate_tokens(m["content"]) for m in messages)
+
+    def _path(self, conversation_id: str) -> Optional[str]:
+        if not self.persist_dir:
+            return None
+        return os.path.join(self.persist_dir, f"{quote(conversation_id, safe='')}.json")
+
+    def _load(self, conversation_id: str) -> Optional[ConversationMemory]:
+        path = self._path(conversation_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return ConversationMemory.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignorando memória corrompida de {conversation_id}: {e}")
+            return None
+
+    def _save(self, memory: ConversationMemory):
+        path = self._path(memory.conversation_id)
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(memory.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
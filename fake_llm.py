@@ -0,0 +1,233 @@
+"""
+Backend de chat completions falso e determinístico (compatível com a API do Groq)
+Usado pelo benchmark offline no lugar do Groq real, via transporte httpx em processo
+"""
+import asyncio
+import json
+import re
+import time
+
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+from text_utils import estimate_tokens
+
+
+class FakeChatCompletions:
+    """Responde como o planner ou o sintetizador conforme o prompt de sistema.
+
+    O plano gerado tem `fan_out` buscas independentes seguidas de uma etapa que
+    depende de todas; a síntese é um texto fixo de `response_words` palavras,
+    transmitido em pedaços quando a requisição pede `stream` (sem streaming, a
+    resposta espera o mesmo tempo de geração). Com `tools` na
+    requisição, o mesmo plano sai como tool calls nativas em dois turnos. O
+    planner rápido do roteador aceita buscas de um registro só e recusa o resto.
+
+    Com `rate_limit_rpm`/`rate_limit_tpm`, imita os limites por minuto do
+    Groq: respostas trazem os cabeçalhos `x-ratelimit-*` e o excesso recebe
+    429 com `retry-after`.
+    """
+
+    def __init__(
+        self,
+        server: str = "bench",
+        fan_out: int = 3,
+        latency_ms: float = 50.0,
+        response_words: int = 60,
+        stream_chunk_words: int = 4,
+        chunk_interval_ms: float = 5.0,
+        rate_limit_rpm: Optional[int] = None,
+        rate_limit_tpm: Optional[int] = None,
+    ):
+        self.server = server
+        self.fan_out = fan_out
+        self.latency_ms = latency_ms
+        self.response_words = response_words
+        self.stream_chunk_words = stream_chunk_words
+        self.chunk_interval_ms = chunk_interval_ms
+        self.calls = 0
+        self.rate_limit_rpm = rate_limit_rpm
+        self.rate_limit_tpm = rate_limit_tpm
+        self.rate_limited = 0
+        self._window: Deque[Tuple[float, int]] = deque()  # (instante, tokens) do último minuto
+
+    def plan(self) -> Dict[str, Any]:
+        steps = [
+            {
+                "id": f"fetch{i}",
+                "tool": f"{self.server}:fetch_data",
+                "arguments": {"key": f"record-{i}"},
+                "depends_on": [],
+                "description": f"Busca o registro {i}",
+            }
+            for i in range(self.fan_out)
+        ]
+        steps.append({
+            "id": "combine",
+            "tool": f"{self.server}:combine",
+            "arguments": {"parts": "+".join(f"{{{{fetch{i}}}}}" for i in range(self.fan_out))},
+            "depends_on": [f"fetch{i}" for i in range(self.fan_out)],
+            "description": "Combina os registros",
+        })
+        return {"reasoning": "Plano sintético do benchmark", "plan": steps}
+
+    def fast_plan(self, request: str) -> Dict[str, Any]:
+        if "combine" in request.lower():
+            return {"confidence": 0}
+        key = re.search(r"record-\d+", request)
+        return {
+            "confidence": 0.9,
+            "tool": f"{self.server}:fetch_data",
+            "arguments": {"key": key.group() if key else "record-0"},
+        }
+
+    def answer(self) -> str:
+        return " ".join(f"palavra{i}" for i in range(self.response_words))
+
+    def tool_calls_for(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Mesmo plano em turnos de tool calling: buscas em paralelo, depois a combinação"""
+        names = {spec["function"]["name"].rsplit("__", 1)[-1]: spec["function"]["name"] for spec in tools}
+        turn = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+        if turn == 0:
+            calls = [(names["fetch_data"], {"key": f"record-{i}"}) for i in range(self.fan_out)]
+        elif turn == 1:
+            fetched = [m.get("content", "") for m in messages if m.get("role") == "tool"]
+            calls = [(names["combine"], {"parts": "+".join(fetched)})]
+        else:
+            return []
+        return [
+            {
+                "id": f"call_{turn}_{i}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }
+            for i, (name, arguments) in enumerate(calls)
+        ]
+
+    def content_for(self, messages: List[Dict[str, Any]]) -> str:
+        system = messages[0].get("content", "") if messages else ""
+        if "planeja" in system:
+            return json.dumps(self.plan(), ensure_ascii=False)
+        if "UMA ferramenta" in system:
+            return json.dumps(self.fast_plan(messages[-1].get("content", "")), ensure_ascii=False)
+        return self.answer()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        body = json.loads(request.content)
+        messages = body.get("messages", [])
+        tool_calls = self.tool_calls_for(messages, body["tools"]) if body.get("tools") else []
+        content = "" if tool_calls else self.content_for(messages)
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(str(m.get("content", ""))) for m in messages),
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        headers, retry_after = self._rate_limit(usage["total_tokens"])
+        if retry_after is not None:
+            self.rate_limited += 1
+            return httpx.Response(429, headers={**headers, "retry-after": f"{retry_after:.2f}"}, json={
+                "error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"},
+            })
+
+        await asyncio.sleep(self.latency_ms / 1000)
+
+        if body.get("stream"):
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream", **headers},
+                content=self._stream(body["model"], content, usage),
+            )
+        # Sem streaming, a resposta inteira só sai depois do tempo de geração equivalente
+        await asyncio.sleep(self._generation_seconds(content))
+        return httpx.Response(200, headers=headers, json={
+            "id": f"fake-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+                "message": {"role": "assistant", "content": content, **({"tool_calls": tool_calls} if tool_calls else {})},
+            }],
+            "usage": usage,
+        })
+
+    def _rate_limit(self, tokens: int) -> Tuple[Dict[str, str], Optional[float]]:
+        """Cabeçalhos de rate limit e, se a requisição estoura o minuto, o retry-after"""
+        if not self.rate_limit_rpm and not self.rate_limit_tpm:
+            return {}, None
+        now = time.monotonic()
+        while self._window and now - self._window[0][0] >= 60:
+            self._window.popleft()
+        rpm = self.rate_limit_rpm or 10 ** 9
+        tpm = self.rate_limit_tpm or 10 ** 12
+        used_tokens = sum(t for _, t in self._window)
+
+        retry_after = None
+        if len(self._window) + 1 > rpm or used_tokens + tokens > tpm:
+            # Espera até sair da janela o suficiente para caber esta requisição
+            requests, freed = len(self._window), 0
+            for started, spent in self._window:
+                requests -= 1
+                freed += spent
+                retry_after = 60 - (now - started)
+                if requests + 1 <= rpm and used_tokens - freed + tokens <= tpm:
+                    break
+        else:
+            self._window.append((now, tokens))
+            used_tokens += tokens
+        # Reset = janela inteiramente liberada (como o Groq informa)
+        reset = 60 - (now - self._window[-1][0]) if self._window else 0.0
+        headers = {
+            "x-ratelimit-limit-requests": str(rpm),
+            "x-ratelimit-remaining-requests": str(max(0, rpm - len(self._window))),
+            "x-ratelimit-reset-requests": f"{reset:.2f}s",
+            "x-ratelimit-limit-tokens": str(tpm),
+            "x-ratelimit-remaining-tokens": str(max(0, tpm - used_tokens)),
+            "x-ratelimit-reset-tokens": f"{reset:.2f}s",
+        }
+        return headers, retry_after
+
+    def _generation_seconds(self, content: str) -> float:
+        chunks = -(-len(content.split(" ")) // self.stream_chunk_words)
+        return chunks * self.chunk_interval_ms / 1000
+
+    async def _stream(self, model: str, content: str, usage: Dict[str, int]) -> AsyncIterator[bytes]:
+        words = content.split(" ")
+        for start in range(0, len(words), self.stream_chunk_words):
+            piece = " ".join(words[start:start + self.stream_chunk_words])
+            if start:
+                piece = " " + piece
+            chunk = {
+                "id": "fake-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            await asyncio.sleep(self.chunk_interval_ms / 1000)
+        final = {
+            "id": "fake-stream",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": usage},
+        }
+        yield f"data: {json.dumps(final)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+
+def make_fake_groq_client(backend: FakeChatCompletions) -> AsyncGroq:
+    """AsyncGroq que fala com `backend` em processo (sem rede, sem chave real)"""
+    return AsyncGroq(
+        api_key="fake",
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(transport=httpx.MockTransport(backend.handle)),
+    )
@@ -1,41 +1,168 @@
 
+import asyncio
 import logging
-import regex 
 import json
 import os
+import time
 
-from typing import Any, Dict, List
-from dotenv import load_dotenv
-from groq import Groq
-from mcp import stdio_client
-from mcp.client.session import ClientSession
-from mcp_client import McpClient
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from agent_events import AgentEvent, PlanReady, ResponseComplete, SynthesisDelta
+from catalog_snapshot import CatalogSnapshot
+from conversation_memory import ConversationStore
+from llm_scheduler import (
+    PRIORITY_ACTIVE, PRIORITY_BACKGROUND, PRIORITY_PLAN, PRIORITY_SYNTHESIS, LlmDeadlineExceeded, LlmScheduler,
+    current_deadline,
+)
 from mcp_server import McpServer
+from plan_cache import PlanCache, catalog_hash, refers_to_context
+from plan_executor import PlanExecutor, critical_path_seconds, normalize_plan
+from plan_router import PlanRouter
+from plan_stream_parser import IncrementalPlanParser
+from result_compactor import NOTHING_RELEVANT, ResultCompactor
+from server_health import CircuitBreaker, LatencyWindow, ToolUnavailable
+from speculative_steps import SpeculativeSteps
+from text_utils import estimate_tokens
+from tool_arguments import ToolArguments, compile_arguments
+from tool_cache import ToolResultCache
+from tool_catalog import ToolCatalog
 from tool_info import ToolInfo
+from tracing import Span, tracer
 
-# Carrega variáveis de ambiente
-load_dotenv()
+# SDKs pesados (groq, mcp, httpx) só são importados quando usados: o startup não paga por eles
+if TYPE_CHECKING:
+    from groq import AsyncGroq
+    from mcp.types import CallToolResult
+    from mcp_session_pool import McpSessionPool
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mcp-groq-client")
 
+DEFAULT_CONVERSATION = "default"
+
+TOOL_LOOP_PROMPT = """Você é um Agent inteligente que resolve tarefas chamando ferramentas MCP.
+
+Regras:
+- Chame ferramentas quando precisar de informação ou de uma ação; use apenas as ferramentas oferecidas
+- Chamadas independentes devem ser feitas juntas, no mesmo turno: elas rodam em paralelo
+- Quando tiver o suficiente, responda ao usuário de forma clara e natural, sem mencionar detalhes técnicos das ferramentas
+- Se não souber como ajudar, diga isso diretamente"""
+
+FAST_PLAN_PROMPT = """Você escolhe UMA ferramenta MCP que atende sozinha a solicitação do usuário.
+
+FERRAMENTAS:
+{tools}
+
+Responda apenas com JSON:
+{{"confidence": 0.0, "tool": "servidor:ferramenta", "arguments": {{...}}}}
+
+Regras:
+- "confidence" (0 a 1) é a sua certeza de que uma única chamada com esses argumentos resolve a solicitação
+- Se a solicitação precisar de mais de uma ferramenta, ou nenhuma servir, responda {{"confidence": 0}}"""
+
+REPAIR_PROMPT = """Algumas etapas de um plano de execução têm argumentos inválidos para as ferramentas MCP. Corrija só essas etapas.
+
+FERRAMENTAS:
+{tools}
+
+ETAPAS COM PROBLEMAS:
+{steps}
+
+Responda apenas com JSON:
+{{"steps": [{{"id": "step1", "tool": "servidor:ferramenta", "arguments": {{...}}}}]}}
+
+Regras:
+- Mantenha o "id" de cada etapa; referências "{{{{id}}}}" à saída de outras etapas continuam valendo
+- Use exatamente os nomes e tipos de argumentos do schema da ferramenta
+- Se não houver como corrigir uma etapa, deixe-a de fora da resposta"""
+
 class GroqMcpAgent:
     """Agent inteligente que usa Groq para orquestrar ferramentas MCP"""
     
-    def __init__(self, groq_api_key: str = None):
-        # Inicializa cliente Groq
+    def __init__(
+        self,
+        groq_api_key: str = None,
+        llm_concurrency: int = 8,
+        llm_max_connections: int = 20,
+        llm_keepalive_expiry: float = 30.0,
+        llm_timeout: float = 120.0,
+        max_parallel_steps: int = 8,
+        groq_client: Optional["AsyncGroq"] = None,
+    ):
+        # Cliente Groq assíncrono com pool HTTP compartilhado (keep-alive), criado no
+        # primeiro uso; um cliente já pronto pode ser injetado (ex.: backend falso do benchmark)
         api_key = groq_api_key or os.getenv("GROQ_API_KEY")
-        if not api_key:
+        if not api_key and groq_client is None:
+            # Uso como biblioteca, sem passar pelo main: tenta o .env
+            from dotenv import load_dotenv
+            load_dotenv()
+            api_key = os.getenv("GROQ_API_KEY")
+        if not api_key and groq_client is None:
             raise ValueError("GROQ_API_KEY não encontrada")
         
-        self.groq_client = Groq(api_key=api_key)
+        self._groq_client = groq_client
+        self._groq_options = {
+            "api_key": api_key,
+            "timeout": llm_timeout,
+            "max_connections": llm_max_connections,
+            "keepalive_expiry": llm_keepalive_expiry,
+        }
+        # Toda chamada ao LLM passa pelo escalonador: concorrência, limites por modelo,
+        # prioridade (síntese antes de planejamento novo), retry e prazo da solicitação
+        self.llm_scheduler = LlmScheduler(max_concurrency=llm_concurrency)
         self.servers: Dict[str, McpServer] = {}
-        self.sessions: Dict[str, McpClient] = {}
+        self.sessions: Dict[str, "McpSessionPool"] = {}  # Pools de sessões vivas por servidor
         self.available_tools: Dict[str, ToolInfo] = {}
+        self.tool_arguments: Dict[str, ToolArguments] = {}  # Validadores compilados na descoberta
+        self.startup_report: Dict[str, Dict[str, Any]] = {}
+        
+        # Catálogo de ferramentas salvo em disco (None desativa): com ele, servidores
+        # só iniciam no primeiro uso; sem ele, a descoberta roda em segundo plano
+        self.catalog_snapshot: Optional[CatalogSnapshot] = CatalogSnapshot(
+            os.getenv("TOOL_CATALOG_PATH", ".cache/tool_catalog.json")
+        )
+        self.lazy_servers = True  # False: connect_servers inicia tudo e espera (comportamento antigo)
+        self._server_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Circuit breaker por servidor: servidores com circuito aberto saem do planejamento
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._blocked_servers: frozenset = frozenset()
+        # Latências recentes por ferramenta (limiar dos hedges)
+        self.tool_latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        
+        # Cache de resultados de ferramentas idempotentes
+        self.tool_cache = ToolResultCache()
+        
+        # Cache persistente de planos (None desativa); similaridade é opcional
+        self.plan_cache: Optional[PlanCache] = PlanCache(
+            os.getenv("PLAN_CACHE_PATH", ".cache/plan_cache.sqlite"),
+            similarity_threshold=None,
+        )
+        self.catalog_hash: Optional[str] = None
+        
+        # Catálogo compilado na descoberta; o planner recebe só as top-k ferramentas
+        self.tool_catalog = ToolCatalog({})
+        self.planner_top_k = 8
+        self.planner_token_budget = 3000
+        
+        # Roteamento do planner: solicitações simples recebem um plano de uma etapa do tool_model (None desativa)
+        self.plan_router: Optional[PlanRouter] = PlanRouter(self._fast_plan, log_path=os.getenv("PLAN_ROUTER_LOG"))
         
-        # Histórico de conversação
-        self.conversation_history = []
+        # Executor de planos em DAG (limite global de etapas simultâneas)
+        self.plan_executor = PlanExecutor(self._execute_tool, max_concurrency=max_parallel_steps)
+        
+        # Planner em streaming: etapas somente leitura começam antes do plano terminar
+        self.speculative_execution = True
+        self.max_speculative_steps = 4
+        
+        # Memória por conversação: janela recente + resumo em segundo plano (tamanho constante)
+        self.memory = ConversationStore(self._summarize_conversation, persist_dir=os.getenv("CONVERSATION_DIR"))
+        
+        # Modo de execução: "plan" (plano JSON + síntese) ou "tools" (tool calling nativo)
+        self.execution_mode = "plan"
+        self.max_tool_turns = 5
+        
+        # Compactação dos resultados antes da síntese (orçamento de tokens compartilhado)
+        self.result_compactor = ResultCompactor(self._summarize_chunk, token_budget=3000)
         
         # Configuração do Agent
         self.agent_model = "deepseek-r1-distill-llama-70b" #"mixtral-8x7b-32768"  # Melhor para raciocínio
@@ -44,150 +171,348 @@ class GroqMcpAgent:
     def add_server(self, server: McpServer):
         """Adiciona um servidor MCP"""
         self.servers[server.name] = server
+        self.breakers[server.name] = CircuitBreaker(server.name, server.breaker_failures, server.breaker_cooldown)
+        self.plan_executor.set_server_limit(
+            server.name, server.max_concurrency or server.pool_size * server.session_capacity
+        )
         logger.info(f"Servidor adicionado: {server.name}")
 
+    @property
+    def groq_client(self) -> "AsyncGroq":
+        if self._groq_client is None:
+            import httpx
+            from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+            options = self._groq_options
+            # Retries ficam com o escalonador, que conhece os limites de cada modelo
+            self._groq_client = AsyncGroq(
+                api_key=options["api_key"],
+                timeout=options["timeout"],
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=options["max_connections"],
+                        max_keepalive_connections=options["max_connections"],
+                        keepalive_expiry=options["keepalive_expiry"],
+                    ),
+                    timeout=options["timeout"],
+                ),
+            )
+        return self._groq_client
+
     async def connect_servers(self):
+        """Prepara o catálogo de ferramentas sem esperar pelos servidores.
+
+        Servidores com snapshot válido entram no catálogo direto do disco e só
+        iniciam no primeiro uso; os demais são iniciados em segundo plano (a
+        primeira solicitação espera a descoberta deles). Com `lazy_servers`
+        desligado, inicia todos em paralelo e espera. Cada servidor tem seu
+        próprio `startup_timeout`; uma falha é registrada em `startup_report`
+        sem abortar a inicialização dos demais.
+        """
         if not self.servers:
             raise ValueError("Server not initialized or does not exist.")
 
-        #self.sessions["filesystem"]
-        async with stdio_client(self.servers.get("filesystem").params) as (read_stream, write_stream):
-            async with ClientSession(read_stream, write_stream) as session:
-                #  Initialize the connection
-                await session.initialize()
-                self.sessions["filesystem"] = session
-                # List available tools
-                tools_result = await session.list_tools()
-                print("Available tools:")
-                for tool in tools_result.tools:
-                    tool_key = f"{"filesystem"}:{tool.name}"
-                    self.available_tools[tool_key] = ToolInfo(
-                        name=tool.name,
-                        description=tool.description,
-                        input_schema=tool.inputSchema,
-                        server_name="filesystem"
-                    )
+        discovering = []
+        for server in self.servers.values():
+            tools = self.catalog_snapshot.load(server) if self.lazy_servers and self.catalog_snapshot else None
+            if tools is None:
+                self.startup_report[server.name] = {"status": "starting", "seconds": 0.0, "tools": 0, "error": None}
+                discovering.append(self._start_server(server))
+                continue
+            self._set_server_tools(server.name, tools)
+            self.startup_report[server.name] = {"status": "snapshot", "seconds": 0.0, "tools": len(tools), "error": None}
+        self._on_catalog_changed()
 
-        #self.sessions["brave-search"]
-        async with stdio_client(self.servers.get("brave-search").params) as (read_stream, write_stream):
-            async with ClientSession(read_stream, write_stream) as session:
-                #  Initialize the connection
-                await session.initialize()
-                self.sessions["brave-search"] = session
-                # List available tools
-                tools_result = await session.list_tools()
-                print("Available tools:")
-                for tool in tools_result.tools:
-                    tool_key = f"{"brave-search"}:{tool.name}"
-                    self.available_tools[tool_key] = ToolInfo(
-                        name=tool.name,
-                        description=tool.description,
-                        input_schema=tool.inputSchema,
-                        server_name="brave-search"
-                    )
+        if not self.lazy_servers:
+            await asyncio.gather(*discovering)
+            failed = [name for name, report in self.startup_report.items() if report["status"] != "ok"]
+            if failed:
+                logger.warning(f"Servidores indisponíveis: {', '.join(failed)}")
 
-    async def _initMCPFilesystem(self):
-        """Conecta a todos os servidores MCP configurados"""
-        # Define server parameters
-        client = McpClient()
-        server = self.servers.get("filesystem")
+    def _start_server(self, server: McpServer) -> asyncio.Task:
+        """Inicia o servidor uma única vez (chamadas concorrentes esperam a mesma task)"""
+        task = self._server_tasks.get(server.name)
+        if task is None or (task.done() and server.name not in self.sessions):
+            task = asyncio.create_task(self._connect_server_timed(server))
+            self._server_tasks[server.name] = task
+        return task
 
-        await client.initialize_with_stdio(server.params)
-        print(f"Server MCP: {server.name}")
-        tools_result = await client.get_tools()
-        for tool in tools_result:
-            tool_key = f"{server.name}:{tool.name}"
-            self.available_tools[tool_key] = ToolInfo(
-                name=tool.name,
-                description=tool.description,
-                input_schema=tool.inputSchema,
-                server_name=server.name
-            )   
+    async def _ensure_server(self, server_name: str) -> Optional["McpSessionPool"]:
+        """Pool do servidor, iniciando-o no primeiro uso"""
+        pool = self.sessions.get(server_name)
+        if pool is None and server_name in self.servers:
+            await asyncio.shield(self._start_server(self.servers[server_name]))
+            pool = self.sessions.get(server_name)
+        return pool
+
+    async def wait_for_discovery(self):
+        """Espera servidores ainda sem catálogo (iniciados sem snapshot) antes de planejar"""
+        pending = [
+            self._server_tasks[name] for name, report in self.startup_report.items()
+            if report["status"] == "starting" and name in self._server_tasks
+        ]
+        if pending:
+            await asyncio.shield(asyncio.gather(*pending))
 
-        return client
+    def _on_catalog_changed(self):
+        """Recalcula o hash do catálogo após a descoberta de ferramentas ou a troca de estado de um circuito"""
+        tools = self._plannable_tools()
+        self.catalog_hash = catalog_hash(tools)
+        self.tool_catalog = ToolCatalog(tools)
+        if self.plan_cache:
+            self.plan_cache.set_catalog(self.catalog_hash)
+
+    def _plannable_tools(self) -> Dict[str, ToolInfo]:
+        """Ferramentas que o planner pode usar: as de servidores com circuito aberto ficam de fora"""
+        if not self._blocked_servers:
+            return self.available_tools
+        return {
+            key: tool for key, tool in self.available_tools.items() if tool.server_name not in self._blocked_servers
+        }
+
+    def _refresh_breakers(self):
+        """Atualiza o catálogo quando um circuito abre ou volta a aceitar a chamada de teste"""
+        blocked = frozenset(name for name, breaker in self.breakers.items() if not breaker.available)
+        if blocked != self._blocked_servers:
+            self._blocked_servers = blocked
+            if blocked:
+                logger.warning(f"Fora do planejamento (circuito aberto): {', '.join(sorted(blocked))}")
+            self._on_catalog_changed()
+
+    async def _connect_server_timed(self, server: McpServer):
+        """Conecta um servidor respeitando o timeout e registra o tempo de startup"""
+        start = time.perf_counter()
+        report = {"status": "ok", "seconds": 0.0, "tools": 0, "error": None}
+        try:
+            tools = await asyncio.wait_for(self._connect_server(server), timeout=server.startup_timeout)
+            report["tools"] = len(tools)
+        except asyncio.TimeoutError:
+            report["status"] = "timeout"
+            report["error"] = f"timeout após {server.startup_timeout:.0f}s"
+        except Exception as e:
+            report["status"] = "error"
+            report["error"] = str(e) or type(e).__name__
+        report["seconds"] = time.perf_counter() - start
+        self.startup_report[server.name] = report
 
-    async def _initMCPBrave(self):
-        """Conecta a todos os servidores MCP configurados"""
-        # Define server parameters
-        client = McpClient()
-        server = self.servers.get("brave-search")
+        if report["status"] == "ok":
+            logger.info(f"Servidor {server.name} pronto em {report['seconds']:.2f}s ({report['tools']} ferramentas)")
+        else:
+            logger.error(f"Falha ao iniciar {server.name} após {report['seconds']:.2f}s: {report['error']}")
+            # Não tenta iniciar de novo a cada chamada: só depois da espera do circuito
+            self.breakers[server.name].trip(f"startup: {report['error']}")
+            self._refresh_breakers()
 
-        await client.initialize_with_stdio(server.params)
-        print(f"Server MCP: {server.name}")
-        tools_result = await client.get_tools()
+    async def _connect_server(self, server: McpServer) -> Dict[str, ToolInfo]:
+        """Abre o pool de sessões do servidor e descobre suas ferramentas"""
+        from mcp_session_pool import McpSessionPool
+
+        pool = McpSessionPool(server)
+        try:
+            with tracer.span("server.startup", server=server.name):
+                # O hedge precisa de uma segunda sessão já aberta: abrir uma na hora custa mais que a espera
+                await pool.start(warm=server.pool_size if server.hedge else 1)
+                async with pool.session() as client:
+                    with tracer.span("mcp.list_tools", server=server.name):
+                        tools_result = await client.get_tools()
+        except BaseException:
+            await pool.close()
+            raise
+
+        tools = {}
         for tool in tools_result:
             tool_key = f"{server.name}:{tool.name}"
-            self.available_tools[tool_key] = ToolInfo(
+            tools[tool_key] = ToolInfo(
                 name=tool.name,
                 description=tool.description,
                 input_schema=tool.inputSchema,
-                server_name=server.name
-            )   
+                server_name=server.name,
+                annotations=tool.annotations.model_dump(exclude_none=True) if tool.annotations else None,
+            )
 
-        return client
-    
-    async def _initMCPClient(self, server_name: str):
-        if server_name == "filesystem":
-            return await self._initMCPFilesystem()
-        if server_name == "brave-search":
-            return await self._initMCPBrave()
-        
-        raise ValueError("The Server MCP does not exist.")
+        self.sessions[server.name] = pool
+        # O catálogo real substitui o do snapshot (ferramentas podem ter mudado)
+        stale = self._set_server_tools(server.name, tools)
+        changed = self.catalog_snapshot.save(server, tools) if self.catalog_snapshot else True
+        if changed or stale:
+            logger.info(f"Catálogo de {server.name} atualizado ({len(tools)} ferramentas)")
+            self._on_catalog_changed()
+        return tools
 
-    def _prepare_tool_arguments(self, tool_info: ToolInfo, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Prepara argumentos específicos para cada ferramenta"""
-        schema_props = tool_info.input_schema.get('properties', {})
-        
-        # Filtra argumentos válidos
-        valid_args = {}
-        for key, value in params.items():
-            if key in schema_props:
-                valid_args[key] = value
-        
-        # Se não encontrou argumentos válidos, tenta mapear comuns
-        if not valid_args and params:
-            # Mapeia query/search/q para query se ferramenta aceita
-            if 'query' in schema_props:
-                for search_key in ['query', 'search', 'q', 'text']:
-                    if search_key in params:
-                        valid_args['query'] = params[search_key]
-                        break
-            
-            # Mapeia path/file para path se ferramenta aceita        
-            if 'path' in schema_props:
-                for path_key in ['path', 'file', 'filename']:
-                    if path_key in params:
-                        valid_args['path'] = params[path_key]
-                        break
-        
-        # Se ainda não tem argumentos, usa os originais (fallback)
-        return valid_args if valid_args else params
+    def _set_server_tools(self, server_name: str, tools: Dict[str, ToolInfo]) -> bool:
+        """Troca as ferramentas do servidor e compila seus validadores de argumentos; retorna se alguma saiu"""
+        stale = [key for key, tool in self.available_tools.items() if tool.server_name == server_name and key not in tools]
+        for key in stale:
+            del self.available_tools[key]
+            self.tool_arguments.pop(key, None)
+        self.available_tools.update(tools)
+        self.tool_arguments.update(compile_arguments(tools))
+        return bool(stale)
+
+    def get_startup_report(self) -> Dict[str, Dict[str, Any]]:
+        """Retorna o tempo de startup e o status de cada servidor"""
+        return self.startup_report
+
+    def get_server_health(self) -> Dict[str, Dict[str, Any]]:
+        """Estado do circuito e contadores de hedge de cada servidor"""
+        health = {}
+        for name, breaker in self.breakers.items():
+            pool = self.sessions.get(name)
+            health[name] = {**breaker.snapshot(), **(pool.stats if pool else {"hedged": 0, "hedge_wins": 0})}
+        return health
+
+    @staticmethod
+    def _estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+        """Reserva de tokens de uma chamada: prompt estimado + máximo de saída"""
+        prompt = json.dumps(kwargs.get("messages", []), ensure_ascii=False)
+        if kwargs.get("tools"):
+            prompt += json.dumps(kwargs["tools"], ensure_ascii=False)
+        return estimate_tokens(prompt) + (kwargs.get("max_tokens") or 1024)
+
+    async def _chat_completion(self, priority: int = PRIORITY_PLAN, **kwargs):
+        """Chamada ao chat completions via escalonador (fila por prioridade, limites e retry)"""
+        with tracer.span("llm.completion", model=kwargs.get("model"), priority=priority) as span:
+            grant, raw = await self.llm_scheduler.open(
+                kwargs["model"],
+                self._estimate_request_tokens(kwargs),
+                lambda: self.groq_client.chat.completions.with_raw_response.create(**kwargs),
+                priority,
+            )
+            used_tokens = None
+            try:
+                completion = await raw.parse()
+                if completion.usage:
+                    used_tokens = completion.usage.total_tokens
+                    span.set(tokens_in=completion.usage.prompt_tokens, tokens_out=completion.usage.completion_tokens)
+            finally:
+                self.llm_scheduler.release(grant, used_tokens)
+            span.set(attempts=grant.attempts)
+            return completion
+
+    async def _chat_completion_stream(
+        self, span: Optional[Span] = None, priority: int = PRIORITY_SYNTHESIS, **kwargs
+    ) -> AsyncIterator[str]:
+        """Chat completions em streaming; mantém a vaga do escalonador até o fim do stream"""
+        grant, raw = await self.llm_scheduler.open(
+            kwargs["model"],
+            self._estimate_request_tokens(kwargs),
+            lambda: self.groq_client.chat.completions.with_raw_response.create(stream=True, **kwargs),
+            priority,
+        )
+        used_tokens = None
+        try:
+            stream = await raw.parse()
+            async for chunk in stream:
+                usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+                if usage:
+                    used_tokens = usage.total_tokens
+                    if span is not None:
+                        span.set(tokens_in=usage.prompt_tokens, tokens_out=usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            self.llm_scheduler.release(grant, used_tokens)
 
     async def disconnect_servers(self):
+        starting = [task for task in self._server_tasks.values() if not task.done()]
+        for task in starting:
+            task.cancel()
+        await asyncio.gather(*starting, return_exceptions=True)
+        self._server_tasks.clear()
+        pools = list(self.sessions.values())
         self.sessions.clear()
+        await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
 
         logger.info("Cleanup de servidores concluído")
 
-    def _build_tools_context(self) -> str:
-        """Constrói contexto das ferramentas disponíveis para o Agent"""
-        if not self.available_tools:
-            return "Nenhuma ferramenta disponível."
-        
-        tools_desc = []
-        for tool_key, tool in self.available_tools.items():
-            server_name, tool_name = tool_key.split(":", 1)
-            tools_desc.append(f"""
-**{tool_key}**
-- Descrição: {tool.description}
-- Servidor: {server_name}
-- Parâmetros: {json.dumps(tool.input_schema.get('properties', {}), indent=2)}
-""")
-        
-        return "\n".join(tools_desc)
+    async def close(self):
+        """Desconecta os servidores e fecha o pool HTTP do cliente Groq"""
+        await self.disconnect_servers()
+        await self.memory.close()
+        if self._groq_client is not None:
+            await self._groq_client.close()
+        if self.plan_cache:
+            self.plan_cache.close()
 
-    async def _plan_execution(self, user_request: str) -> List[Dict[str, Any]]:
-        """Usa Groq para planejar quais ferramentas usar"""
-        tools_context = self._build_tools_context()
+    def _build_tools_context(self, user_request: str) -> str:
+        """Constrói contexto das ferramentas relevantes para o Agent (catálogo pré-compilado)"""
+        return self.tool_catalog.render(
+            user_request, top_k=self.planner_top_k, token_budget=self.planner_token_budget
+        )
+
+    def _is_speculation_safe(self, tool_key: str) -> bool:
+        """Só ferramentas somente leitura podem rodar antes do plano final.
+
+        Vale a dica `readOnlyHint` do servidor MCP ou a allowlist do cache de
+        ferramentas; a denylist sempre vence. Ferramentas idempotentes que
+        escrevem ficam de fora: se o plano final descartar a etapa, o efeito
+        não pode ser desfeito.
+        """
+        tool = self.available_tools.get(tool_key)
+        if tool is None or self.tool_cache.is_denied(tool_key):
+            return False
+        hints = tool.annotations or {}
+        if hints.get("readOnlyHint"):
+            return True
+        if hints.get("destructiveHint"):
+            return False
+        return self.tool_cache.is_cacheable(tool_key)
+
+    async def _plan_execution(
+        self,
+        user_request: str,
+        conversation_context: str = "",
+        on_step: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Usa Groq para planejar quais ferramentas usar.
+
+        Com `on_step`, a resposta do planner chega em streaming e cada etapa
+        completa é entregue assim que aparece (o plano retornado é o final).
+        """
+        # Solicitação que retoma algo da conversa ("leia esse arquivo") tem plano que depende do contexto.
+        # Planos feitos com contexto nunca são gravados: a chave é só o texto, e outra conversa
+        # com o mesmo texto receberia etapas resolvidas a partir de um contexto que não é o dela
+        use_cache = self.plan_cache is not None and not (conversation_context and refers_to_context(user_request))
+        store = use_cache and not conversation_context
+        if use_cache:
+            cached_plan = self.plan_cache.get(user_request)
+            tracer.annotate(cache="hit" if cached_plan else "miss")
+            if cached_plan:
+                logger.info("Plano obtido do cache")
+                return cached_plan
+
+        decision = None
+        if self.plan_router is not None:
+            plan, decision = await self.plan_router.route(
+                user_request, self.tool_catalog, self.tool_arguments, conversation_context
+            )
+            if plan is not None:
+                self.plan_router.record(decision)
+                logger.info(f"Plano rápido: {plan[0]['tool']}")
+                if store:
+                    self.plan_cache.put(user_request, plan)
+                return plan
+
+        start = time.perf_counter()
+        plan = await self._plan_with_agent_model(user_request, conversation_context, on_step)
+        if decision is not None:
+            self.plan_router.record(decision, (time.perf_counter() - start) * 1000)
+        if plan is None:
+            return []
+        plan = await self._repair_plan(user_request, plan, conversation_context)
+        if store:
+            self.plan_cache.put(user_request, plan)
+        return plan
+
+    async def _plan_with_agent_model(
+        self,
+        user_request: str,
+        conversation_context: str = "",
+        on_step: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Plano completo pelo `agent_model` (None se a resposta não vier como plano)"""
+        tools_context = self._build_tools_context(user_request)
         
         system_prompt = f"""Você é um Agent inteligente que planeja a execução de tarefas usando ferramentas MCP disponíveis.
 
@@ -201,6 +526,8 @@ Regras:
 - Use apenas ferramentas que existem
 - Seja específico nos argumentos
 - Considere dependências entre ferramentas
+- Dê um "id" único a cada etapa; etapas independentes são executadas em paralelo
+- Se uma etapa precisa do resultado de outra, liste o id em "depends_on" e use "{{{{id}}}}" nos argumentos para inserir a saída dela
 
 Super regra:
 - Todo o processamento devera ser retornado como um JSON válido
@@ -209,26 +536,39 @@ Super regra:
   "reasoning": "Explicação do seu raciocínio",
   "plan": [
     {{
+      "id": "step1",
       "tool": "servidor:ferramenta",
       "arguments": {{...}},
+      "depends_on": [],
       "description": "O que esta etapa faz"
     }}
   ]
 }}
 """
 
+        request = dict(
+            model=self.agent_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": self._with_context(f"Solicitação: {user_request}", conversation_context)}
+            ],
+            temperature=0.1,  # Baixa para ser mais determinístico
+            max_tokens=2048,
+        )
+
         try:
-            completion = self.groq_client.chat.completions.create(
-                model=self.agent_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Solicitação: {user_request}"}
-                ],
-                temperature=0.1,  # Baixa para ser mais determinístico
-                max_tokens=2048,
-            )
-            
-            response = completion.choices[0].message.content.strip()
+            if on_step is None:
+                completion = await self._chat_completion(**request)
+                response = completion.choices[0].message.content.strip()
+            else:
+                parser = IncrementalPlanParser()
+                parts = []
+                with tracer.span("llm.completion", model=self.agent_model, stream=True) as span:
+                    async for delta in self._chat_completion_stream(span=span, priority=PRIORITY_PLAN, **request):
+                        parts.append(delta)
+                        for step in parser.feed(delta):
+                            on_step(step)
+                response = "".join(parts).strip()
             
             # Extrai JSON da resposta
             if response.startswith("```json"):
@@ -236,70 +576,308 @@ Super regra:
             elif response.startswith("```"):
                 response = response[3:-3]
 
+            import regex  # Só o parse do plano precisa de regex recursiva
             match = regex.search(r'\{(?:[^{}]|(?R))*\}', response)
 
             if match:
                 conteudo_com_chaves = match.group()
                 # Remove as chaves externas
                 response = f"{{{conteudo_com_chaves[1:-1]}}}"
-                print(response)
+                logger.debug(response)
             
             plan_data = json.loads(response)
             logger.info(f"Plano criado: {plan_data['reasoning']}")
             
             return plan_data.get("plan", [])
             
+        except LlmDeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Erro ao criar plano: {e}")
-            return []
+            return None
+
+    def _plan_problems(self, plan: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Etapas que não passariam na validação de argumentos (id -> problema)"""
+        problems = {}
+        for step in plan:
+            validator = self.tool_arguments.get(step.get("tool"))
+            if validator is None:
+                problems[step["id"]] = f"ferramenta {step.get('tool')} não existe"
+                continue
+            prepared = validator.prepare(step.get("arguments"))
+            if not prepared.ok:
+                problems[step["id"]] = prepared.describe()
+        return problems
+
+    async def _repair_plan(
+        self, user_request: str, plan: List[Dict[str, Any]], conversation_context: str = ""
+    ) -> List[Dict[str, Any]]:
+        """Valida o plano antes de executar; etapas inválidas vão ao planner numa única chamada de reparo.
+
+        As que continuam inválidas saem do plano: o executor pula só as etapas
+        que dependiam delas, sem gastar chamadas ao servidor que voltariam com erro.
+        """
+        plan = normalize_plan(plan)
+        problems = self._plan_problems(plan)
+        if not problems:
+            return plan
+        tracer.annotate(invalid_steps=len(problems))
+        logger.warning(f"{len(problems)} etapa(s) com argumentos inválidos, pedindo reparo ao planner")
+
+        by_id = {step["id"]: step for step in plan}
+        tool_keys = {by_id[step_id].get("tool") for step_id in problems}
+        rendered = [self.tool_catalog.by_key[key].full for key in tool_keys if key in self.tool_catalog.by_key]
+        if len(rendered) < len(tool_keys):
+            # Ferramenta inexistente: o planner pode trocar por uma do catálogo
+            rendered.append(self._build_tools_context(user_request))
+        steps = "\n".join(
+            json.dumps(
+                {"id": step_id, "tool": by_id[step_id].get("tool"), "arguments": by_id[step_id].get("arguments"),
+                 "problema": problem},
+                ensure_ascii=False, default=str,
+            )
+            for step_id, problem in problems.items()
+        )
+        try:
+            completion = await self._chat_completion(
+                priority=PRIORITY_PLAN,
+                model=self.agent_model,
+                messages=[
+                    {"role": "system", "content": REPAIR_PROMPT.format(tools="\n\n".join(rendered), steps=steps)},
+                    {"role": "user", "content": self._with_context(f"Solicitação: {user_request}", conversation_context)},
+                ],
+                temperature=0,
+                max_tokens=1024,
+            )
+            response = completion.choices[0].message.content or ""
+            start, end = response.find("{"), response.rfind("}")
+            repaired = json.loads(response[start:end + 1]).get("steps", []) if start >= 0 else []
+        except LlmDeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Erro no reparo do plano: {e}")
+            repaired = []
+
+        fixed = 0
+        for fix in repaired if isinstance(repaired, list) else []:
+            step = by_id.get(fix.get("id")) if isinstance(fix, dict) else None
+            if step is None or step["id"] not in problems:
+                continue
+            candidate = {**step, "tool": fix.get("tool") or step["tool"], "arguments": fix.get("arguments") or {}}
+            if not self._plan_problems([candidate]):
+                step.update(tool=candidate["tool"], arguments=candidate["arguments"])
+                del problems[step["id"]]
+                fixed += 1
+        tracer.annotate(repaired_steps=fixed, dropped_steps=len(problems))
+        if problems:
+            logger.warning(f"Etapas descartadas (argumentos inválidos): {', '.join(problems)}")
+        return [step for step in plan if step["id"] not in problems]
+
+    async def _fast_plan(self, user_request: str, tools_context: str, conversation_context: str) -> str:
+        """Plano de uma etapa pelo `tool_model` (resposta JSON bruta, validada pelo roteador)"""
+        completion = await self._chat_completion(
+            model=self.tool_model,
+            messages=[
+                {"role": "system", "content": FAST_PLAN_PROMPT.format(tools=tools_context)},
+                {"role": "user", "content": self._with_context(f"Solicitação: {user_request}", conversation_context)},
+            ],
+            temperature=0,
+            max_tokens=256,
+            response_format={"type": "json_object"},
+        )
+        return completion.choices[0].message.content or ""
 
     async def _execute_tool(self, tool_key: str, params: Dict[str, Any]) -> str:
-        """Executa uma ferramenta específica"""
+        """Executa uma ferramenta específica.
+
+        Servidor indisponível (circuito aberto, startup falhou, prazo esgotado)
+        levanta ToolUnavailable: o executor marca a etapa como falha e pula só
+        as etapas que dependem dela. Erros da ferramenta voltam como texto.
+        """
         if tool_key not in self.available_tools:
             return f"Ferramenta {tool_key} não encontrada"
         
         tool_info = self.available_tools[tool_key]
-        session = self.sessions.get(tool_info.server_name)
-        
-        if not session:
-            return f"Sessão para servidor {tool_info.server_name} não encontrada"
         
+        with tracer.span("tool.call", tool=tool_key, server=tool_info.server_name) as span:
+            try:
+                # Validação compilada: argumentos inválidos não chegam ao servidor
+                prepared = self.tool_arguments[tool_key].prepare(params)
+                if not prepared.ok:
+                    span.status = "error"
+                    span.set(error=prepared.describe())
+                    return f"Argumentos inválidos para {tool_key}: {prepared.describe()}"
+                arguments = prepared.arguments
+                span.set(request_bytes=len(json.dumps(arguments, default=str).encode()))
+
+                result = await self.tool_cache.get_or_call(
+                    tool_key, arguments, lambda: self._call_server(tool_key, tool_info, arguments)
+                )
+
+                # Extrai conteúdo de texto dos resultados
+                text_results = []
+                for content in result.content:
+                    if hasattr(content, 'text'):
+                        text_results.append(content.text)
+                    else:
+                        text_results.append(str(content))
+                
+                output = "\n".join(text_results)
+                span.set(response_bytes=len(output.encode()), is_error=bool(result.isError))
+                return output
+                
+            except ToolUnavailable as e:
+                logger.error(f"Erro ao executar {tool_key}: {e}")
+                span.status = "error"
+                span.set(error=str(e))
+                raise
+            except Exception as e:
+                logger.error(f"Erro ao executar {tool_key}: {e}")
+                span.status = "error"
+                span.set(error=str(e))
+                return f"Erro ao executar ferramenta: {str(e)}"
+
+    async def _call_server(self, tool_key: str, tool_info: ToolInfo, arguments: Dict[str, Any]) -> "CallToolResult":
+        """Chamada real ao servidor (fora do cache): circuit breaker, prazo e hedge"""
+        from mcp_session_pool import is_broken_session_error
+
+        server = self.servers[tool_info.server_name]
+        breaker = self.breakers[server.name]
+        loop = asyncio.get_running_loop()
+        # Prazo: o menor entre o da ferramenta e o que resta da solicitação
+        deadline = current_deadline()
+        remaining = deadline - loop.time() if deadline is not None else None
+        timeout = server.tool_timeout
+        by_request = remaining is not None and (timeout is None or remaining < timeout)
+        if by_request:
+            timeout = remaining
+        if timeout is not None and timeout <= 0:
+            raise ToolUnavailable("prazo da solicitação esgotado")
+        if not breaker.allow():
+            tracer.annotate(breaker=breaker.state)
+            raise ToolUnavailable(
+                f"Servidor {server.name} indisponível (circuito aberto, novo teste em {breaker.retry_in:.0f}s; "
+                f"último erro: {breaker.last_error})"
+            )
+
+        start = loop.time()
         try:
-            client = await self._initMCPClient(tool_info.server_name)
-            arguments = self._prepare_tool_arguments(tool_info, params)
-
-            result = await client.call_tool(tool_info.name, arguments)
-
-            # Extrai conteúdo de texto dos resultados
-            text_results = []
-            for content in result.content:
-                if hasattr(content, 'text'):
-                    text_results.append(content.text)
-                else:
-                    text_results.append(str(content))
-            
-            return "\n".join(text_results)
-            
+            result = await asyncio.wait_for(
+                self._call_pool(server, tool_key, tool_info, arguments), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            if by_request:
+                breaker.abandon()
+                raise ToolUnavailable(f"prazo da solicitação esgotado após {timeout:.1f}s")
+            breaker.record_failure(f"timeout após {timeout:.1f}s")
+            self._refresh_breakers()
+            raise ToolUnavailable(f"{tool_key} sem resposta em {timeout:.1f}s")
+        except ToolUnavailable as e:
+            breaker.record_failure(str(e))
+            self._refresh_breakers()
+            raise
         except Exception as e:
-            logger.error(f"Erro ao executar {tool_key}: {e}")
-            return f"Erro ao executar ferramenta: {str(e)}"
-        finally:
-            await client.cleanup()
+            if not is_broken_session_error(e):
+                breaker.record_success()  # O servidor respondeu (com erro): está vivo
+                raise
+            breaker.record_failure(repr(e))
+            self._refresh_breakers()
+            raise ToolUnavailable(f"Conexão com {server.name} perdida: {e!r}") from e
+        except BaseException:
+            breaker.abandon()
+            raise
+        self.tool_latency[tool_key].add(loop.time() - start)
+        breaker.record_success()
+        self._refresh_breakers()
+        return result
 
-    async def _synthesize_response(self, user_request: str, execution_results: List[Dict[str, Any]]) -> str:
-        """Sintetiza uma resposta final usando os resultados"""
+    async def _call_pool(
+        self, server: McpServer, tool_key: str, tool_info: ToolInfo, arguments: Dict[str, Any]
+    ) -> "CallToolResult":
+        pool = await self._ensure_server(server.name)
+        if not pool:
+            error = self.startup_report.get(server.name, {}).get("error")
+            raise ToolUnavailable(f"Sessão para servidor {server.name} não encontrada" + (f" ({error})" if error else ""))
+        return await pool.call_tool(tool_info.name, arguments, hedge_after=self._hedge_delay(server, tool_key))
+
+    def _hedge_delay(self, server: McpServer, tool_key: str) -> Optional[float]:
+        """Latência (percentil da ferramenta) após a qual uma cópia da chamada vai para outra sessão.
+
+        Só para ferramentas somente leitura em pools com mais de uma sessão,
+        e depois de `hedge_min_samples` chamadas observadas.
+        """
+        if not server.hedge or server.pool_size < 2 or not self._is_speculation_safe(tool_key):
+            return None
+        window = self.tool_latency.get(tool_key)
+        if window is None or len(window) < server.hedge_min_samples:
+            return None
+        return window.percentile(server.hedge_percentile)
+
+    async def _summarize_chunk(self, user_request: str, tool_key: str, chunk: str, max_tokens: int) -> str:
+        """Etapa "map" da compactação: extrai de um pedaço da saída o que importa para a solicitação"""
+        completion = await self._chat_completion(
+            priority=PRIORITY_ACTIVE,
+            model=self.tool_model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Extraia do trecho abaixo apenas as informações relevantes para a solicitação do usuário. "
+                        "Seja conciso e preserve números, nomes, caminhos e citações exatas. "
+                        f"Se nada for relevante, responda apenas: {NOTHING_RELEVANT}"
+                    ),
+                },
+                {"role": "user", "content": f"Solicitação: {user_request}\n\nTrecho da saída de {tool_key}:\n{chunk}"},
+            ],
+            temperature=0.0,
+            max_tokens=max_tokens,
+        )
+        return completion.choices[0].message.content or ""
+
+    async def _summarize_conversation(self, summary: str, messages: str, max_tokens: int) -> str:
+        """Incorpora mensagens antigas ao resumo da conversa (roda em segundo plano)"""
+        completion = await self._chat_completion(
+            priority=PRIORITY_BACKGROUND,
+            model=self.tool_model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Atualize o resumo de uma conversa entre usuário e assistente com as novas mensagens. "
+                        "Mantenha fatos, decisões, nomes, caminhos e pedidos em aberto; descarte cortesias. "
+                        "Responda só com o resumo atualizado, em poucas frases."
+                    ),
+                },
+                {"role": "user", "content": f"Resumo atual: {summary or '(vazio)'}\n\nNovas mensagens:\n{messages}"},
+            ],
+            temperature=0.0,
+            max_tokens=max_tokens,
+        )
+        return completion.choices[0].message.content or summary
+
+    @staticmethod
+    def _with_context(content: str, conversation_context: str) -> str:
+        """Prefixa o conteúdo com o contexto da conversa, se houver"""
+        if not conversation_context:
+            return content
+        return f"Contexto da conversa:\n{conversation_context}\n\n{content}"
+
+    def _synthesis_messages(
+        self, user_request: str, execution_results: List[Dict[str, Any]], conversation_context: str = ""
+    ) -> List[Dict[str, str]]:
+        """Monta as mensagens da síntese a partir dos resultados (já compactados)"""
         results_context = []
         for result in execution_results:
             results_context.append(f"""
 Ferramenta: {result['tool']}
-Resultado: {result['result'][:500]}...
+Resultado: {result['result']}
 """)
         
         context = "\n".join(results_context)
         
         system_prompt = f"""Você é um assistente que sintetiza respostas baseado em resultados de ferramentas.
 
-Solicitação original: {user_request}
+{self._with_context(f"Solicitação original: {user_request}", conversation_context)}
 
 Resultados das ferramentas executadas:
 {context}
@@ -307,72 +885,302 @@ Resultados das ferramentas executadas:
 Crie uma resposta clara e útil para o usuário baseada nos resultados obtidos. 
 Seja natural e conversacional, não mencione detalhes técnicos sobre as ferramentas."""
 
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "Sintetize uma resposta baseada nos resultados acima."}
+        ]
+
+    async def _synthesize_response_stream(
+        self,
+        user_request: str,
+        execution_results: List[Dict[str, Any]],
+        span: Optional[Span] = None,
+        conversation_context: str = "",
+    ) -> AsyncIterator[str]:
+        """Sintetiza a resposta final em streaming, trecho a trecho"""
+        emitted = False
         try:
-            completion = self.groq_client.chat.completions.create(
+            with tracer.span("compact", parent=span, results=len(execution_results)):
+                compacted = await self.result_compactor.compact(user_request, execution_results)
+            async for delta in self._chat_completion_stream(
+                span=span,
                 model=self.tool_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Sintetize uma resposta baseada nos resultados acima."}
-                ],
+                messages=self._synthesis_messages(user_request, compacted, conversation_context),
                 temperature=0.7,
                 max_tokens=1024,
-            )
-            
-            return completion.choices[0].message.content
+            ):
+                emitted = True
+                yield delta
             
+        except LlmDeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Erro ao sintetizar resposta: {e}")
-            return "Desculpe, ocorreu um erro ao processar sua solicitação."
+            if not emitted:
+                yield "Desculpe, ocorreu um erro ao processar sua solicitação."
+
+    async def _synthesize_response(self, user_request: str, execution_results: List[Dict[str, Any]]) -> str:
+        """Sintetiza uma resposta final usando os resultados"""
+        return "".join([delta async for delta in self._synthesize_response_stream(user_request, execution_results)])
+
+    async def _run_plan_stream(
+        self,
+        plan: List[Dict[str, Any]],
+        parent: Span,
+        results: List[Dict[str, Any]],
+        execute_fn: Optional[Callable] = None,
+    ) -> AsyncIterator[AgentEvent]:
+        """Executa um plano (etapas independentes em paralelo), repassando os eventos das etapas.
 
-    async def process_request(self, user_request: str) -> str:
+        Os resultados são acrescentados a `results` ao final da execução.
+        """
+        start = time.perf_counter()
+        execute_span = tracer.start_span("execute", parent=parent, steps=len(plan))
+        events: asyncio.Queue = asyncio.Queue()
+        execution = asyncio.create_task(
+            tracer.activate(
+                execute_span, self.plan_executor.run(plan, on_event=events.put_nowait, execute_fn=execute_fn)
+            )
+        )
+        execution.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            if not execution.done():
+                execution.cancel()
+            tracer.end_span(execute_span)
+        results.extend(execution.result())
+        critical_path = critical_path_seconds(results)
+        execute_span.set(critical_path_ms=round(critical_path * 1000, 3))
+        logger.info(
+            f"Plano executado em {time.perf_counter() - start:.2f}s "
+            f"(caminho crítico: {critical_path:.2f}s)"
+        )
+
+    async def _synthesis_stream(
+        self, user_request: str, execution_results: List[Dict[str, Any]], parent: Span, conversation_context: str
+    ) -> AsyncIterator[AgentEvent]:
+        """Sintetiza a resposta final em streaming, como eventos SynthesisDelta"""
+        synthesis_span = tracer.start_span("synthesis", parent=parent, model=self.tool_model)
+        emitted = False
+        try:
+            async for delta in self._synthesize_response_stream(
+                user_request, execution_results, span=synthesis_span, conversation_context=conversation_context
+            ):
+                if not emitted:
+                    synthesis_span.set(ttft_ms=round((time.time_ns() - synthesis_span.start_ns) / 1e6, 3))
+                    emitted = True
+                yield SynthesisDelta(delta)
+        finally:
+            tracer.end_span(synthesis_span)
+
+    async def _plan_stream(
+        self, user_request: str, conversation_context: str, request_span: Span, request_start: float
+    ) -> AsyncIterator[AgentEvent]:
+        """Modo "plan": planeja em JSON, executa o DAG e sintetiza a resposta"""
+        speculation = None
+        try:
+            # 1. Planeja execução (etapas somente leitura já começam durante o streaming)
+            with tracer.span("plan", parent=request_span) as plan_span:
+                if self.speculative_execution:
+                    speculation = SpeculativeSteps(
+                        self._execute_tool,
+                        self._is_speculation_safe,
+                        self.max_speculative_steps,
+                        limit=self.plan_executor.limit,
+                        parent=plan_span,
+                    )
+                plan = await self._plan_execution(
+                    user_request, conversation_context, on_step=speculation.offer if speculation else None
+                )
+                plan_span.set(steps=len(plan))
+            yield PlanReady(plan, time.perf_counter() - request_start)
+            
+            if not plan:
+                yield SynthesisDelta("Desculpe, não sei como ajudar com essa solicitação com as ferramentas disponíveis.")
+                return
+            
+            # 2. Executa plano (etapas independentes em paralelo)
+            execution_results: List[Dict[str, Any]] = []
+            async for event in self._run_plan_stream(
+                plan, request_span, execution_results, execute_fn=speculation.execute if speculation else None
+            ):
+                yield event
+        finally:
+            if speculation:
+                speculation.discard()
+                request_span.set(**{f"speculative_{name}": count for name, count in speculation.stats.items()})
+        
+        # 3. Sintetiza resposta final em streaming
+        async for event in self._synthesis_stream(user_request, execution_results, request_span, conversation_context):
+            yield event
+
+    async def _tool_loop_stream(
+        self, user_request: str, conversation_context: str, request_span: Span, request_start: float
+    ) -> AsyncIterator[AgentEvent]:
+        """Modo "tools": tool calling nativo em vários turnos.
+
+        A cada turno o modelo pode pedir várias ferramentas, que rodam em
+        paralelo pelo mesmo executor do modo "plan"; os resultados voltam como
+        mensagens `tool`. Quando o modelo responde sem pedir ferramentas, essa
+        é a resposta final (sem chamada de síntese separada).
+        """
+        tools = self.tool_catalog.function_specs(user_request, self.planner_top_k)
+        messages: List[Dict[str, Any]] = [
+            {"role": "system", "content": TOOL_LOOP_PROMPT},
+            {"role": "user", "content": self._with_context(user_request, conversation_context)},
+        ]
+        tool_options = {"tools": tools, "tool_choice": "auto"} if tools else {}
+        execution_results: List[Dict[str, Any]] = []
+
+        for turn in range(1, self.max_tool_turns + 1):
+            with tracer.span("plan", parent=request_span, turn=turn) as turn_span:
+                completion = await self._chat_completion(
+                    # Depois do primeiro turno a solicitação já está em andamento
+                    priority=PRIORITY_PLAN if turn == 1 else PRIORITY_ACTIVE,
+                    model=self.agent_model,
+                    messages=messages,
+                    temperature=0.1,
+                    max_tokens=2048,
+                    **tool_options,
+                )
+                message = completion.choices[0].message
+                tool_calls = message.tool_calls or []
+                turn_span.set(steps=len(tool_calls))
+
+            if not tool_calls:
+                yield PlanReady([], time.perf_counter() - request_start)
+                yield SynthesisDelta(message.content or "")
+                return
+
+            messages.append({
+                "role": "assistant",
+                "content": message.content or "",
+                "tool_calls": [
+                    {
+                        "id": call.id,
+                        "type": "function",
+                        "function": {"name": call.function.name, "arguments": call.function.arguments or "{}"},
+                    }
+                    for call in tool_calls
+                ],
+            })
+
+            plan, replies = self._tool_calls_to_plan(tool_calls)
+            yield PlanReady(plan, time.perf_counter() - request_start)
+
+            turn_results: List[Dict[str, Any]] = []
+            if plan:
+                async for event in self._run_plan_stream(plan, request_span, turn_results):
+                    yield event
+            execution_results.extend(turn_results)
+            with tracer.span("compact", parent=request_span, turn=turn):
+                for result in await self.result_compactor.compact(user_request, turn_results):
+                    replies[result["id"]] = result["result"]
+
+            for call in tool_calls:
+                messages.append({"role": "tool", "tool_call_id": call.id, "content": replies[call.id]})
+
+        # Limite de turnos atingido: sintetiza com o que foi coletado
+        logger.warning(f"Limite de {self.max_tool_turns} turnos de ferramentas atingido")
+        async for event in self._synthesis_stream(user_request, execution_results, request_span, conversation_context):
+            yield event
+
+    def _tool_calls_to_plan(self, tool_calls) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """Converte tool calls em etapas independentes do executor.
+
+        Chamadas inválidas (função desconhecida, argumentos que não são JSON
+        ou fora do schema) não viram etapas: a mensagem de erro vai direto ao
+        modelo. Argumentos válidos seguem já convertidos pelo validador.
+        """
+        plan: List[Dict[str, Any]] = []
+        replies: Dict[str, str] = {}
+        for call in tool_calls:
+            tool_key = self.tool_catalog.resolve_function(call.function.name)
+            if tool_key is None:
+                replies[call.id] = f"Ferramenta {call.function.name} não encontrada"
+                continue
+            try:
+                arguments = json.loads(call.function.arguments or "{}")
+            except json.JSONDecodeError as e:
+                replies[call.id] = f"Argumentos inválidos (JSON): {e}"
+                continue
+            prepared = self.tool_arguments[tool_key].prepare(arguments)
+            if not prepared.ok:
+                # Volta ao modelo junto com as demais respostas do turno, sem chamar o servidor
+                replies[call.id] = f"Argumentos inválidos: {prepared.describe()}"
+                continue
+            plan.append({"id": call.id, "tool": tool_key, "arguments": prepared.arguments, "depends_on": []})
+        return plan, replies
+
+    async def process_request(self, user_request: str, conversation_id: str = DEFAULT_CONVERSATION) -> str:
         """Processa uma solicitação completa do usuário"""
+        response = ""
+        async for event in self.process_request_stream(user_request, conversation_id):
+            if isinstance(event, ResponseComplete):
+                response = event.response
+        return response
+
+    async def process_request_stream(
+        self, user_request: str, conversation_id: str = DEFAULT_CONVERSATION
+    ) -> AsyncIterator[AgentEvent]:
+        """Processa uma solicitação emitindo eventos: plano pronto, etapas e trechos da resposta"""
         logger.info(f"Processando: {user_request}")
+        request_start = time.perf_counter()
+        
+        # Contexto compacto da conversa (resumo + mensagens recentes), sem a solicitação atual
+        conversation_context = self.memory.context(conversation_id)
         
-        # Adiciona ao histórico
-        self.conversation_history.append({"role": "user", "content": user_request})
+        # Servidores sem snapshot ainda descobrindo ferramentas: o planner precisa delas
+        await self.wait_for_discovery()
+        # Circuitos com a espera vencida voltam ao planejamento (a próxima chamada é o teste)
+        self._refresh_breakers()
         
+        # Spans abertos/fechados explicitamente: o contexto não pode atravessar os `yield`
+        request_span = tracer.start_span("request", conversation_id=conversation_id, mode=self.execution_mode)
+        parts = []
+        error = None
         try:
-            # 1. Planeja execução
-            plan = await self._plan_execution(user_request)
-            
-            if not plan:
-                response = "Desculpe, não sei como ajudar com essa solicitação com as ferramentas disponíveis."
-                self.conversation_history.append({"role": "assistant", "content": response})
-                return response
-            
-            # 2. Executa plano
-            execution_results = []
-            for step in plan:
-                tool_key = step["tool"]
-                arguments = step["arguments"]
-                description = step.get("description", "")
-                
-                logger.info(f"Executando: {tool_key} - {description}")
-                
-                result = await self._execute_tool(tool_key, arguments)
-                execution_results.append({
-                    "tool": tool_key,
-                    "description": description,
-                    "result": result
-                })
-            
-            # 3. Sintetiza resposta final
-            final_response = await self._synthesize_response(user_request, execution_results)
-            
-            self.conversation_history.append({"role": "assistant", "content": final_response})
-            
-            return final_response
+            if self.execution_mode == "tools":
+                events = self._tool_loop_stream(user_request, conversation_context, request_span, request_start)
+            else:
+                events = self._plan_stream(user_request, conversation_context, request_span, request_start)
+            async for event in events:
+                if isinstance(event, SynthesisDelta):
+                    parts.append(event.text)
+                yield event
+            response = "".join(parts)
             
+        except LlmDeadlineExceeded as e:
+            # Prazo da solicitação esgotado: quem definiu o prazo responde (504 no modo servidor)
+            request_span.status = "error"
+            request_span.set(error=repr(e))
+            raise
         except Exception as e:
             logger.error(f"Erro no processamento: {e}")
-            error_response = f"Erro ao processar solicitação: {str(e)}"
-            self.conversation_history.append({"role": "assistant", "content": error_response})
-            return error_response
+            error = str(e) or type(e).__name__
+            response = f"Erro ao processar solicitação: {str(e)}"
+            request_span.status = "error"
+        finally:
+            tracer.end_span(request_span)
+        
+        self.memory.append(conversation_id, "user", user_request)
+        self.memory.append(conversation_id, "assistant", response)
+        yield ResponseComplete(response, time.perf_counter() - request_start, error)
 
     def get_available_tools(self) -> Dict[str, ToolInfo]:
         """Retorna ferramentas disponíveis"""
         return self.available_tools
 
-    def get_conversation_history(self) -> List[Dict[str, str]]:
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retorna contadores de hit/miss do cache de ferramentas"""
+        return self.tool_cache.get_stats()
+
+    def get_conversation_history(self, conversation_id: str = DEFAULT_CONVERSATION) -> List[Dict[str, str]]:
         """Retorna histórico da conversação"""
-        return self.conversation_history
+        return self.memory.history(conversation_id)
+
+    def end_conversation(self, conversation_id: str):
+        """Descarta o estado de uma conversação"""
+        self.memory.end(conversation_id)
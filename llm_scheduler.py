@@ -0,0 +1,394 @@
+"""
+Escalonador das chamadas ao LLM: limites por modelo, prioridade, retry e prazos
+Toda chamada a chat.completions do agent passa por aqui
+"""
+import asyncio
+import bisect
+import itertools
+import logging
+import math
+import random
+import re
+
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger("mcp-groq-client")
+
+# Prioridades (menor sai primeiro): quem já está respondendo não espera por planejamento novo
+PRIORITY_SYNTHESIS = 0    # Síntese da resposta de uma solicitação em andamento
+PRIORITY_ACTIVE = 1       # Demais chamadas de solicitação em andamento (turnos, resumos de resultados)
+PRIORITY_PLAN = 2         # Planejamento de solicitação nova
+PRIORITY_BACKGROUND = 3   # Trabalho em segundo plano (resumo da memória)
+
+RETRYABLE_STATUS = {408, 409, 429, 498, 500, 502, 503, 504}
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+# Prazo (loop.time()) da solicitação corrente; herdado pelas tasks criadas a partir dela
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+
+class LlmDeadlineExceeded(asyncio.TimeoutError):
+    """A chamada ao LLM não cabe no prazo da solicitação"""
+
+
+def set_deadline(deadline: Optional[float]) -> Token:
+    """Define o prazo absoluto (em `loop.time()`) das chamadas feitas neste contexto"""
+    return _deadline.set(deadline)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+T = TypeVar("T")
+
+
+async def without_deadline(call: Callable[[], Awaitable[T]]) -> T:
+    """Executa `call` sem o prazo da solicitação que criou a task.
+
+    Tasks copiam o contexto de quem as cria; trabalho em segundo plano ou
+    compartilhado entre solicitações (resumo da memória, chamada de
+    ferramenta colapsada) não pode morrer no prazo de uma delas.
+    """
+    _deadline.set(None)  # Só no contexto desta task
+    return await call()
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Durações dos cabeçalhos de rate limit ("7.66s", "2m59.56s", "250ms", "12") em segundos"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Balde que reabastece continuamente até `capacity` (infinito = sem limite conhecido)"""
+
+    def __init__(self, capacity: float = math.inf, per_seconds: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.level = capacity
+        self.updated = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            if self.level < self.capacity:
+                self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos até haver `amount` disponível (pedidos maiores que o balde esperam o balde cheio)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else math.inf
+
+    def consume(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def update(self, limit: Optional[int], remaining: Optional[int], reset: Optional[float], now: float):
+        """Ajusta ao estado informado pelo servidor"""
+        if limit:
+            self.capacity = float(limit)
+        if remaining is None:
+            return
+        self.level = min(float(remaining), self.capacity)
+        self.updated = now
+        if reset and reset > 0 and self.level < self.capacity:
+            self.rate = (self.capacity - self.level) / reset
+        elif math.isinf(self.rate) and not math.isinf(self.capacity):
+            self.rate = self.capacity / 60.0
+
+
+@dataclass
+class ModelLimits:
+    """Baldes de requisições e de tokens de um modelo"""
+    requests: TokenBucket = field(default_factory=TokenBucket)
+    tokens: TokenBucket = field(default_factory=TokenBucket)
+    blocked_until: float = 0.0   # Retry-After de um 429
+    active: int = 0
+    reserved: int = 0            # Tokens reservados pelas chamadas em voo
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        return max(
+            self.blocked_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+        )
+
+
+@dataclass
+class Grant:
+    """Vaga concedida a uma chamada (liberada com `LlmScheduler.release`)"""
+    model: str
+    tokens: int
+    priority: int
+    attempts: int = 0
+    observed: bool = False   # Saldo de tokens já veio do servidor (não há sobra a devolver)
+    released: bool = False
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    model: str = field(compare=False)
+    tokens: int = field(compare=False)
+    deadline: Optional[float] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class LlmScheduler:
+    """Fila única, por prioridade, das chamadas ao LLM.
+
+    Cada modelo tem baldes de requisições e de tokens por minuto, configurados
+    em `limits` ou aprendidos dos cabeçalhos `x-ratelimit-*` das respostas
+    (sem nenhum dos dois, o modelo não tem limite local). A fila libera a
+    chamada de maior prioridade cujo modelo tem saldo, até `max_concurrency`
+    em voo; um modelo esgotado não segura os demais. A reserva de tokens
+    (prompt estimado + `max_tokens`) é acertada com o uso real na liberação.
+    Falhas transitórias (429, 5xx, conexão) são repetidas com backoff
+    exponencial com jitter, respeitando `Retry-After`. Com um prazo no
+    contexto (`set_deadline`), chamadas que não cabem nele falham logo com
+    `LlmDeadlineExceeded` em vez de esperar na fila ou repetir.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        backoff_max: float = 20.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._models: Dict[str, ModelLimits] = {}
+        for model, (requests_per_minute, tokens_per_minute) in (limits or {}).items():
+            self.set_limits(model, requests_per_minute, tokens_per_minute)
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "deadline_exceeded": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def set_limits(self, model: str, requests_per_minute: int, tokens_per_minute: int):
+        self._models[model] = ModelLimits(
+            requests=TokenBucket(requests_per_minute),
+            tokens=TokenBucket(tokens_per_minute),
+        )
+
+    def limits_for(self, model: str) -> ModelLimits:
+        limits = self._models.get(model)
+        if limits is None:
+            limits = self._models[model] = ModelLimits()
+        return limits
+
+    async def acquire(self, model: str, tokens: int, priority: int = PRIORITY_PLAN) -> Grant:
+        """Espera a vez (prioridade, concorrência e saldo do modelo) dentro do prazo do contexto"""
+        loop = asyncio.get_running_loop()
+        deadline = current_deadline()
+        if deadline is not None and deadline <= loop.time():
+            self.stats["deadline_exceeded"] += 1
+            raise LlmDeadlineExceeded(f"Prazo esgotado antes de chamar {model}")
+
+        waiter = _Waiter(priority, next(self._seq), model, tokens, deadline, loop.create_future())
+        bisect.insort(self._waiters, waiter)
+        self._dispatch()
+        try:
+            if not waiter.future.done():
+                timeout = None if deadline is None else deadline - loop.time()
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            waiter.future.result()
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # A vaga saiu junto com o cancelamento: devolve
+                self.release(Grant(model, tokens, priority))
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError) and not isinstance(e, LlmDeadlineExceeded):
+                self.stats["deadline_exceeded"] += 1
+                raise LlmDeadlineExceeded(f"Prazo esgotado na fila de {model}") from None
+            raise
+        return Grant(model, tokens, priority)
+
+    def release(self, grant: Grant, used_tokens: Optional[int] = None):
+        """Devolve a vaga; com `used_tokens`, a sobra da reserva volta ao balde"""
+        if grant.released:
+            return
+        grant.released = True
+        now = asyncio.get_running_loop().time()
+        limits = self.limits_for(grant.model)
+        limits.active -= 1
+        limits.reserved -= grant.tokens
+        if used_tokens is not None and used_tokens < grant.tokens and not grant.observed:
+            limits.tokens.refund(grant.tokens - used_tokens, now)
+        self._active -= 1
+        self._dispatch()
+
+    def observe(self, grant: Grant, headers, status: Optional[int] = None):
+        """Atualiza os baldes do modelo com os cabeçalhos de rate limit da resposta"""
+        if headers is None:
+            return
+        now = asyncio.get_running_loop().time()
+        limits = self.limits_for(grant.model)
+        # O servidor ainda não contou as outras chamadas em voo
+        others_requests = max(0, limits.active - 1)
+        others_tokens = max(0, limits.reserved - grant.tokens)
+
+        remaining = _header_int(headers, "x-ratelimit-remaining-requests")
+        limits.requests.update(
+            _header_int(headers, "x-ratelimit-limit-requests"),
+            None if remaining is None else remaining - others_requests,
+            parse_duration(headers.get("x-ratelimit-reset-requests")),
+            now,
+        )
+        remaining = _header_int(headers, "x-ratelimit-remaining-tokens")
+        grant.observed = remaining is not None
+        limits.tokens.update(
+            _header_int(headers, "x-ratelimit-limit-tokens"),
+            None if remaining is None else remaining - others_tokens,
+            parse_duration(headers.get("x-ratelimit-reset-tokens")),
+            now,
+        )
+        if status == 429:
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after:
+                limits.blocked_until = max(limits.blocked_until, now + retry_after)
+
+    async def open(
+        self, model: str, tokens: int, send: Callable[[], Awaitable[Any]], priority: int = PRIORITY_PLAN
+    ) -> Tuple[Grant, Any]:
+        """Envia com retry e devolve (vaga ainda ocupada, resposta); o chamador libera com `release`.
+
+        `send` deve devolver a resposta bruta do SDK (`with_raw_response`),
+        para que os cabeçalhos de rate limit sejam lidos.
+        """
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            grant = await self.acquire(model, tokens, priority)
+            grant.attempts = attempt + 1
+            self.stats["calls"] += 1
+            try:
+                deadline = current_deadline()
+                timeout = None if deadline is None else deadline - loop.time()
+                response = await asyncio.wait_for(send(), timeout)
+            except BaseException as e:
+                status = getattr(e, "status_code", None)
+                response_headers = getattr(getattr(e, "response", None), "headers", None)
+                self.observe(grant, response_headers, status)
+                self.release(grant)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["deadline_exceeded"] += 1
+                    raise LlmDeadlineExceeded(f"Prazo esgotado durante a chamada a {model}") from None
+                if status == 429:
+                    self.stats["rate_limited"] += 1
+                if not self._retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt, response_headers)
+                deadline = current_deadline()
+                if deadline is not None and loop.time() + delay >= deadline:
+                    self.stats["deadline_exceeded"] += 1
+                    raise LlmDeadlineExceeded(f"Sem prazo para repetir a chamada a {model}") from e
+                logger.warning(f"Chamada a {model} falhou ({e.__class__.__name__}), nova tentativa em {delay:.2f}s")
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self.observe(grant, getattr(response, "headers", None))
+            return grant, response
+
+    @staticmethod
+    def _retryable(error: BaseException) -> bool:
+        import groq  # Já carregado por quem fez a chamada
+
+        if isinstance(error, groq.APIConnectionError):  # Inclui APITimeoutError
+            return True
+        if isinstance(error, groq.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS
+        return False
+
+    def _retry_delay(self, attempt: int, headers) -> float:
+        retry_after = parse_duration(headers.get("retry-after")) if headers is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max) + random.uniform(0, self.backoff)
+        # Backoff exponencial com "full jitter"
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _remove(self, waiter: _Waiter):
+        index = bisect.bisect_left(self._waiters, waiter)
+        if index < len(self._waiters) and self._waiters[index] is waiter:
+            del self._waiters[index]
+
+    def _dispatch(self):
+        """Libera os primeiros da fila que têm saldo; agenda nova tentativa para os demais"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        blocked = set()
+        next_wake = math.inf
+        waiting = []
+        for waiter in self._waiters:
+            if waiter.future.done():
+                continue
+            if self._active >= self.max_concurrency or waiter.model in blocked:
+                waiting.append(waiter)
+                continue
+            limits = self.limits_for(waiter.model)
+            wait = limits.wait_time(waiter.tokens, now)
+            if wait > 0:
+                if waiter.deadline is not None and now + wait >= waiter.deadline:
+                    self.stats["deadline_exceeded"] += 1
+                    waiter.future.set_exception(LlmDeadlineExceeded(
+                        f"Limite de {waiter.model} só libera em {wait:.1f}s, depois do prazo"
+                    ))
+                    continue
+                # Quem vem depois no mesmo modelo não passa na frente
+                blocked.add(waiter.model)
+                next_wake = min(next_wake, wait)
+                waiting.append(waiter)
+                continue
+            limits.requests.consume(1, now)
+            limits.tokens.consume(waiter.tokens, now)
+            limits.active += 1
+            limits.reserved += waiter.tokens
+            self._active += 1
+            waiter.future.set_result(None)
+        self._waiters = waiting
+        if waiting and not math.isinf(next_wake):
+            self._timer = loop.call_later(next_wake, self._dispatch)
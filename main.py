@@ -3,49 +3,96 @@
 MCP Client com Agent inteligente usando Groq
 O Agent decide quais ferramentas MCP usar baseado no contexto
 """
+import argparse
 import asyncio
 import logging
 import os
+import sys
 
-from dotenv import load_dotenv
-from mcp import StdioServerParameters
-
+from agent_events import PlanReady, ResponseComplete, StepFinished, StepStarted, SynthesisDelta
 from groq_mcp_agent import GroqMcpAgent
 from mcp_server import McpServer
+from tracing import JsonlExporter, OtlpJsonExporter, format_summary, tracer
 
-# Carrega variáveis de ambiente
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mcp-groq-client")
 
+
+class StdinReader:
+    """Lê linhas do terminal sem bloquear o event loop (descoberta, reaper de sessões e
+    resumos seguem enquanto o usuário digita).
+
+    Não usa thread: uma thread presa em `input()` seguraria o encerramento até
+    o Enter (ou abortaria o interpretador) quando o Ctrl+C chega no meio da leitura.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+
+    async def readline(self, prompt: str) -> str:
+        print(prompt, end="", flush=True)
+        loop = asyncio.get_running_loop()
+        fd = sys.stdin.fileno()
+        while b"\n" not in self._buffer:
+            readable = loop.create_future()
+            try:
+                loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+            except NotImplementedError:
+                # Event loop sem add_reader (Windows)
+                return await asyncio.to_thread(input)
+            try:
+                await readable
+            finally:
+                loop.remove_reader(fd)
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                if not self._buffer:
+                    raise EOFError
+                self._buffer += b"\n"
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode("utf-8", errors="replace")
+
+
 class InteractiveMCPClient:
     """Interface interativa para o Agent MCP"""
     
     def __init__(self):
         self.agent = GroqMcpAgent()
+        self.stdin = StdinReader()
         self.setup_default_servers()
 
+    async def run_batch(self, input_path: str, output_path: str, concurrency: int,
+                        resume: bool = False, tool_cache_ttl: float = None):
+        """Processa um arquivo JSONL de solicitações sem interação"""
+        from batch_runner import BatchRunner
+
+        try:
+            await self.agent.connect_servers()
+            runner = BatchRunner(self.agent, concurrency=concurrency, tool_cache_ttl=tool_cache_ttl)
+            print(f"📦 Processando {input_path} -> {output_path} (concorrência {concurrency})")
+            stats = await runner.run(input_path, output_path, resume=resume)
+            print(
+                f"✅ {stats['processed']} processadas, {stats['deduplicated']} duplicadas, "
+                f"{stats['skipped']} já concluídas, {stats['errors']} com erro em {stats['seconds']:.1f}s"
+            )
+        finally:
+            await self.agent.close()
+
     def setup_default_servers(self):
         """Configura servidores MCP padrão"""
         # Exemplo: servidor de sistema de arquivos
-        self.agent.add_server(McpServer(
-            name="filesystem",
-            params=StdioServerParameters(
-                command="npx",                                                   # The command to run your server
-                args=['-y', '@modelcontextprotocol/server-filesystem', '/tmp'],  # Arguments to the command
-            )
+        self.agent.add_server(McpServer.stdio(
+            "filesystem",
+            command="npx",                                                   # The command to run your server
+            args=['-y', '@modelcontextprotocol/server-filesystem', '/tmp'],  # Arguments to the command
         ))
         
         # Exemplo: servidor de busca web
-        self.agent.add_server(McpServer(
-            name="brave-search",
-            params=StdioServerParameters(
-                command="npx",                                             # The command to run your server
-                args=['-y', '@modelcontextprotocol/server-brave-search'],  # Arguments to the command
-                env={'BRAVE_API_KEY': os.getenv("BRAVE_API_KEY")}
-            )
+        self.agent.add_server(McpServer.stdio(
+            "brave-search",
+            command="npx",                                             # The command to run your server
+            args=['-y', '@modelcontextprotocol/server-brave-search'],  # Arguments to the command
+            env={'BRAVE_API_KEY': os.getenv("BRAVE_API_KEY")}
         ))
 
     async def start(self):
@@ -54,10 +101,21 @@ class InteractiveMCPClient:
         print("="*40)
         
         try:
-            # Conecta aos servidores
-            print("Conectando aos servidores MCP...")
+            # Catálogo do snapshot; servidores iniciam no primeiro uso (ou em segundo plano, se novos)
             await self.agent.connect_servers()
             
+            # Mostra tempo de startup de cada servidor
+            print("\n⏱️  Startup dos servidores:")
+            for name, report in self.agent.get_startup_report().items():
+                if report["status"] == "snapshot":
+                    print(f"  💤 {name}: {report['tools']} ferramentas do snapshot (inicia no primeiro uso)")
+                elif report["status"] == "starting":
+                    print(f"  ⏳ {name}: descobrindo ferramentas em segundo plano (entram antes da primeira solicitação)")
+                elif report["status"] == "ok":
+                    print(f"  ✅ {name}: {report['seconds']:.2f}s ({report['tools']} ferramentas)")
+                else:
+                    print(f"  ❌ {name}: {report['seconds']:.2f}s - {report['error']}")
+            
             # Mostra ferramentas disponíveis
             tools = self.agent.get_available_tools()
             print(f"\n✅ {len(tools)} ferramentas disponíveis:")
@@ -65,14 +123,14 @@ class InteractiveMCPClient:
                 print(f"  • {tool_key}: {tool.description}")
             
             print()
-            print("\n💬 Digite suas solicitações (ou 'quit' para sair):")
+            print("\n💬 Digite suas solicitações ('/stats' para latências, 'quit' para sair):")
             print("-" * 40)
             print()
             
             # Loop interativo
             while True:
                 try:
-                    user_input = input("\n🔵 Você: ").strip()
+                    user_input = (await self.stdin.readline("\n🔵 Você: ")).strip()
                     
                     if user_input.lower() in ['quit', 'exit', 'sair']:
                         break
@@ -80,29 +138,106 @@ class InteractiveMCPClient:
                     if not user_input:
                         continue
                     
+                    if user_input == "/stats":
+                        print(format_summary(tracer.summary()))
+                        continue
+                    
                     print("🔄 Processando...")
-                    response = await self.agent.process_request(user_input)
-                    print(f"🤖 Agent: {response}")
+                    await self.render_events(self.agent.process_request_stream(user_input))
                     
-                except KeyboardInterrupt:
+                except (KeyboardInterrupt, EOFError):
                     break
                 except Exception as e:
                     print(f"❌ Erro: {e}")
             
         finally:
             print("\n👋 Desconectando...")
-            await self.agent.disconnect_servers()
-            #asyncio.run(self.agent.disconnect_servers())
+            await self.agent.close()
             print("Finalizado!")
 
+    async def render_events(self, events):
+        """Mostra o progresso e a resposta à medida que os eventos chegam"""
+        answering = False
+        async for event in events:
+            if isinstance(event, PlanReady):
+                if event.plan:
+                    print(f"📋 Plano com {len(event.plan)} etapa(s) pronto em {event.seconds:.2f}s")
+            elif isinstance(event, StepStarted):
+                print(f"  ▶ {event.tool}" + (f" - {event.description}" if event.description else ""))
+            elif isinstance(event, StepFinished):
+                status = "✓" if event.ok else "✗"
+                print(f"  {status} {event.tool} ({event.seconds:.2f}s)")
+            elif isinstance(event, SynthesisDelta):
+                if not answering:
+                    print("🤖 Agent: ", end="", flush=True)
+                    answering = True
+                print(event.text, end="", flush=True)
+            elif isinstance(event, ResponseComplete):
+                if answering:
+                    print()
+                else:
+                    print(f"🤖 Agent: {event.response}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MCP Client com Agent Groq")
+    parser.add_argument("--serve", action="store_true", help="Inicia o modo servidor HTTP (várias solicitações concorrentes)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--uds", help="Caminho de Unix socket (substitui host/porta)")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="Solicitações em execução simultânea")
+    parser.add_argument("--max-queue", type=int, default=32, help="Solicitações aguardando antes de rejeitar")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Tempo limite por solicitação (segundos)")
+    parser.add_argument("--mcp-server", action="append", default=[], metavar="NOME=URL",
+                        help="Servidor MCP remoto compartilhado (URL terminada em /sse usa SSE; senão streamable HTTP)")
+    parser.add_argument("--mode", choices=["plan", "tools"], default="plan",
+                        help="plan: plano JSON + síntese; tools: tool calling nativo em vários turnos")
+    parser.add_argument("--batch", metavar="INPUT", help="Processa as solicitações de um arquivo JSONL e sai")
+    parser.add_argument("--batch-output", help="Arquivo JSONL de resultados (padrão: <INPUT>.results.jsonl)")
+    parser.add_argument("--resume", action="store_true", help="Retoma o lote pulando ids já concluídos na saída")
+    parser.add_argument("--batch-tool-ttl", type=float, help="TTL do cache de ferramentas durante o lote (segundos)")
+    parser.add_argument("--trace-jsonl", help="Exporta spans de latência para este arquivo JSONL")
+    parser.add_argument("--trace-otlp", help="Exporta spans em OTLP/JSON para este arquivo")
+    return parser.parse_args()
+
 async def main():
     """Função principal"""
+    args = parse_args()
+    # Só no ponto de entrada: importar os módulos não mexe em ambiente nem em logging
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    if args.trace_jsonl:
+        tracer.add_exporter(JsonlExporter(args.trace_jsonl))
+    if args.trace_otlp:
+        tracer.add_exporter(OtlpJsonExporter(args.trace_otlp))
     try:
         client = InteractiveMCPClient()
-        await client.start()
+        client.agent.execution_mode = args.mode
+        for spec in args.mcp_server:
+            name, _, url = spec.partition("=")
+            if not url:
+                raise ValueError(f"--mcp-server espera NOME=URL, recebeu: {spec}")
+            client.agent.add_server(McpServer.remote(name, url))
+        if args.serve:
+            from agent_server import AgentServer
+
+            server = AgentServer(
+                client.agent,
+                max_concurrent=args.max_concurrent,
+                max_queue=args.max_queue,
+                request_timeout=args.timeout,
+            )
+            await server.serve(host=args.host, port=args.port, uds=args.uds)
+        elif args.batch:
+            output = args.batch_output or f"{os.path.splitext(args.batch)[0]}.results.jsonl"
+            await client.run_batch(args.batch, output, args.max_concurrent, args.resume, args.batch_tool_ttl)
+        else:
+            await client.start()
     except Exception as e:
         logger.error(f"Erro fatal: {e}")
         raise
+    finally:
+        tracer.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -2,7 +2,11 @@ from mcp import ClientSession, Resource, StdioServerParameters, Tool
 from mcp.types import Prompt, CallToolResult, ReadResourceResult, GetPromptResult
 from mcp.client.stdio import stdio_client          
 from mcp.client.sse import sse_client               
+from mcp.client.streamable_http import streamable_http_client
+from mcp.shared._httpx_utils import create_mcp_http_client
+import httpx
 from contextlib import AsyncExitStack               
+from tracing import tracer
 
 class McpClient:
     def __init__(self): 
@@ -11,20 +15,40 @@ class McpClient:
         self.exit_stack = AsyncExitStack()               
 
     async def initialize_with_stdio(self, server_params: StdioServerParameters):
-        self.client = await self.exit_stack.enter_async_context(stdio_client(server_params))
+        with tracer.span("mcp.spawn", command=server_params.command):
+            self.client = await self.exit_stack.enter_async_context(stdio_client(server_params))
         read, write = self.client 
 
         self.session = await self.exit_stack.enter_async_context(ClientSession(read, write))
 
-        await self.session.initialize()
+        with tracer.span("mcp.initialize"):
+            await self.session.initialize()
 
-    async def initialize_with_sse(self, host: str):
-        self.client = await self.exit_stack.enter_async_context(sse_client(host))
+    async def initialize_with_sse(self, host: str, headers: dict[str, str] | None = None):
+        with tracer.span("mcp.connect", url=host, transport="sse"):
+            self.client = await self.exit_stack.enter_async_context(sse_client(host, headers=headers))
         read, write = self.client
 
         self.session = await self.exit_stack.enter_async_context(ClientSession(read, write))
 
-        await self.session.initialize()
+        with tracer.span("mcp.initialize"):
+            await self.session.initialize()
+
+    async def initialize_with_streamable_http(self, url: str, headers: dict[str, str] | None = None):
+        with tracer.span("mcp.connect", url=url, transport="streamable-http"):
+            # Cliente httpx próprio da sessão: conexões keep-alive reaproveitadas entre requisições
+            http_client = await self.exit_stack.enter_async_context(
+                create_mcp_http_client(headers=headers, timeout=httpx.Timeout(30, read=300))
+            )
+            read, write, _ = await self.exit_stack.enter_async_context(
+                streamable_http_client(url, http_client=http_client)
+            )
+            self.client = (read, write)
+
+        self.session = await self.exit_stack.enter_async_context(ClientSession(read, write))
+
+        with tracer.span("mcp.initialize"):
+            await self.session.initialize()
 
     async def get_tools(self) -> list[Tool]:
         response = await self.session.list_tools()
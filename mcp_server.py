@@ -1,9 +1,72 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-from dataclasses import dataclass
-from mcp import StdioServerParameters
+if TYPE_CHECKING:
+    from mcp import StdioServerParameters
+
+TRANSPORTS = ("stdio", "sse", "streamable-http")
 
 @dataclass
 class McpServer:
-    """Configuração de um servidor MCP"""
+    """Configuração de um servidor MCP (processo local via stdio ou remoto via SSE/HTTP)"""
     name: str
-    params: StdioServerParameters
+    params: Optional["StdioServerParameters"] = None  # Processo local (transport="stdio")
+    command: Optional[str] = None         # Alternativa a params que não importa o SDK MCP no startup
+    args: List[str] = field(default_factory=list)
+    env: Optional[Dict[str, str]] = None
+    pool_size: int = 1                    # Sessões simultâneas mantidas abertas
+    idle_timeout: float = 300.0           # Segundos até fechar uma sessão ociosa (0 desativa)
+    health_check_interval: float = 30.0   # Ociosidade a partir da qual a sessão é pingada antes do uso
+    health_check_timeout: float = 5.0
+    startup_timeout: float = 60.0         # Tempo máximo para iniciar e listar ferramentas
+    max_concurrency: Optional[int] = None # Etapas do plano simultâneas neste servidor (padrão: capacidade do pool)
+    transport: str = "stdio"              # "stdio", "sse" ou "streamable-http"
+    url: Optional[str] = None             # Endpoint remoto (transports sse/streamable-http)
+    headers: Optional[Dict[str, str]] = None  # Cabeçalhos HTTP (ex.: Authorization)
+    requests_per_session: Optional[int] = None  # Requisições em voo por sessão (padrão: 1 stdio, 16 remoto)
+    reconnect_backoff: float = 0.5        # Espera inicial antes de reconectar após falha (dobra a cada falha)
+    reconnect_backoff_max: float = 30.0
+    tool_timeout: Optional[float] = 60.0  # Prazo de cada chamada de ferramenta (limitado ao prazo da solicitação)
+    hedge: bool = False                   # Duplica chamadas somente leitura lentas em outra sessão do pool
+    hedge_percentile: float = 95.0        # Latência (percentil da ferramenta) a partir da qual a cópia é enviada
+    hedge_min_samples: int = 20           # Chamadas observadas antes de começar a duplicar
+    breaker_failures: int = 5             # Falhas seguidas que abrem o circuito (servidor sai do planejamento)
+    breaker_cooldown: float = 30.0        # Espera até a chamada de teste (dobra a cada teste que falha)
+
+    def __post_init__(self):
+        if self.transport not in TRANSPORTS:
+            raise ValueError(f"Transport desconhecido para {self.name}: {self.transport}")
+        if self.transport == "stdio" and self.params is None and not self.command:
+            raise ValueError(f"Servidor {self.name} (stdio) precisa de params")
+        if self.transport != "stdio" and not self.url:
+            raise ValueError(f"Servidor {self.name} ({self.transport}) precisa de url")
+
+    @property
+    def is_remote(self) -> bool:
+        return self.transport != "stdio"
+
+    @property
+    def session_capacity(self) -> int:
+        """Requisições simultâneas por sessão (multiplexadas na mesma conexão)"""
+        if self.requests_per_session:
+            return self.requests_per_session
+        return 16 if self.is_remote else 1
+
+    def stdio_params(self) -> "StdioServerParameters":
+        """Parâmetros do processo local (montados só na hora de iniciar o servidor)"""
+        if self.params is None:
+            from mcp import StdioServerParameters
+            self.params = StdioServerParameters(command=self.command, args=self.args, env=self.env)
+        return self.params
+
+    @classmethod
+    def stdio(cls, name: str, command: str, args: Optional[List[str]] = None, env: Optional[Dict[str, str]] = None,
+              **kwargs) -> "McpServer":
+        """Servidor local via stdio, sem depender de `StdioServerParameters`"""
+        return cls(name=name, command=command, args=list(args or []), env=env, **kwargs)
+
+    @classmethod
+    def remote(cls, name: str, url: str, **kwargs) -> "McpServer":
+        """Servidor remoto; o transport vem da URL (`.../sse` -> sse, senão streamable-http)"""
+        transport = "sse" if url.rstrip("/").endswith("/sse") else "streamable-http"
+        return cls(name=name, transport=kwargs.pop("transport", transport), url=url, **kwargs)
@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import random
+import time
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import anyio
+import httpx
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, CallToolResult
+
+from mcp_client import McpClient
+from mcp_server import McpServer
+
+logger = logging.getLogger("mcp-groq-client")
+
+# Erros que indicam que o processo/conexão do servidor morreu
+BROKEN_SESSION_ERRORS = (
+    BrokenPipeError,
+    ConnectionError,
+    EOFError,
+    anyio.BrokenResourceError,
+    anyio.ClosedResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,  # Servidores remotos (SSE/streamable HTTP)
+)
+
+
+def is_broken_session_error(error: BaseException) -> bool:
+    """Indica se o erro significa que a sessão não pode mais ser usada"""
+    if isinstance(error, BROKEN_SESSION_ERRORS):
+        return True
+    if isinstance(error, BaseExceptionGroup):
+        # Task groups do anyio embrulham a falha de transporte
+        return all(is_broken_session_error(inner) for inner in error.exceptions)
+    return isinstance(error, McpError) and error.error.code == CONNECTION_CLOSED
+
+
+class PooledSession:
+    """Sessão MCP viva, mantida por uma task dona do seu ciclo de vida.
+
+    Os context managers do MCP (stdio_client/sse_client/ClientSession) usam
+    task groups do anyio e precisam ser fechados na mesma task que os abriu;
+    por isso cada sessão roda dentro de uma task dedicada que só encerra
+    quando `close()` é chamado. Uma sessão pode atender várias requisições ao
+    mesmo tempo (`inflight`), multiplexadas pelo id de requisição do MCP.
+    """
+
+    def __init__(self, server: McpServer):
+        self.server = server
+        self.client: Optional[McpClient] = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.broken = False
+        self.inflight = 0
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready), name=f"mcp-session:{self.server.name}")
+        try:
+            await ready
+        except BaseException:
+            # Cancelado (ex.: timeout de startup) ou falhou: encerra a task dona
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            raise
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        client = McpClient()
+        try:
+            if self.server.transport == "sse":
+                await client.initialize_with_sse(self.server.url, headers=self.server.headers)
+            elif self.server.transport == "streamable-http":
+                await client.initialize_with_streamable_http(self.server.url, headers=self.server.headers)
+            else:
+                await client.initialize_with_stdio(self.server.stdio_params())
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            await self._cleanup(client)
+            return
+
+        self.client = client
+        ready.set_result(None)
+        await self._stop.wait()
+        await self._cleanup(client)
+
+    async def _cleanup(self, client: McpClient) -> None:
+        try:
+            await client.cleanup()
+        except BaseException as e:  # processo já pode ter morrido
+            logger.debug(f"Erro ao fechar sessão de {self.server.name}: {e}")
+
+    @property
+    def usable(self) -> bool:
+        """Aberta, não marcada como quebrada e com a task dona ainda viva"""
+        return not self.broken and self.client is not None and not (self._task and self._task.done())
+
+    async def ping(self, timeout: float) -> bool:
+        """Health check: verifica se o servidor ainda responde"""
+        if not self.usable:
+            return False
+        try:
+            with anyio.fail_after(timeout):
+                await self.client.session.send_ping()
+            return True
+        except Exception as e:
+            logger.warning(f"Health check falhou para {self.server.name}: {e}")
+            return False
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class McpSessionPool:
+    """Pool de sessões MCP persistentes de um servidor (checkout/checkin).
+
+    Cada sessão aceita até `server.session_capacity` requisições simultâneas;
+    uma sessão nova só é aberta quando as existentes estão cheias. Falhas
+    seguidas ao abrir sessões (servidor remoto fora do ar, por exemplo)
+    espaçam as novas tentativas com backoff exponencial.
+    """
+
+    def __init__(self, server: McpServer):
+        self.server = server
+        self._sessions: List[PooledSession] = []
+        self._opening = 0  # sessões sendo abertas
+        self._cond = asyncio.Condition()
+        self._closed = False
+        self._reaper: Optional[asyncio.Task] = None
+        self._failures = 0  # falhas seguidas ao abrir sessão
+        self.stats = {"hedged": 0, "hedge_wins": 0}
+
+    @property
+    def size(self) -> int:
+        return len(self._sessions) + self._opening
+
+    @property
+    def idle_count(self) -> int:
+        return sum(1 for pooled in self._sessions if pooled.inflight == 0)
+
+    @property
+    def inflight(self) -> int:
+        return sum(pooled.inflight for pooled in self._sessions)
+
+    async def start(self, warm: int = 1) -> None:
+        """Abre `warm` sessões antecipadamente e inicia a evicção de ociosas"""
+        warm = min(warm, self.server.pool_size)
+        async with self._cond:
+            self._opening += warm
+        sessions = await asyncio.gather(*(self._open_reserved() for _ in range(warm)))
+        for pooled in sessions:
+            await self.checkin(pooled)
+
+        if self._reaper is None and self.server.idle_timeout:
+            self._reaper = asyncio.create_task(self._evict_idle_loop(), name=f"mcp-reaper:{self.server.name}")
+
+    def _backoff_delay(self) -> float:
+        if not self._failures:
+            return 0.0
+        delay = min(self.server.reconnect_backoff_max, self.server.reconnect_backoff * 2 ** (self._failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _open_reserved(self) -> PooledSession:
+        """Abre uma sessão numa vaga já reservada em `_opening` e a registra já emprestada"""
+        try:
+            delay = self._backoff_delay()
+            if delay:
+                logger.info(f"Aguardando {delay:.1f}s antes de reconectar a {self.server.name}")
+                await asyncio.sleep(delay)
+            pooled = PooledSession(self.server)
+            await pooled.open()
+        except BaseException:
+            async with self._cond:
+                self._opening -= 1
+                self._failures += 1
+                self._cond.notify()
+            raise
+
+        async with self._cond:
+            self._opening -= 1
+            self._failures = 0
+            pooled.inflight = 1
+            self._sessions.append(pooled)
+        logger.info(f"Nova sessão MCP aberta: {self.server.name} ({self.size}/{self.server.pool_size})")
+        return pooled
+
+    async def checkout(self, verify: bool = False, exclude: Sequence[PooledSession] = ()) -> PooledSession:
+        """Empresta uma sessão saudável, abrindo uma nova se todas estiverem cheias.
+
+        Sessões paradas há mais de `health_check_interval` (ou todas, com
+        `verify=True`) passam por um ping antes de serem reutilizadas. Sessões
+        em `exclude` não são escolhidas (a cópia de um hedge vai para outra).
+        """
+        capacity = self.server.session_capacity
+        while True:
+            dead: List[PooledSession] = []
+            async with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError(f"Pool do servidor {self.server.name} está fechado")
+                    for lost in [p for p in self._sessions if not p.usable and p.inflight == 0]:
+                        # Conexão caiu enquanto ociosa: sai do pool (fecha abaixo, fora do lock)
+                        self._sessions.remove(lost)
+                        dead.append(lost)
+                    available = [
+                        p for p in self._sessions if p.usable and p.inflight < capacity and p not in exclude
+                    ]
+                    if available:
+                        pooled = min(available, key=lambda p: p.inflight)
+                        was_idle = pooled.inflight == 0
+                        pooled.inflight += 1
+                        break
+                    if self.size < self.server.pool_size:
+                        self._opening += 1
+                        pooled = None
+                        break
+                    await self._cond.wait()
+
+            for lost in dead:
+                await lost.close()
+            if pooled is None:
+                return await self._open_reserved()
+            stale = time.monotonic() - pooled.last_used > self.server.health_check_interval
+            if not (verify or (was_idle and stale)) or await pooled.ping(self.server.health_check_timeout):
+                return pooled
+            pooled.broken = True
+            await self.checkin(pooled)
+
+    async def checkin(self, pooled: PooledSession) -> None:
+        """Devolve a sessão ao pool; quebradas saem do pool e fecham quando ficam livres"""
+        async with self._cond:
+            pooled.inflight -= 1
+            pooled.last_used = time.monotonic()
+            retire = pooled.broken or self._closed
+            if retire and pooled in self._sessions:
+                self._sessions.remove(pooled)
+            self._cond.notify_all()
+        if retire and pooled.inflight == 0:
+            await pooled.close()
+
+    @asynccontextmanager
+    async def session(self, verify: bool = False) -> AsyncIterator[McpClient]:
+        """Empresta um McpClient vivo pelo tempo do bloco"""
+        pooled = await self.checkout(verify)
+        try:
+            yield pooled.client
+        except BaseException as e:
+            if is_broken_session_error(e):
+                pooled.broken = True
+            raise
+        finally:
+            await self.checkin(pooled)
+
+    async def call_tool(
+        self, tool_name: str, arguments: Dict[str, object], hedge_after: Optional[float] = None
+    ) -> CallToolResult:
+        """Chama uma ferramenta reconectando uma vez se o pipe do servidor quebrou.
+
+        Com `hedge_after`, se a resposta não chegar nesse tempo uma cópia da
+        chamada vai para outra sessão do pool; vale a primeira que responder
+        sem erro e a outra é cancelada. Só para ferramentas sem efeitos
+        colaterais: as duas cópias podem chegar a executar.
+        """
+        if hedge_after is None:
+            return await self._call_tool(tool_name, arguments, [])
+
+        claimed: List[PooledSession] = []
+        primary = asyncio.create_task(self._call_tool(tool_name, arguments, claimed))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            logger.info(f"Hedge: {self.server.name}:{tool_name} passou de {hedge_after * 1000:.0f}ms, duplicando")
+            self.stats["hedged"] += 1
+            hedge = asyncio.create_task(self._call_tool(tool_name, arguments, claimed))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        self.stats["hedge_wins"] += 1
+                    return winner.result()
+            # As duas falharam: propaga o erro da chamada original
+            raise primary.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _call_tool(
+        self, tool_name: str, arguments: Dict[str, object], claimed: List[PooledSession]
+    ) -> CallToolResult:
+        """Uma cópia da chamada, numa sessão fora de `claimed` (registrada lá enquanto em uso)"""
+        verify = False
+        while True:
+            pooled = await self.checkout(verify, exclude=claimed)
+            claimed.append(pooled)
+            try:
+                return await pooled.client.call_tool(tool_name, arguments)
+            except BaseException as e:
+                if not is_broken_session_error(e):
+                    raise
+                pooled.broken = True
+                if verify or not isinstance(e, Exception):
+                    raise
+                logger.warning(f"Sessão de {self.server.name} quebrada ({e!r}), reconectando...")
+                verify = True
+            finally:
+                claimed.remove(pooled)
+                await self.checkin(pooled)
+
+    async def _evict_idle_loop(self) -> None:
+        interval = max(self.server.idle_timeout / 2, 1.0)
+        while not self._closed:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    async def evict_idle(self) -> int:
+        """Fecha sessões ociosas há mais de `idle_timeout` segundos"""
+        now = time.monotonic()
+        async with self._cond:
+            expired = [
+                pooled for pooled in self._sessions
+                if pooled.inflight == 0 and now - pooled.last_used > self.server.idle_timeout
+            ]
+            for pooled in expired:
+                self._sessions.remove(pooled)
+            self._cond.notify_all()
+
+        for pooled in expired:
+            await pooled.close()
+        if expired:
+            logger.info(f"{len(expired)} sessão(ões) ociosa(s) fechada(s) em {self.server.name}")
+        return len(expired)
+
+    async def close(self) -> None:
+        """Fecha as sessões livres e impede novos checkouts (as em uso fecham no checkin)"""
+        self._closed = True
+        if self._reaper:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+
+        async with self._cond:
+            idle = [pooled for pooled in self._sessions if pooled.inflight == 0]
+            for pooled in idle:
+                self._sessions.remove(pooled)
+            self._cond.notify_all()
+
+        for pooled in idle:
+            await pooled.close()
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from text_utils import strip_accents
+from tool_info import ToolInfo
+
+logger = logging.getLogger("mcp-groq-client")
+
+# Tokens que carregam valores concretos (caminhos, números, nomes de arquivo, aspas):
+# pedidos "parecidos" só reutilizam um plano se esses tokens forem idênticos
+LITERAL_TOKEN = re.compile(r"""["'][^"']+["']|\S*[/\\.\d@:]\S*""")
+
+# Palavras que apontam para turnos anteriores ("leia esse arquivo", "faça o mesmo"):
+# com elas, o plano depende do contexto da conversa e não pode vir do cache.
+# Com acento, para não confundir "esta" com "está"
+ANAPHORA = frozenset("""
+    isso isto aquilo esse essa esses essas este esta estes estas aquele aquela aqueles aquelas
+    dele dela deles delas nele nela neles nelas desse dessa desses dessas deste desta disso disto
+    nesse nessa neste nesta nisso nisto mesmo mesma mesmos mesmas outro outra outros outras
+    anterior anteriores acima último última últimos últimas novamente também
+    it its that this these those them they same previous above again also
+""".split())
+ENCLITIC = re.compile(r"\w-(?:o|a|os|as|lo|la|los|las|no|na|nos|nas)\b")
+# Elipses que continuam o turno anterior: "e em /var?", "agora em /etc", "and for /var?"
+CONTINUATION = re.compile(r"^\W*(?:e|agora|então|entao|só|so|and|now|then|what about|how about)\b")
+
+
+def refers_to_context(text: str) -> bool:
+    """Se a solicitação se refere a algo dos turnos anteriores da conversa.
+
+    Além de pronomes e demonstrativos, conta como referência a solicitação
+    que começa continuando a anterior ("e em /var?") e a muito curta sem
+    nenhum valor concreto ("resuma"), cujo objeto só pode vir do contexto.
+    """
+    text = text.lower().strip()
+    words = re.findall(r"\w+", text)
+    return (
+        bool(ENCLITIC.search(text) or CONTINUATION.search(text))
+        or any(word in ANAPHORA for word in words)
+        or (len(words) < 3 and not LITERAL_TOKEN.search(text))
+    )
+
+
+def normalize_request(text: str) -> str:
+    """Normaliza o texto da solicitação (caixa, acentos, espaços, pontuação final).
+
+    Caixa e acentos só saem das palavras comuns: tokens literais (caminhos,
+    URLs, números, trechos entre aspas) ficam como vieram, já que
+    "/tmp/Report.TXT" e "/tmp/report.txt" são arquivos diferentes.
+    """
+    parts, last = [], 0
+    for match in LITERAL_TOKEN.finditer(text):
+        parts.append(strip_accents(text[last:match.start()].lower()))
+        parts.append(match.group())
+        last = match.end()
+    parts.append(strip_accents(text[last:].lower()))
+    return re.sub(r"\s+", " ", "".join(parts)).strip().rstrip(" .!?;")
+
+
+def catalog_hash(tools: Dict[str, ToolInfo]) -> str:
+    """Hash estável do catálogo de ferramentas (nomes, descrições e schemas)"""
+    digest = hashlib.sha256()
+    for tool_key in sorted(tools):
+        tool = tools[tool_key]
+        digest.update(tool_key.encode())
+        digest.update((tool.description or "").encode())
+        digest.update(json.dumps(tool.input_schema, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _literals(text: str) -> FrozenSet[str]:
+    return frozenset(LITERAL_TOKEN.findall(text))
+
+
+class PlanCache:
+    """Cache persistente (SQLite) de planos por solicitação normalizada + catálogo.
+
+    Planos são indexados pelo hash do catálogo de ferramentas, então mudar as
+    ferramentas disponíveis invalida automaticamente os planos antigos. Com
+    `similarity_threshold`, solicitações quase idênticas (n-gramas de
+    caracteres) reutilizam o plano de uma solicitação já vista.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, similarity_threshold: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0}
+        self._catalog: Optional[str] = None
+        self._index: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                request_key TEXT NOT NULL,
+                catalog_hash TEXT NOT NULL,
+                plan TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (request_key, catalog_hash)
+            )
+        """)
+        self._db.commit()
+
+    def set_catalog(self, current_hash: str):
+        """Define o catálogo atual; planos de outros catálogos deixam de ser usados.
+
+        Eles continuam no disco (até saírem pelo LRU) para o caso de o catálogo
+        anterior voltar, por exemplo quando um servidor falha só em um startup.
+        """
+        if current_hash == self._catalog:
+            return
+        if self._catalog is not None:
+            logger.info("Catálogo de ferramentas mudou: planos em cache do catálogo anterior invalidados")
+        self._catalog = current_hash
+
+        self._index = {}
+        if self.similarity_threshold:
+            rows = self._db.execute("SELECT request_key FROM plans WHERE catalog_hash = ?", (current_hash,))
+            for (request_key,) in rows:
+                self._index[request_key] = (_trigrams(request_key), _literals(request_key))
+
+    def get(self, user_request: str) -> Optional[List[Dict[str, Any]]]:
+        """Retorna o plano cacheado (exato ou similar) para o catálogo atual"""
+        if self._catalog is None:
+            return None
+        request_key = normalize_request(user_request)
+        row = self._db.execute(
+            "SELECT plan FROM plans WHERE request_key = ? AND catalog_hash = ?", (request_key, self._catalog)
+        ).fetchone()
+        if row:
+            self.stats["hits"] += 1
+            self._touch(request_key)
+            return json.loads(row[0])
+
+        similar_key = self._find_similar(request_key)
+        if similar_key:
+            row = self._db.execute(
+                "SELECT plan FROM plans WHERE request_key = ? AND catalog_hash = ?", (similar_key, self._catalog)
+            ).fetchone()
+            if row:
+                self.stats["similar_hits"] += 1
+                self._touch(similar_key)
+                logger.info(f"Plano reutilizado de solicitação similar: {similar_key!r}")
+                return json.loads(row[0])
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, user_request: str, plan: List[Dict[str, Any]]):
+        """Guarda o plano para a solicitação no catálogo atual"""
+        if self._catalog is None or not plan:
+            return
+        request_key = normalize_request(user_request)
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO plans (request_key, catalog_hash, plan, created_at, last_used, hits) "
+            "VALUES (?, ?, ?, ?, ?, 0)",
+            (request_key, self._catalog, json.dumps(plan, ensure_ascii=False), now, now),
+        )
+        self._db.execute(
+            "DELETE FROM plans WHERE rowid IN (SELECT rowid FROM plans ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+        if self.similarity_threshold:
+            self._index[request_key] = (_trigrams(request_key), _literals(request_key))
+
+    def _touch(self, request_key: str):
+        self._db.execute(
+            "UPDATE plans SET hits = hits + 1, last_used = ? WHERE request_key = ? AND catalog_hash = ?",
+            (time.time(), request_key, self._catalog),
+        )
+        self._db.commit()
+
+    def _find_similar(self, request_key: str) -> Optional[str]:
+        if not self.similarity_threshold or not self._index:
+            return None
+        grams, literals = _trigrams(request_key), _literals(request_key)
+        best_key, best_score = None, 0.0
+        for candidate, (candidate_grams, candidate_literals) in self._index.items():
+            if candidate_literals != literals:
+                continue
+            score = len(grams & candidate_grams) / len(grams | candidate_grams)
+            if score > best_score:
+                best_key, best_score = candidate, score
+        return best_key if best_score >= self.similarity_threshold else None
+
+    def close(self):
+        self._db.close()
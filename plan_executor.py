@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import re
+import time
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from agent_events import AgentEvent, StepFinished, StepStarted
+
+logger = logging.getLogger("mcp-groq-client")
+
+# Referência à saída de uma etapa anterior: "{{step1}}" dentro de qualquer argumento
+STEP_REFERENCE = re.compile(r"\{\{\s*([\w.-]+)\s*\}\}")
+
+ExecuteFn = Callable[[str, Dict[str, Any]], Awaitable[str]]
+
+
+def normalize_plan(plan: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Garante `id` e `depends_on` em cada etapa.
+
+    Etapas sem id recebem `step<N>` (ids repetidos ganham sufixo); referências
+    `{{id}}` nos argumentos viram dependências implícitas.
+    """
+    steps = []
+    used = set()
+    for index, raw in enumerate(plan, start=1):
+        step = dict(raw)
+        step_id = str(step.get("id") or f"step{index}")
+        if step_id in used:
+            step_id = f"{step_id}_{index}"
+        used.add(step_id)
+        step["id"] = step_id
+        step.setdefault("arguments", {})
+        depends_on = step.get("depends_on") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        refs = find_references(step["arguments"])
+        step["depends_on"] = list(dict.fromkeys([str(dep) for dep in depends_on] + refs))
+        steps.append(step)
+    return steps
+
+
+def find_references(value: Any) -> List[str]:
+    """Lista os ids de etapas referenciados em um valor de argumento"""
+    if isinstance(value, str):
+        return STEP_REFERENCE.findall(value)
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in find_references(item)]
+    if isinstance(value, list):
+        return [ref for item in value for ref in find_references(item)]
+    return []
+
+
+def resolve_references(value: Any, outputs: Dict[str, str]) -> Any:
+    """Substitui `{{id}}` pela saída da etapa correspondente"""
+    if isinstance(value, str):
+        whole = STEP_REFERENCE.fullmatch(value.strip())
+        if whole and whole.group(1) in outputs:
+            return outputs[whole.group(1)]
+        return STEP_REFERENCE.sub(lambda m: outputs.get(m.group(1), m.group(0)), value)
+    if isinstance(value, dict):
+        return {key: resolve_references(item, outputs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, outputs) for item in value]
+    return value
+
+
+class PlanExecutor:
+    """Executa um plano como DAG: etapas independentes rodam em paralelo.
+
+    Respeita um limite global de etapas simultâneas (compartilhado entre todas
+    as solicitações) e um limite por servidor MCP.
+    """
+
+    def __init__(self, execute_fn: ExecuteFn, max_concurrency: int = 8):
+        self.execute_fn = execute_fn
+        self.global_semaphore = asyncio.Semaphore(max_concurrency)
+        self.server_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def set_server_limit(self, server_name: str, limit: int):
+        """Define quantas etapas podem usar o servidor ao mesmo tempo"""
+        self.server_semaphores[server_name] = asyncio.Semaphore(max(limit, 1))
+
+    @asynccontextmanager
+    async def limit(self, tool_key: str) -> AsyncIterator[None]:
+        """Reserva uma vaga do servidor da ferramenta e depois uma global.
+
+        Nessa ordem, etapas na fila de um servidor saturado não prendem vagas
+        globais que etapas de outros servidores poderiam usar.
+        """
+        server_semaphore = self.server_semaphores.get(tool_key.split(":", 1)[0])
+        if server_semaphore:
+            await server_semaphore.acquire()
+        try:
+            async with self.global_semaphore:
+                yield
+        finally:
+            if server_semaphore:
+                server_semaphore.release()
+
+    async def run(
+        self,
+        plan: List[Dict[str, Any]],
+        on_event: Optional[Callable[[AgentEvent], None]] = None,
+        execute_fn: Optional[ExecuteFn] = None,
+    ) -> List[Dict[str, Any]]:
+        """Executa o plano e retorna os resultados na ordem original das etapas.
+
+        `on_event` recebe StepStarted/StepFinished de cada etapa executada;
+        `execute_fn` substitui o executor padrão só nesta execução.
+        """
+        emit = on_event or (lambda event: None)
+        execute = execute_fn or self.execute_fn
+        steps = normalize_plan(plan)
+        by_id = {step["id"]: step for step in steps}
+        errors = self._validate(steps, by_id)
+
+        outputs: Dict[str, str] = {}
+        results: Dict[str, Dict[str, Any]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Dict[str, Any]):
+            step_id = step["id"]
+            if step_id in errors:
+                results[step_id] = self._result(step, errors[step_id], 0.0, ok=False)
+                return
+
+            deps = [tasks[dep] for dep in step["depends_on"]]
+            if deps:
+                await asyncio.gather(*deps)
+            failed = [dep for dep in step["depends_on"] if not results[dep]["ok"]]
+            if failed:
+                message = f"Etapa ignorada: dependência(s) {', '.join(failed)} falharam"
+                results[step_id] = self._result(step, message, 0.0, ok=False)
+                return
+
+            arguments = resolve_references(step["arguments"], outputs)
+            async with self.limit(step["tool"]):
+                logger.info(f"Executando [{step_id}]: {step['tool']} - {step.get('description', '')}")
+                emit(StepStarted(step_id, step["tool"], step.get("description", "")))
+                start = time.perf_counter()
+                try:
+                    output = await execute(step["tool"], arguments)
+                    ok = True
+                except Exception as e:
+                    output, ok = f"Erro ao executar ferramenta: {e}", False
+                elapsed = time.perf_counter() - start
+
+            outputs[step_id] = output
+            results[step_id] = self._result(step, output, elapsed, ok=ok)
+            emit(StepFinished(step_id, step["tool"], elapsed, ok))
+
+        # Cria as tasks em ordem topológica para que dependências já existam
+        for step in self._topological_order(steps, errors):
+            tasks[step["id"]] = asyncio.create_task(run_step(step))
+        await asyncio.gather(*tasks.values())
+
+        return [results[step["id"]] for step in steps]
+
+    def _validate(self, steps: List[Dict[str, Any]], by_id: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Marca etapas com dependências inexistentes ou circulares"""
+        errors: Dict[str, str] = {}
+        for step in steps:
+            missing = [dep for dep in step["depends_on"] if dep not in by_id]
+            if missing:
+                errors[step["id"]] = f"Dependência(s) inexistente(s): {', '.join(missing)}"
+
+        # Detecta ciclos (DFS com cores)
+        state: Dict[str, int] = {}
+
+        def visit(step_id: str) -> bool:
+            if state.get(step_id) == 1:
+                return True
+            if state.get(step_id) == 2:
+                return False
+            state[step_id] = 1
+            cyclic = any(visit(dep) for dep in by_id[step_id]["depends_on"] if dep in by_id)
+            state[step_id] = 2
+            if cyclic:
+                errors.setdefault(step_id, "Dependência circular no plano")
+            return cyclic
+
+        for step_id in by_id:
+            visit(step_id)
+        return errors
+
+    def _topological_order(self, steps: List[Dict[str, Any]], errors: Dict[str, str]) -> List[Dict[str, Any]]:
+        ordered: List[Dict[str, Any]] = []
+        placed = set()
+        by_id = {step["id"]: step for step in steps}
+
+        def place(step: Dict[str, Any]):
+            if step["id"] in placed:
+                return
+            placed.add(step["id"])
+            if step["id"] not in errors:
+                for dep in step["depends_on"]:
+                    place(by_id[dep])
+            ordered.append(step)
+
+        for step in steps:
+            place(step)
+        return ordered
+
+    @staticmethod
+    def _result(step: Dict[str, Any], output: str, elapsed: float, ok: bool) -> Dict[str, Any]:
+        return {
+            "id": step["id"],
+            "tool": step["tool"],
+            "description": step.get("description", ""),
+            "depends_on": step["depends_on"],
+            "result": output,
+            "seconds": elapsed,
+            "ok": ok,
+        }
+
+
+def critical_path_seconds(results: List[Dict[str, Any]]) -> float:
+    """Soma dos tempos no caminho mais longo do DAG (limite inferior do wall-clock)"""
+    by_id = {result["id"]: result for result in results}
+    memo: Dict[str, float] = {}
+
+    def finish(step_id: str) -> float:
+        if step_id not in memo:
+            memo[step_id] = 0.0  # protege contra ciclos
+            deps = [dep for dep in by_id[step_id]["depends_on"] if dep in by_id]
+            memo[step_id] = by_id[step_id]["seconds"] + max((finish(dep) for dep in deps), default=0.0)
+        return memo[step_id]
+
+    return max((finish(step_id) for step_id in by_id), default=0.0)
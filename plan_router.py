@@ -0,0 +1,262 @@
+"""
+Roteamento do planner: solicitações simples vão para o modelo rápido
+Registra as decisões em JSONL; `python plan_router.py summary <arquivo>` resume o log
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from plan_executor import find_references
+from text_utils import estimate_tokens
+from tool_arguments import ToolArguments
+from tool_catalog import ToolCatalog
+from tracing import percentile, tracer
+
+logger = logging.getLogger("mcp-groq-client")
+
+# (solicitação, ferramentas candidatas renderizadas, contexto da conversa) -> resposta JSON do modelo rápido
+FastPlanFn = Callable[[str, str, str], Awaitable[str]]
+
+# Indícios de que a solicitação tem mais de uma etapa
+MULTI_STEP = re.compile(
+    r"\b(depois|em seguida|ent[aã]o|ap[oó]s|tamb[eé]m|para cada|compar\w*|then|after|also|for each)\b|[;\n]",
+    re.IGNORECASE,
+)
+# Dois verbos no imperativo ligados por "e" ("busque e combine", "leia e salve")
+ACTION_PAIR = re.compile(r"^\W*\w+[ea]\s+e\s+\w+[ea]\b", re.IGNORECASE)
+
+
+@dataclass
+class RouteDecision:
+    """Uma decisão do roteador, com os sinais usados para ajustar os limiares"""
+    route: str                        # "fast" (plano de uma etapa) ou "heavy" (agent_model)
+    reason: str
+    request_tokens: int = 0
+    top_tool: Optional[str] = None
+    score: float = 0.0                # BM25 da melhor ferramenta
+    margin: Optional[float] = None    # Razão entre a melhor e a segunda ferramenta (None: só uma pontuou)
+    confidence: Optional[float] = None
+    fast_ms: Optional[float] = None   # Tempo gasto no modelo rápido (aceito ou não)
+    heavy_ms: Optional[float] = None
+    saved_ms: Optional[float] = None  # Estimativa: planner pesado médio - caminho rápido
+    timestamp: float = field(default_factory=time.time)
+
+
+class PlanRouter:
+    """Decide se o plano sai do modelo rápido (uma etapa) ou do `agent_model`.
+
+    Um classificador local (BM25 do catálogo + heurísticas de texto) filtra as
+    solicitações curtas, de uma ação só e com uma ferramenta claramente à
+    frente das outras. Essas vão para `fast_plan`, que escolhe a ferramenta e
+    os argumentos entre as candidatas e informa a confiança. O plano rápido só
+    é aceito se passar na validação e na confiança mínima; senão a solicitação
+    sobe para o planner pesado. Cada decisão vai para `stats`, para o span do
+    plano e, com `log_path`, para um JSONL.
+    """
+
+    def __init__(
+        self,
+        fast_plan: FastPlanFn,
+        min_score: float = 1.0,
+        min_margin: float = 1.5,
+        min_confidence: float = 0.7,
+        max_request_tokens: int = 40,
+        candidates: int = 3,
+        log_path: Optional[str] = None,
+    ):
+        self.fast_plan = fast_plan
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.min_confidence = min_confidence
+        self.max_request_tokens = max_request_tokens
+        self.candidates = candidates
+        self.log_path = log_path
+        self.heavy_ms_avg: Optional[float] = None  # Média móvel do planner pesado
+        self.stats = {"fast": 0, "escalated": 0, "heavy": 0, "saved_ms": 0.0, "wasted_ms": 0.0}
+
+    def classify(self, request: str, catalog: ToolCatalog) -> Tuple[Optional[List[str]], RouteDecision]:
+        """Ferramentas candidatas para o caminho rápido, ou None se vai direto ao pesado"""
+        decision = RouteDecision(route="heavy", reason="", request_tokens=estimate_tokens(request))
+        if not catalog.tools:
+            decision.reason = "sem_ferramentas"
+            return None, decision
+        if decision.request_tokens > self.max_request_tokens:
+            decision.reason = "longa"
+            return None, decision
+        if MULTI_STEP.search(request) or ACTION_PAIR.search(request):
+            decision.reason = "varias_etapas"
+            return None, decision
+
+        scores = catalog.score(request)
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        top = scores[ranked[0]]
+        second = scores[ranked[1]] if len(ranked) > 1 else 0.0
+        decision.top_tool = catalog.tools[ranked[0]].key
+        decision.score = round(top, 3)
+        decision.margin = round(top / second, 3) if second > 0 else None
+        if top < self.min_score:
+            decision.reason = "pontuacao_baixa"
+            return None, decision
+        if decision.margin is not None and decision.margin < self.min_margin:
+            decision.reason = "ambigua"
+            return None, decision
+        return [catalog.tools[i].key for i in ranked[:self.candidates] if scores[i] > 0], decision
+
+    async def route(
+        self,
+        request: str,
+        catalog: ToolCatalog,
+        validators: Dict[str, ToolArguments],
+        conversation_context: str = "",
+    ) -> Tuple[Optional[List[Dict[str, Any]]], RouteDecision]:
+        """Plano de uma etapa do modelo rápido, ou (None, decisão) para escalar"""
+        candidates, decision = self.classify(request, catalog)
+        if candidates is None:
+            return None, decision
+
+        rendered = "\n\n".join(catalog.by_key[key].full for key in candidates)
+        start = time.perf_counter()
+        try:
+            response = await self.fast_plan(request, rendered, conversation_context)
+        except Exception as e:
+            logger.warning(f"Falha no planner rápido, escalando: {e}")
+            response = ""
+        decision.fast_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        step, confidence, error = self.parse(response, candidates, validators)
+        decision.confidence = confidence
+        if error:
+            decision.reason = error
+            return None, decision
+        if confidence < self.min_confidence:
+            decision.reason = "confianca_baixa"
+            return None, decision
+
+        decision.route = "fast"
+        decision.reason = "aceito"
+        decision.top_tool = step["tool"]
+        if self.heavy_ms_avg is not None:
+            decision.saved_ms = round(self.heavy_ms_avg - decision.fast_ms, 3)
+        return [step], decision
+
+    def parse(
+        self, response: str, candidates: List[str], validators: Dict[str, ToolArguments]
+    ) -> Tuple[Optional[Dict[str, Any]], float, Optional[str]]:
+        """(etapa, confiança, erro) a partir da resposta do modelo rápido"""
+        start, end = response.find("{"), response.rfind("}")
+        try:
+            data = json.loads(response[start:end + 1]) if start >= 0 else None
+        except json.JSONDecodeError:
+            data = None
+        if not isinstance(data, dict):
+            return None, 0.0, "resposta_invalida"
+
+        try:
+            confidence = float(data.get("confidence", 0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        tool_key = data.get("tool")
+        if not tool_key:
+            return None, confidence, "recusado"
+        if tool_key not in candidates or tool_key not in validators:
+            return None, confidence, "ferramenta_invalida"
+
+        arguments = data.get("arguments") or {}
+        if find_references(arguments):
+            return None, confidence, "argumentos_invalidos"
+        prepared = validators[tool_key].prepare(arguments)
+        if prepared.missing:
+            return None, confidence, "argumentos_faltando"
+        if prepared.invalid:
+            return None, confidence, "argumentos_invalidos"
+        step = {
+            "id": "step1",
+            "tool": tool_key,
+            "arguments": prepared.arguments,
+            "depends_on": [],
+            "description": data.get("description") or "Plano rápido (uma etapa)",
+        }
+        return step, confidence, None
+
+    def record(self, decision: RouteDecision, heavy_ms: Optional[float] = None):
+        """Contabiliza a decisão (após o planner pesado, se ele rodou)"""
+        if decision.route == "fast":
+            self.stats["fast"] += 1
+            self.stats["saved_ms"] += decision.saved_ms or 0.0
+        else:
+            self.stats["escalated" if decision.fast_ms is not None else "heavy"] += 1
+            self.stats["wasted_ms"] += decision.fast_ms or 0.0
+            if heavy_ms is not None:
+                decision.heavy_ms = round(heavy_ms, 3)
+                self.heavy_ms_avg = heavy_ms if self.heavy_ms_avg is None else 0.9 * self.heavy_ms_avg + 0.1 * heavy_ms
+
+        tracer.annotate(route=decision.route, route_reason=decision.reason)
+        logger.info(f"Roteamento do plano: {decision.route} ({decision.reason})")
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(decision), ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning(f"Falha ao gravar decisão de roteamento: {e}")
+
+
+def summarize_decisions(decisions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Contagem por rota/motivo e latências, para ajustar os limiares"""
+    reasons: Dict[str, int] = defaultdict(int)
+    fast_ms, heavy_ms, saved_ms, wasted_ms = [], [], [], []
+    for decision in decisions:
+        reasons[f"{decision['route']}:{decision['reason']}"] += 1
+        if decision.get("fast_ms") is not None:
+            fast_ms.append(decision["fast_ms"])
+            if decision["route"] == "heavy":
+                wasted_ms.append(decision["fast_ms"])
+        if decision.get("heavy_ms") is not None:
+            heavy_ms.append(decision["heavy_ms"])
+        if decision.get("saved_ms") is not None:
+            saved_ms.append(decision["saved_ms"])
+    return {
+        "total": len(decisions),
+        "fast": sum(1 for d in decisions if d["route"] == "fast"),
+        "reasons": dict(sorted(reasons.items())),
+        "fast_ms_p50": percentile(fast_ms, 50),
+        "heavy_ms_p50": percentile(heavy_ms, 50),
+        "saved_ms_total": round(sum(saved_ms), 3),
+        "wasted_ms_total": round(sum(wasted_ms), 3),
+    }
+
+
+def format_decisions(summary: Dict[str, Any]) -> str:
+    total = summary["total"] or 1
+    lines = [
+        f"Decisões: {summary['total']} | rápido: {summary['fast']} ({summary['fast'] / total:.0%})",
+        f"Planner rápido p50: {summary['fast_ms_p50']:.1f} ms | pesado p50: {summary['heavy_ms_p50']:.1f} ms",
+        f"Economia estimada: {summary['saved_ms_total']:.0f} ms | "
+        f"gasto em escaladas: {summary['wasted_ms_total']:.0f} ms",
+    ]
+    for reason, count in summary["reasons"].items():
+        lines.append(f"  {reason:<32}{count:>7}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Resumo das decisões de roteamento do planner")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="Mostra rotas, motivos e latências")
+    summary_parser.add_argument("path", help="Arquivo JSONL gerado com PLAN_ROUTER_LOG")
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        with open(args.path, encoding="utf-8") as f:
+            decisions = [json.loads(line) for line in f if line.strip()]
+        print(format_decisions(summarize_decisions(decisions)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
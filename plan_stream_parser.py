@@ -0,0 +1,121 @@
+import json
+import logging
+
+from typing import Any, Dict, List
+
+logger = logging.getLogger("mcp-groq-client")
+
+
+class IncrementalPlanParser:
+    """Extrai as etapas de `"plan": [...]` de uma resposta do planner ainda em streaming.
+
+    Acompanha o estado léxico do JSON (strings, escapes e profundidade) a cada
+    trecho recebido e devolve cada objeto do array `plan` assim que ele fecha.
+    Texto antes do JSON (raciocínio, cercas de código) é ignorado, assim como
+    blocos `<think>...</think>`. O plano definitivo continua vindo do parse da
+    resposta completa; isto serve só para adiantar etapas.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._plan_depth = None     # Profundidade do array "plan" (quando encontrado)
+        self._step_start = None     # Início do objeto de etapa corrente no buffer
+        self._in_think = False
+        self.done = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consome um trecho e retorna as etapas completadas por ele"""
+        if self.done:
+            return []
+        self._buffer += text
+        steps: List[Dict[str, Any]] = []
+        buffer = self._buffer
+
+        while self._position < len(buffer):
+            i = self._position
+            char = buffer[i]
+
+            if self._in_think:
+                end = buffer.find("</think>", i)
+                if end < 0:
+                    # Mantém só o suficiente para achar o fechamento que chegar no próximo trecho
+                    self._position = max(i, len(buffer) - len("</think>"))
+                    break
+                self._in_think = False
+                self._position = end + len("</think>")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_key = buffer[self._string_start + 1:i]
+            elif char == "<" and self._depth == 0:
+                if buffer.startswith("<think>", i):
+                    self._in_think = True
+                    self._position = i + len("<think>")
+                    continue
+                if len(buffer) - i < len("<think>") and "<think>".startswith(buffer[i:]):
+                    break  # Pode ser o começo de "<think>": espera mais texto
+            elif self._depth == 0 and char != "{":
+                pass  # Texto fora do JSON
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+                if (
+                    char == "[" and self._plan_depth is None
+                    and self._depth == 2 and self._last_key == "plan"
+                ):
+                    self._plan_depth = self._depth
+                elif char == "{" and self._plan_depth is not None and self._depth == self._plan_depth + 1:
+                    self._step_start = i
+            elif char in "}]":
+                if char == "}" and self._step_start is not None and self._depth == self._plan_depth + 1:
+                    step = self._parse_step(buffer[self._step_start:i + 1])
+                    if step is not None:
+                        steps.append(step)
+                    self._step_start = None
+                if char == "]" and self._plan_depth is not None and self._depth == self._plan_depth:
+                    self.done = True
+                    self._position = i + 1
+                    break
+                self._depth -= 1
+
+            self._position = i + 1
+
+        self._compact()
+        return steps
+
+    @staticmethod
+    def _parse_step(text: str):
+        try:
+            step = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug(f"Etapa parcial ignorada: {text[:80]}")
+            return None
+        return step if isinstance(step, dict) else None
+
+    def _compact(self):
+        """Descarta o texto já processado que não é mais necessário"""
+        keep_from = self._position
+        if self._step_start is not None:
+            keep_from = min(keep_from, self._step_start)
+        if self._in_string:
+            keep_from = min(keep_from, self._string_start)
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._position -= keep_from
+            if self._step_start is not None:
+                self._step_start -= keep_from
+            self._string_start -= keep_from
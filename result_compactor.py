@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import math
+import re
+
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from text_utils import estimate_tokens, terms
+from tracing import tracer
+
+logger = logging.getLogger("mcp-groq-client")
+
+# (solicitação, ferramenta, trecho, max_tokens) -> resumo do trecho
+SummarizeFn = Callable[[str, str, str, int], Awaitable[str]]
+
+ELISION = "\n[...]\n"
+NOTHING_RELEVANT = "NADA"
+
+
+def clean_output(text: str) -> str:
+    """Remove espaço desperdiçado (espaços à direita, linhas em branco repetidas)"""
+    text = re.sub(r"[ \t]+\n", "\n", text or "")
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def split_chunks(text: str, max_tokens: int) -> List[str]:
+    """Divide em pedaços de até `max_tokens`, preferindo quebras de linha"""
+    max_chars = max_tokens * 4
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.splitlines():
+        # Linhas enormes (JSON minificado, por exemplo) são cortadas à força
+        pieces = [line[i:i + max_chars] for i in range(0, len(line), max_chars)] or [""]
+        for piece in pieces:
+            if current and size + len(piece) + 1 > max_chars:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def rank_chunks(query: str, chunks: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """Relevância BM25 de cada pedaço em relação à solicitação"""
+    query_terms = set(terms(query))
+    chunk_terms = [Counter(terms(chunk)) for chunk in chunks]
+    lengths = [sum(counts.values()) for counts in chunk_terms]
+    avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+    n = len(chunks)
+    doc_freq = Counter(term for counts in chunk_terms for term in counts if term in query_terms)
+
+    scores = []
+    for counts, length in zip(chunk_terms, lengths):
+        total = 0.0
+        for term in query_terms:
+            tf = counts.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            norm = k1 * (1 - b + b * length / (avg_length or 1))
+            total += idf * tf * (k1 + 1) / (tf + norm)
+        scores.append(total)
+    return scores
+
+
+def allocate_budget(sizes: List[int], budget: int) -> List[int]:
+    """Divide o orçamento entre resultados: os pequenos entram inteiros e a sobra vai para os grandes"""
+    shares = [0] * len(sizes)
+    remaining = budget
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for position, index in enumerate(order):
+        fair = remaining // (len(sizes) - position)
+        shares[index] = min(sizes[index], fair)
+        remaining -= shares[index]
+    return shares
+
+
+class ResultCompactor:
+    """Compacta resultados de ferramentas para caber num orçamento de tokens.
+
+    O orçamento é repartido entre os resultados; quem cabe na sua parte entra
+    inteiro. Resultados maiores mantêm só os trechos mais relevantes para a
+    solicitação (BM25, na ordem original). Saídas muito grandes passam antes
+    por um map-reduce: pedaços resumidos em paralelo pelo modelo rápido e os
+    resumos compactados de novo, se preciso.
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[SummarizeFn] = None,
+        token_budget: int = 3000,
+        chunk_tokens: int = 200,
+        map_reduce_threshold: int = 6000,
+        map_chunk_tokens: int = 2000,
+        max_map_chunks: int = 8,
+    ):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+        self.map_reduce_threshold = map_reduce_threshold
+        self.map_chunk_tokens = map_chunk_tokens
+        self.max_map_chunks = max_map_chunks
+
+    async def compact(
+        self, request: str, results: List[Dict[str, Any]], token_budget: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Cópias dos resultados com `result` compactado e `compaction` indicando como"""
+        if not results:
+            return []
+        texts = [clean_output(str(result.get("result", ""))) for result in results]
+        sizes = [estimate_tokens(text) for text in texts]
+        shares = allocate_budget(sizes, token_budget or self.token_budget)
+
+        compacted = await asyncio.gather(*(
+            self._compact_one(request, result.get("tool", ""), text, size, share)
+            for result, text, size, share in zip(results, texts, sizes, shares)
+        ))
+
+        output = []
+        for result, (text, mode) in zip(results, compacted):
+            output.append({**result, "result": text, "compaction": mode})
+        tracer.annotate(
+            tokens_in=sum(sizes),
+            tokens_out=sum(estimate_tokens(item["result"]) for item in output),
+            summarized=sum(1 for item in output if item["compaction"] == "summarized"),
+        )
+        return output
+
+    async def _compact_one(self, request: str, tool: str, text: str, size: int, share: int):
+        if size <= share:
+            return text, "full"
+        if self.summarize and size > self.map_reduce_threshold:
+            try:
+                summary = await self._map_reduce(request, tool, text, share)
+                return self.select(request, summary, share), "summarized"
+            except Exception as e:
+                logger.warning(f"Falha ao resumir saída de {tool}: {e}")
+        return self.select(request, text, share), "selected"
+
+    def select(self, request: str, text: str, max_tokens: int) -> str:
+        """Trechos mais relevantes que cabem em `max_tokens`, na ordem original"""
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        chunks = split_chunks(text, min(self.chunk_tokens, max(max_tokens, 1)))
+        scores = rank_chunks(request, chunks)
+        # Empate (nada casou): favorece o começo da saída
+        ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+
+        chosen = []
+        used = 0
+        for index in ranked:
+            cost = estimate_tokens(chunks[index]) + 2
+            if used + cost > max_tokens:
+                continue
+            chosen.append(index)
+            used += cost
+        if not chosen:
+            return chunks[ranked[0]][:max_tokens * 4]
+
+        chosen.sort()
+        parts = []
+        for position, index in enumerate(chosen):
+            if position and index != chosen[position - 1] + 1:
+                parts.append(ELISION.strip())
+            parts.append(chunks[index])
+        if chosen[0] > 0:
+            parts.insert(0, ELISION.strip())
+        if chosen[-1] < len(chunks) - 1:
+            parts.append(ELISION.strip())
+        return "\n".join(parts)
+
+    async def _map_reduce(self, request: str, tool: str, text: str, share: int) -> str:
+        """Resume pedaços grandes em paralelo e junta os resumos"""
+        chunks = split_chunks(text, self.map_chunk_tokens)
+        if len(chunks) > self.max_map_chunks:
+            scores = rank_chunks(request, chunks)
+            keep = sorted(sorted(range(len(chunks)), key=lambda i: (-scores[i], i))[:self.max_map_chunks])
+            chunks = [chunks[i] for i in keep]
+
+        per_chunk = max(64, min(512, share // len(chunks)))
+        summaries = await asyncio.gather(*(
+            self.summarize(request, tool, chunk, per_chunk) for chunk in chunks
+        ))
+        relevant = [s.strip() for s in summaries if s and s.strip() and s.strip() != NOTHING_RELEVANT]
+        return "\n\n".join(relevant) or "(nenhuma informação relevante encontrada)"
@@ -0,0 +1,129 @@
+import logging
+import time
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from tracing import percentile
+
+logger = logging.getLogger("mcp-groq-client")
+
+
+class ToolUnavailable(RuntimeError):
+    """O servidor da ferramenta não pode atender (circuito aberto, startup falhou, prazo esgotado)"""
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Circuit breaker de um servidor MCP.
+
+    `failure_threshold` falhas seguidas (ou um `trip`, como uma falha de
+    startup) abrem o circuito: o servidor sai do planejamento e as chamadas
+    falham na hora. Passado o `cooldown`, uma única chamada de teste é
+    liberada (half-open); se ela funcionar o circuito fecha, senão reabre com
+    o dobro da espera (até `max_cooldown`).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = CLOSED
+        self.failures = 0        # Falhas seguidas
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._current_cooldown = cooldown
+        self._probing = False    # Chamada de teste em andamento (half-open)
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def retry_in(self) -> float:
+        """Segundos até o circuito aceitar a chamada de teste"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self._current_cooldown - time.monotonic())
+
+    @property
+    def available(self) -> bool:
+        """Se o servidor pode entrar no planejamento (fechado, ou aberto com a espera vencida)"""
+        return self.state != OPEN or self.retry_in == 0.0
+
+    def allow(self) -> bool:
+        """Reserva a chamada: False se o circuito está aberto ou já há um teste em andamento"""
+        if self.state == OPEN and self.retry_in == 0.0:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED or (self.state == HALF_OPEN and not self._probing):
+            self._probing = self.state == HALF_OPEN
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuito de {self.name} fechado: servidor recuperado")
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+        self._current_cooldown = self.cooldown
+
+    def record_failure(self, error: str = ""):
+        self.failures += 1
+        self.last_error = error or self.last_error
+        if self.state == HALF_OPEN:
+            self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def trip(self, error: str = ""):
+        """Abre o circuito imediatamente (ex.: o servidor nem iniciou)"""
+        self.last_error = error or self.last_error
+        if self.state == HALF_OPEN:
+            self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown)
+        if self.state != OPEN:
+            self._open()
+
+    def abandon(self):
+        """Chamada liberada que terminou sem veredito (cancelada, prazo da solicitação)"""
+        self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+        self.stats["opened"] += 1
+        logger.warning(
+            f"Circuito de {self.name} aberto por {self._current_cooldown:.0f}s "
+            f"({self.failures} falha(s); último erro: {self.last_error})"
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in, 3),
+            "last_error": self.last_error,
+            **self.stats,
+        }
+
+
+class LatencyWindow:
+    """Latências recentes de uma ferramenta (janela deslizante), para o limiar do hedge"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        return percentile(list(self._samples), pct)
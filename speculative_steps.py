@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from contextlib import AbstractAsyncContextManager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from plan_executor import ExecuteFn, find_references
+from tool_cache import canonical_key
+from tracing import Span, tracer
+
+logger = logging.getLogger("mcp-groq-client")
+
+
+class SpeculativeSteps:
+    """Adianta etapas do plano enquanto o planner ainda está gerando.
+
+    `offer` recebe cada etapa que o parser incremental completa e, se ela for
+    independente (sem `depends_on` nem `{{id}}`) e a ferramenta for segura
+    (`is_safe`), dispara a execução na hora. No plano final, `execute` entrega
+    o resultado especulativo da etapa idêntica (mesma ferramenta e argumentos)
+    em vez de chamar a ferramenta de novo; o que o plano final não usar é
+    descartado em `discard`.
+
+    `limit` reserva as mesmas vagas do executor do plano (global e por
+    servidor), e as chamadas ficam sob o span `parent` — não sob a chamada ao
+    LLM em andamento quando a etapa chega.
+    """
+
+    def __init__(
+        self,
+        execute_fn: ExecuteFn,
+        is_safe: Callable[[str], bool],
+        max_steps: int = 4,
+        limit: Optional[Callable[[str], AbstractAsyncContextManager]] = None,
+        parent: Optional[Span] = None,
+    ):
+        self.execute_fn = execute_fn
+        self.is_safe = is_safe
+        self.max_steps = max_steps
+        self.limit = limit
+        self.parent = parent
+        self._tasks: Dict[str, Tuple[asyncio.Task, asyncio.Event]] = {}
+        self.stats = {"started": 0, "used": 0, "discarded": 0}
+
+    def offer(self, step: Dict[str, Any]):
+        tool_key = step.get("tool")
+        arguments = step.get("arguments") or {}
+        if not isinstance(tool_key, str) or not isinstance(arguments, dict):
+            return
+        if step.get("depends_on") or find_references(arguments) or not self.is_safe(tool_key):
+            return
+        key = canonical_key(tool_key, arguments)
+        if key in self._tasks or len(self._tasks) >= self.max_steps:
+            return
+        logger.info(f"Execução especulativa: {tool_key}")
+        started = asyncio.Event()
+        self._tasks[key] = (asyncio.create_task(self._run(tool_key, arguments, started)), started)
+        self.stats["started"] += 1
+
+    async def _run(self, tool_key: str, arguments: Dict[str, Any], started: asyncio.Event) -> str:
+        if self.parent is not None:
+            return await tracer.activate(self.parent, self._call(tool_key, arguments, started))
+        return await self._call(tool_key, arguments, started)
+
+    async def _call(self, tool_key: str, arguments: Dict[str, Any], started: asyncio.Event) -> str:
+        if self.limit is None:
+            started.set()
+            return await self.execute_fn(tool_key, arguments)
+        async with self.limit(tool_key):
+            started.set()
+            return await self.execute_fn(tool_key, arguments)
+
+    async def execute(self, tool_key: str, arguments: Dict[str, Any]) -> str:
+        """Executor do plano final: reaproveita a etapa especulativa idêntica, se houver"""
+        task, started = self._tasks.pop(canonical_key(tool_key, arguments), (None, None))
+        if task is not None and self.limit is not None and not started.is_set():
+            # Ainda na fila das vagas que a etapa final já reservou: esperar por ela travaria
+            task.cancel()
+            self.stats["discarded"] += 1
+            task = None
+        if task is None:
+            return await self.execute_fn(tool_key, arguments)
+        self.stats["used"] += 1
+        return await task
+
+    def discard(self):
+        """Cancela/descarta as etapas que o plano final não aproveitou"""
+        for task, _ in self._tasks.values():
+            if not task.done():
+                task.cancel()
+            else:
+                # Consome a exceção (se houver) para não gerar aviso
+                task.cancelled() or task.exception()
+        self.stats["discarded"] += len(self._tasks)
+        self._tasks.clear()
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_agent(tmp_path, monkeypatch):
+    """GroqMcpAgent sem servidores MCP, com o LLM falso e caches num diretório temporário"""
+    monkeypatch.setenv("PLAN_CACHE_PATH", str(tmp_path / "plan_cache.sqlite"))
+    monkeypatch.setenv("TOOL_CATALOG_PATH", str(tmp_path / "tool_catalog.json"))
+    monkeypatch.delenv("CONVERSATION_DIR", raising=False)
+    monkeypatch.delenv("PLAN_ROUTER_LOG", raising=False)
+
+    from fake_llm import FakeChatCompletions, make_fake_groq_client
+    from groq_mcp_agent import GroqMcpAgent
+
+    def build(**backend_options):
+        backend = FakeChatCompletions(**{"latency_ms": 1.0, **backend_options})
+        agent = GroqMcpAgent(groq_client=make_fake_groq_client(backend))
+        return agent, backend
+
+    return build
+
+
+def run(coro):
+    """Roda uma corrotina de teste num event loop novo"""
+    return asyncio.run(coro)
+
+
+def add_bench_tools(agent):
+    """Registra `bench:fetch_data` e `bench:combine`, as ferramentas dos planos do LLM falso"""
+    from tool_info import ToolInfo
+
+    def schema(name: str):
+        return {"type": "object", "properties": {name: {"type": "string"}}, "required": [name]}
+
+    agent._set_server_tools("bench", {
+        "bench:fetch_data": ToolInfo("fetch_data", "Busca um registro", schema("key"), "bench"),
+        "bench:combine": ToolInfo("combine", "Combina registros", schema("parts"), "bench"),
+    })
+    agent._on_catalog_changed()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agent_events import ResponseComplete
+from agent_server import AgentServer
+from conftest import run
+from llm_scheduler import LlmDeadlineExceeded, current_deadline
+
+
+class StubAgent:
+    """Agent mínimo: registra o prazo que recebeu e responde depois de `delay`"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.remaining = []
+
+    async def process_request(self, user_request, conversation_id):
+        self.remaining.append(current_deadline() - asyncio.get_running_loop().time())
+        await asyncio.sleep(self.delay)
+        return f"ok: {user_request}"
+
+
+async def post(server: AgentServer, path: str, body):
+    transport = httpx.ASGITransport(app=server.build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://agent") as client:
+        return await client.post(path, json=body)
+
+
+@pytest.mark.parametrize("timeout", ["abc", 0, -1, True, [5]])
+def test_invalid_timeout_is_rejected(timeout):
+    server = AgentServer(StubAgent(), request_timeout=30.0)
+    response = run(post(server, "/v1/requests", {"request": "oi", "timeout": timeout}))
+    assert response.status_code == 400
+    assert "timeout" in response.json()["error"]
+
+
+def test_timeout_is_clamped_to_operator_limit():
+    agent = StubAgent()
+    server = AgentServer(agent, request_timeout=5.0)
+    response = run(post(server, "/v1/requests", {"request": "oi", "timeout": 3600}))
+    assert response.status_code == 200
+    assert agent.remaining[0] <= 5.0
+
+
+def test_client_timeout_shorter_than_limit_is_honored():
+    server = AgentServer(StubAgent(delay=1.0), request_timeout=30.0)
+    response = run(post(server, "/v1/requests", {"request": "oi", "timeout": 0.05}))
+    assert response.status_code == 504
+
+
+class StreamingStubAgent(StubAgent):
+    async def process_request_stream(self, user_request, conversation_id):
+        await asyncio.sleep(self.delay)
+        yield ResponseComplete(response=f"ok: {user_request}", seconds=self.delay)
+
+
+def test_stream_closed_before_iteration_releases_admission_slot():
+    async def scenario():
+        server = AgentServer(StreamingStubAgent(), max_concurrent=1, max_queue=0)
+        events = await server.open_stream("oi", "c1")
+        assert server.admission.in_flight == 1
+        await events.aclose()
+        assert server.admission.in_flight == 0
+
+        # A vaga devolvida atende a próxima solicitação
+        events = await server.open_stream("de novo", "c1")
+        assert [event.response async for event in events] == ["ok: de novo"]
+        assert server.admission.in_flight == 0
+
+    run(scenario())
+
+
+def test_stream_released_when_events_fail():
+    async def scenario():
+        server = AgentServer(StreamingStubAgent(delay=1.0), max_concurrent=1, max_queue=0)
+        events = await server.open_stream("oi", "c1", timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await events.__anext__()
+        assert server.admission.in_flight == 0
+
+    run(scenario())
+
+
+def test_stream_endpoint_releases_admission_slot():
+    server = AgentServer(StreamingStubAgent(), max_concurrent=1, max_queue=0)
+    response = run(post(server, "/v1/requests/stream", {"request": "oi"}))
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["type"] for line in lines] == ["conversation", "response_complete"]
+    assert server.admission.in_flight == 0
+
+
+def test_llm_deadline_exceeded_maps_to_504(make_agent):
+    agent, _ = make_agent()
+
+    async def plan_past_deadline(*args):
+        raise LlmDeadlineExceeded("planner não cabe no prazo")
+        yield
+
+    agent._plan_stream = plan_past_deadline
+    server = AgentServer(agent, request_timeout=30.0)
+    response = run(post(server, "/v1/requests", {"request": "oi"}))
+    assert response.status_code == 504
+
+    response = run(post(server, "/v1/requests/stream", {"request": "oi"}))
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"type": "error", "error": "Tempo limite excedido"}
+    assert server.admission.in_flight == 0
+
+
+def test_requests_queued_on_one_conversation_do_not_hold_admission_slots():
+    async def scenario():
+        agent = StubAgent(delay=0.2)
+        server = AgentServer(agent, max_concurrent=2, max_queue=0)
+        busy = [asyncio.create_task(server.handle(f"pedido {i}", "mesma-conversa")) for i in range(3)]
+        await asyncio.sleep(0.05)
+        # Só a primeira da conversa ocupa vaga; a outra conversa ainda é admitida
+        assert server.admission.in_flight == 1
+        assert await asyncio.wait_for(server.handle("outra", "outra-conversa"), timeout=0.3) == "ok: outra"
+        assert await asyncio.gather(*busy) == [f"ok: pedido {i}" for i in range(3)]
+
+        events = await server.open_stream("stream", "mesma-conversa")
+        waiting = asyncio.create_task(server.open_stream("na fila", "mesma-conversa", timeout=0.05))
+        await asyncio.sleep(0)
+        assert server.admission.in_flight == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await waiting
+        await events.aclose()
+        assert server.admission.in_flight == 0
+        assert not server._conversation_lock("mesma-conversa").locked()
+
+    run(scenario())
@@ -0,0 +1,65 @@
+import json
+
+from agent_events import ResponseComplete
+from batch_runner import BatchRunner
+from conftest import run
+
+
+class StubAgent:
+    """Responde ecoando a solicitação; as de `failing` terminam com erro, como o agent faz"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def process_request_stream(self, user_request, conversation_id):
+        self.calls.append(user_request)
+        if user_request in self.failing:
+            yield ResponseComplete("Erro ao processar solicitação: falhou", 0.0, error="falhou")
+        else:
+            yield ResponseComplete(f"ok: {user_request}", 0.0)
+
+    def end_conversation(self, conversation_id):
+        pass
+
+
+def write_input(path, requests):
+    path.write_text("".join(json.dumps({"id": request_id, "request": text}) + "\n" for request_id, text in requests))
+
+
+def read_output(path):
+    return {record["id"]: record for record in map(json.loads, path.read_text().splitlines())}
+
+
+def test_failed_requests_are_recorded_and_retried_on_resume(tmp_path):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(input_path, [("a", "Liste /tmp"), ("b", "Leia /tmp/x.txt")])
+
+    stats = run(BatchRunner(StubAgent(failing={"Leia /tmp/x.txt"})).run(str(input_path), str(output_path)))
+    assert stats["errors"] == 1
+    records = read_output(output_path)
+    assert records["b"]["error"] == "falhou"
+    assert "error" not in records["a"]
+
+    agent = StubAgent()
+    stats = run(BatchRunner(agent).run(str(input_path), str(output_path), resume=True))
+    assert agent.calls == ["Leia /tmp/x.txt"]
+    assert stats["skipped"] == 1 and stats["processed"] == 1
+    assert read_output(output_path)["b"]["response"] == "ok: Leia /tmp/x.txt"
+
+
+def test_dedupe_ignores_only_whitespace(tmp_path):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_input(input_path, [
+        ("a", "Leia /tmp/Report.TXT"),
+        ("b", "leia /tmp/report.txt"),
+        ("c", "  Leia   /tmp/Report.TXT "),
+    ])
+
+    agent = StubAgent()
+    stats = run(BatchRunner(agent, concurrency=1).run(str(input_path), str(output_path)))
+    assert sorted(agent.calls) == ["Leia /tmp/Report.TXT", "leia /tmp/report.txt"]
+    assert stats["deduplicated"] == 1
+    records = read_output(output_path)
+    assert records["b"]["response"] == "ok: leia /tmp/report.txt"
+    assert records["c"]["deduplicated_from"] == "a"
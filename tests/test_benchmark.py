@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from agent_events import ResponseComplete
+from benchmark import run_requests
+from conftest import add_bench_tools, run
+
+
+def test_failed_requests_are_counted(make_agent):
+    agent, _ = make_agent()
+
+    async def failing_plan(*args):
+        raise RuntimeError("planner indisponível")
+        yield
+
+    agent._plan_stream = failing_plan
+    assert run(run_requests(agent, count=3, concurrency=2, prefix="bench", workload="fan-out")) == 3
+
+
+def test_successful_requests_have_no_errors(make_agent):
+    agent, backend = make_agent(fan_out=2)
+    add_bench_tools(agent)
+
+    calls = []
+
+    async def call_server(tool_key, tool_info, arguments):
+        calls.append((tool_key, arguments))
+        text = f"valor de {arguments['key']}" if "key" in arguments else f"combinado: {arguments['parts']}"
+        return SimpleNamespace(content=[SimpleNamespace(text=text)], isError=False)
+
+    agent._call_server = call_server
+    completed = []
+    process_request_stream = agent.process_request_stream
+
+    async def recording_stream(user_request, conversation_id):
+        async for event in process_request_stream(user_request, conversation_id):
+            if isinstance(event, ResponseComplete):
+                completed.append(event)
+            yield event
+
+    agent.process_request_stream = recording_stream
+    assert run(run_requests(agent, count=2, concurrency=2, prefix="bench", workload="fan-out")) == 0
+
+    # O plano rodou de verdade: buscas e a combinação com as saídas delas
+    fetched = {arguments["key"] for tool_key, arguments in calls if tool_key == "bench:fetch_data"}
+    assert fetched == {"record-0", "record-1"}
+    combined = [arguments["parts"] for tool_key, arguments in calls if tool_key == "bench:combine"]
+    assert combined and all(parts == "valor de record-0+valor de record-1" for parts in combined)
+    assert [event.error for event in completed] == [None, None]
+    assert all(event.response == backend.answer() for event in completed)
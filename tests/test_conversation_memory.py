@@ -0,0 +1,32 @@
+import asyncio
+
+from conftest import run
+from conversation_memory import ConversationStore
+from llm_scheduler import current_deadline, set_deadline
+
+
+def test_background_summary_does_not_inherit_request_deadline():
+    async def scenario():
+        deadlines = []
+
+        async def summarize(summary, messages, max_tokens):
+            deadlines.append(current_deadline())
+            await asyncio.sleep(0.05)
+            return "resumo"
+
+        store = ConversationStore(summarize, window_tokens=20)
+
+        async def request():
+            # Solicitação perto do fim do prazo dispara o resumo
+            set_deadline(asyncio.get_running_loop().time() + 0.01)
+            for i in range(4):
+                store.append("c1", "user", f"mensagem longa número {i} " * 3)
+
+        await request()
+        memory = store.get("c1")
+        await memory.task
+        assert deadlines and all(deadline is None for deadline in deadlines)
+        assert memory.summary == "resumo"
+        assert not memory.pending
+
+    run(scenario())
@@ -0,0 +1,37 @@
+import asyncio
+import os
+
+import pytest
+
+from conftest import run
+from main import StdinReader
+
+
+def test_stdin_reader_does_not_block_event_loop(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    stdin = os.fdopen(read_fd)
+    monkeypatch.setattr("sys.stdin", stdin)
+
+    async def scenario():
+        reader = StdinReader()
+        ticks = []
+
+        async def typing():
+            await asyncio.sleep(0.05)
+            ticks.append(len(ticks))  # Outras tasks rodam enquanto a leitura espera
+            os.write(write_fd, "um\ndois ação\ntrês".encode())
+            os.close(write_fd)
+
+        task = asyncio.create_task(typing())
+        assert await reader.readline("> ") == "um"
+        assert ticks == [0]
+        assert await reader.readline("> ") == "dois ação"
+        assert await reader.readline("> ") == "três"
+        with pytest.raises(EOFError):
+            await reader.readline("> ")
+        await task
+
+    try:
+        run(scenario())
+    finally:
+        stdin.close()
@@ -0,0 +1,87 @@
+import pytest
+
+from conftest import add_bench_tools, run
+from plan_cache import PlanCache, normalize_request, refers_to_context
+
+PLAN = [{"id": "step1", "tool": "filesystem:read_file", "arguments": {"path": "/tmp/Report.TXT"}}]
+
+
+def make_cache(tmp_path, **options) -> PlanCache:
+    cache = PlanCache(str(tmp_path / "plans.sqlite"), **options)
+    cache.set_catalog("catalogo")
+    return cache
+
+
+def test_normalize_keeps_literal_tokens_verbatim():
+    assert normalize_request("  Leia   o Relatório /tmp/Report.TXT! ") == "leia o relatorio /tmp/Report.TXT"
+    assert normalize_request('Busque "Ação X" em https://Exemplo.com/A') == 'busque "Ação X" em https://Exemplo.com/A'
+
+
+def test_case_sensitive_paths_do_not_share_a_plan(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("Leia /tmp/Report.TXT", PLAN)
+    assert cache.get("leia /tmp/report.txt") is None
+    assert cache.get("LEIA /tmp/Report.TXT") == PLAN
+    cache.close()
+
+
+def test_words_still_normalized(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("Liste o diretório atual.", PLAN)
+    assert cache.get("liste o diretorio atual") == PLAN
+    cache.close()
+
+
+def test_similar_requests_require_identical_literals(tmp_path):
+    cache = make_cache(tmp_path, similarity_threshold=0.5)
+    cache.put("Leia o arquivo /tmp/Report.TXT por favor", PLAN)
+    assert cache.get("leia o arquivo /tmp/report.txt por favor") is None
+    assert cache.get("leia esse arquivo /tmp/Report.TXT por favor") == PLAN
+    cache.close()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Liste os arquivos de /tmp", False),
+    ("O arquivo está em /tmp?", False),
+    ("Leia esse arquivo", True),
+    ("Abra-o e resuma", True),
+    ("Faça o mesmo para /var", True),
+    ("Summarize it", True),
+    ("e em /var?", True),
+    ("agora em /var", True),
+    ("resuma", True),
+    ("Liste /tmp", False),
+])
+def test_refers_to_context(text, expected):
+    assert refers_to_context(text) is expected
+
+
+def test_plan_cache_used_across_turns_unless_request_refers_back(make_agent):
+    agent, _ = make_agent()
+    agent.plan_cache.set_catalog("catalogo")
+    agent.plan_cache.put("Liste os arquivos de /tmp", PLAN)
+    agent.plan_cache.put("Leia esse arquivo", PLAN)
+    context = "Usuário: Liste os arquivos de /var"
+
+    assert run(agent._plan_execution("Liste os arquivos de /tmp", context)) == PLAN
+    assert agent.plan_cache.stats["hits"] == 1
+    run(agent._plan_execution("Leia esse arquivo", context))
+    assert agent.plan_cache.stats["hits"] == 1
+    run(agent.close())
+
+
+def test_plan_made_with_context_is_not_shared_with_other_conversations(make_agent):
+    agent, backend = make_agent()
+    add_bench_tools(agent)
+    request = "Obtenha o registro da chave record-7"
+
+    # Conversa A: o plano foi feito com o contexto dela e não vai para o cache
+    run(agent._plan_execution(request, "Usuário: leia os logs de /tmp"))
+    assert agent.plan_cache.get(request) is None
+
+    # Conversa B, sem contexto: não reaproveita o plano de A; o dela é gravado
+    calls = backend.calls
+    plan = run(agent._plan_execution(request))
+    assert backend.calls > calls
+    assert agent.plan_cache.get(request) == plan
+    run(agent.close())
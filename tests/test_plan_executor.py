@@ -0,0 +1,31 @@
+import asyncio
+
+from conftest import run
+from plan_executor import PlanExecutor
+
+
+def test_saturated_server_does_not_block_other_servers():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        async def execute(tool_key, arguments):
+            started[arguments["id"]] = loop.time() - start
+            await asyncio.sleep(0.2 if tool_key.startswith("slow:") else 0.0)
+            return "ok"
+
+        executor = PlanExecutor(execute, max_concurrency=2)
+        executor.set_server_limit("slow", 1)
+        executor.set_server_limit("other", 1)
+        plan = [
+            {"id": f"slow{i}", "tool": "slow:read", "arguments": {"id": f"slow{i}"}} for i in range(3)
+        ] + [{"id": "fast", "tool": "other:read", "arguments": {"id": "fast"}}]
+
+        start = loop.time()
+        results = await executor.run(plan)
+        assert all(result["ok"] for result in results)
+        # As etapas na fila do servidor lento não ocupam a segunda vaga global
+        assert started["fast"] < 0.1
+        assert started["slow2"] >= 0.35
+
+    run(scenario())
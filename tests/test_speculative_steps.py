@@ -0,0 +1,65 @@
+import asyncio
+
+from conftest import run
+from plan_executor import PlanExecutor
+from speculative_steps import SpeculativeSteps
+from tracing import tracer
+
+
+class Tool:
+    """Executor de ferramenta que mede a concorrência e registra o span pai de cada chamada"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.parents = []
+
+    async def __call__(self, tool_key, arguments):
+        span = tracer.start_span("tool.call")
+        self.parents.append(span.parent_id)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return f"{tool_key} {arguments}"
+
+
+def step(step_id: str, key: str):
+    return {"id": step_id, "tool": "srv:fetch", "arguments": {"key": key}, "depends_on": []}
+
+
+def test_speculative_steps_respect_executor_limits():
+    async def scenario():
+        tool = Tool()
+        executor = PlanExecutor(tool)
+        executor.set_server_limit("srv", 1)
+        speculation = SpeculativeSteps(tool, lambda tool_key: True, limit=executor.limit)
+        plan = [step("a", "1"), step("b", "2"), step("c", "3")]
+        for planned in plan[:2]:
+            speculation.offer(planned)
+        await asyncio.sleep(0)
+
+        # A etapa final pode reservar a vaga antes da especulativa que ainda está na fila
+        results = await asyncio.wait_for(executor.run(plan, execute_fn=speculation.execute), timeout=2.0)
+        speculation.discard()
+        assert all(result["ok"] for result in results)
+        assert tool.max_running == 1
+
+    run(scenario())
+
+
+def test_speculative_calls_are_parented_to_the_plan_span():
+    async def scenario():
+        tool = Tool(delay=0.0)
+        plan_span = tracer.start_span("plan")
+        speculation = SpeculativeSteps(tool, lambda tool_key: True, parent=plan_span)
+        with tracer.span("llm.completion", parent=plan_span):
+            speculation.offer(step("a", "1"))
+        assert await speculation.execute("srv:fetch", {"key": "1"}) == "srv:fetch {'key': '1'}"
+        assert tool.parents == [plan_span.span_id]
+        assert speculation.stats["used"] == 1
+
+    run(scenario())
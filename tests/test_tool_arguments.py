@@ -0,0 +1,27 @@
+from tool_arguments import ToolArguments
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"path": {"type": "string"}, "recursive": {"type": "boolean"}},
+    "required": ["path"],
+}
+
+
+def test_unknown_key_renamed_when_value_fits():
+    prepared = ToolArguments(SCHEMA).prepare({"location": "/tmp"})
+    assert prepared.ok
+    assert prepared.arguments == {"path": "/tmp"}
+    assert "location -> path" in prepared.repairs
+
+
+def test_unknown_key_with_incompatible_value_is_not_renamed():
+    schema = {**SCHEMA, "properties": {"path": {"type": "string"}}}
+    prepared = ToolArguments(schema).prepare({"recursive": True})
+    assert prepared.missing == ["path"]
+    assert "path" not in prepared.arguments
+
+
+def test_unknown_key_needing_conversion_is_not_renamed():
+    schema = {"type": "object", "properties": {"count": {"type": "integer"}}, "required": ["count"]}
+    prepared = ToolArguments(schema).prepare({"quantidade": "5"})
+    assert prepared.missing == ["count"]
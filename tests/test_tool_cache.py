@@ -0,0 +1,39 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import run
+from llm_scheduler import current_deadline, set_deadline
+from tool_cache import ToolResultCache
+
+
+def test_collapsed_call_is_not_cut_by_first_callers_deadline():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        cache = ToolResultCache(allowlist=["srv:*"])
+        deadlines = []
+
+        async def call():
+            # Como o agent: a chamada respeita o prazo do contexto em que roda
+            deadline = current_deadline()
+            deadlines.append(deadline)
+            timeout = deadline - loop.time() if deadline is not None else None
+            await asyncio.wait_for(asyncio.sleep(0.1), timeout)
+            return SimpleNamespace(isError=False, value="ok")
+
+        async def request(deadline):
+            set_deadline(deadline)
+            return await cache.get_or_call("srv:read", {"key": "a"}, call)
+
+        first = asyncio.create_task(request(loop.time() + 0.03))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(request(None))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(first, 0.03)
+        assert (await second).value == "ok"
+        assert deadlines == [None]
+        assert cache.stats["collapsed"] == 1
+
+    run(scenario())
@@ -0,0 +1,24 @@
+from tool_catalog import ToolCatalog, function_name
+from tool_info import ToolInfo
+
+
+def make_tool(server: str, name: str) -> ToolInfo:
+    return ToolInfo(name=name, description=f"Ferramenta {name}", input_schema={}, server_name=server)
+
+
+def test_truncated_function_names_do_not_collide():
+    prefix = "consulta_" + "x" * 60
+    tools = {f"srv:{prefix}_{suffix}": make_tool("srv", f"{prefix}_{suffix}") for suffix in ("a", "b")}
+    catalog = ToolCatalog(tools)
+
+    names = [tool.function["function"]["name"] for tool in catalog.tools]
+    assert len(set(names)) == 2
+    assert all(len(name) <= 64 for name in names)
+    for key, tool in zip(tools, catalog.tools):
+        assert catalog.resolve_function(tool.function["function"]["name"]) == key
+
+
+def test_unique_names_are_kept():
+    catalog = ToolCatalog({"fs:read_file": make_tool("fs", "read_file")})
+    assert catalog.tools[0].function["function"]["name"] == function_name("fs:read_file") == "fs__read_file"
+    assert catalog.resolve_function("fs__read_file") == "fs:read_file"
@@ -0,0 +1,44 @@
+import re
+import unicodedata
+
+from typing import List
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Equivalências PT -> EN para casar solicitações em português com descrições de ferramentas
+SYNONYMS = {
+    "ler": "read", "leia": "read", "le": "read", "conteudo": "content", "abrir": "read", "abra": "read",
+    "arquivo": "file", "ficheiro": "file", "texto": "text",
+    "listar": "list", "liste": "list", "lista": "list", "mostre": "list", "mostrar": "list",
+    "diretorio": "directory", "pasta": "directory", "arvore": "tree",
+    "escrever": "write", "escreva": "write", "salvar": "write", "salve": "write", "grave": "write",
+    "criar": "create", "crie": "create", "mover": "move", "mova": "move", "renomear": "move", "renomeie": "move",
+    "editar": "edit", "edite": "edit", "buscar": "search", "busque": "search", "busca": "search",
+    "pesquisar": "search", "pesquise": "search", "pesquisa": "search", "procure": "search", "procurar": "search",
+    "encontre": "search", "noticia": "news", "internet": "web", "site": "web", "local": "local",
+    "informacao": "info", "informacoe": "info", "tamanho": "size", "permitido": "allowed",
+    "registro": "record", "chave": "key", "obter": "fetch", "obtenha": "fetch", "traga": "fetch",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa rápida de tokens (~4 caracteres por token), sem tokenizer externo"""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def terms(text: str) -> List[str]:
+    """Termos normalizados (minúsculas, sem acento, singular simples, sinônimos PT->EN)"""
+    result = []
+    for word in WORD.findall(strip_accents(text.lower().replace("_", " "))):
+        word = _singular(word)
+        result.append(_singular(SYNONYMS.get(word, word)))
+    return result
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
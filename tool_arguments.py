@@ -0,0 +1,247 @@
+"""
+Validação e coerção dos argumentos de ferramentas MCP
+O `input_schema` de cada ferramenta é compilado uma vez, na descoberta
+"""
+import copy
+import json
+import re
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from plan_executor import find_references
+from tool_info import ToolInfo
+
+# Nomes alternativos que os modelos costumam usar para o mesmo argumento
+COMMON_ALIASES = {
+    "query": ("search", "q", "text", "term", "keywords", "search_query", "query_string"),
+    "path": ("file", "filename", "file_path", "filepath", "directory", "dir", "folder"),
+    "paths": ("files", "filenames", "file_paths"),
+    "url": ("link", "uri", "href"),
+    "content": ("text", "body", "data", "contents"),
+    "count": ("limit", "n", "num", "max_results", "top_k"),
+    "key": ("id", "name"),
+}
+
+INTEGER = re.compile(r"[+-]?\d+")
+BOOLEANS = {"true": True, "false": False, "1": True, "0": False, "yes": True, "no": False, "sim": True, "não": False}
+
+
+def normalize_name(name: str) -> str:
+    """`filePath`, `file_path` e `file-path` viram `filepath`"""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _json_types(schema: Dict[str, Any]) -> Tuple[str, ...]:
+    """Tipos aceitos, incluindo `anyOf`/`oneOf` (ex.: Optional[int] do pydantic)"""
+    kind = schema.get("type")
+    if isinstance(kind, str):
+        return (kind,)
+    if isinstance(kind, list):
+        return tuple(k for k in kind if isinstance(k, str))
+    types: List[str] = []
+    for option in (schema.get("anyOf") or []) + (schema.get("oneOf") or []):
+        if isinstance(option, dict):
+            types.extend(t for t in _json_types(option) if t not in types)
+    return tuple(types)
+
+
+def _is_type(value: Any, kind: str) -> bool:
+    if kind == "string":
+        return isinstance(value, str)
+    if kind == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    if kind == "array":
+        return isinstance(value, list)
+    if kind == "object":
+        return isinstance(value, dict)
+    if kind == "null":
+        return value is None
+    return True
+
+
+def _convert(value: Any, kind: str) -> Tuple[Any, bool]:
+    """Tenta converter `value` para o tipo JSON `kind`"""
+    if kind == "integer":
+        if isinstance(value, str) and INTEGER.fullmatch(value.strip()):
+            return int(value), True
+        if isinstance(value, float) and value.is_integer():
+            return int(value), True
+    elif kind == "number" and isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return value, False
+        return (int(number) if number.is_integer() and INTEGER.fullmatch(value.strip()) else number), True
+    elif kind == "boolean" and isinstance(value, str) and value.strip().lower() in BOOLEANS:
+        return BOOLEANS[value.strip().lower()], True
+    elif kind == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value), True
+    elif kind in ("array", "object") and isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            parsed = None
+        if _is_type(parsed, kind):
+            return parsed, True
+    if kind == "array" and not isinstance(value, (list, dict)):
+        return [value], True
+    return value, False
+
+
+@dataclass
+class ArgumentSpec:
+    """Um argumento compilado do schema"""
+    name: str
+    types: Tuple[str, ...] = ()       # Vazio: qualquer tipo
+    item_types: Tuple[str, ...] = ()  # Tipos dos itens de um array
+    enum: Optional[List[Any]] = None
+    default: Any = None               # None: sem default (o servidor decide)
+
+    def coerce(self, value: Any) -> Tuple[Any, bool]:
+        """(valor convertido, se é válido)"""
+        if self.types and not any(_is_type(value, kind) for kind in self.types):
+            for kind in self.types:
+                value, ok = _convert(value, kind)
+                if ok:
+                    break
+            else:
+                return value, False
+        if self.item_types and isinstance(value, list):
+            items = []
+            for item in value:
+                if not any(_is_type(item, kind) for kind in self.item_types):
+                    item, ok = next(
+                        (converted for converted in (_convert(item, kind) for kind in self.item_types) if converted[1]),
+                        (item, False),
+                    )
+                    if not ok:
+                        return value, False
+                items.append(item)
+            value = items
+        if self.enum is not None and value not in self.enum:
+            return value, False
+        return value, True
+
+    def expected(self) -> str:
+        if self.enum is not None:
+            return f"um de {self.enum}"
+        return "|".join(self.types) or "qualquer"
+
+
+@dataclass
+class PreparedArguments:
+    """Resultado da validação: argumentos prontos para o servidor e os problemas encontrados"""
+    arguments: Dict[str, Any]
+    missing: List[str] = field(default_factory=list)
+    invalid: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)  # Aliases e conversões aplicados
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.invalid
+
+    def describe(self) -> str:
+        return "; ".join([f"argumento obrigatório ausente: {name}" for name in self.missing] + self.invalid)
+
+
+class ToolArguments:
+    """Validador e coercor dos argumentos de uma ferramenta, compilado do `input_schema`.
+
+    Mapeia nomes alternativos para os do schema (grafia diferente ou
+    sinônimos comuns sem ambiguidade na ferramenta), converte tipos simples
+    ("5" -> 5, "true" -> True, escalar -> [escalar]), completa defaults e
+    descarta argumentos desconhecidos (salvo com `additionalProperties`).
+    Valores com referências `{{id}}` só são verificados depois de resolvidos.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Any]]):
+        schema = schema or {}
+        properties = schema.get("properties") or {}
+        self.properties: Dict[str, ArgumentSpec] = {}
+        for name, prop in properties.items():
+            prop = prop if isinstance(prop, dict) else {}
+            items = prop.get("items")
+            self.properties[name] = ArgumentSpec(
+                name=name,
+                types=_json_types(prop),
+                item_types=_json_types(items) if isinstance(items, dict) else (),
+                enum=prop.get("enum") if isinstance(prop.get("enum"), list) else None,
+                default=prop.get("default"),
+            )
+        self.required = [name for name in schema.get("required") or [] if isinstance(name, str)]
+        # Schema sem propriedades declaradas: nada a validar, os argumentos seguem como vieram
+        self.passthrough = not properties
+        self.additional = schema.get("additionalProperties") not in (None, False)
+        self.aliases = self._alias_map()
+
+    def _alias_map(self) -> Dict[str, str]:
+        """Nome normalizado -> argumento do schema; aliases ambíguos ficam de fora"""
+        candidates: Dict[str, set] = {}
+        for name in self.properties:
+            for alias in (name, *COMMON_ALIASES.get(normalize_name(name), ())):
+                candidates.setdefault(normalize_name(alias), set()).add(name)
+        own = {normalize_name(name): name for name in self.properties}
+        aliases = {alias: next(iter(names)) for alias, names in candidates.items() if len(names) == 1}
+        aliases.update(own)  # O próprio nome sempre vence um sinônimo
+        return aliases
+
+    def prepare(self, params: Any) -> PreparedArguments:
+        if not isinstance(params, dict):
+            return PreparedArguments({}, invalid=["os argumentos devem ser um objeto JSON"])
+        if self.passthrough:
+            return PreparedArguments(dict(params))
+
+        prepared = PreparedArguments({})
+        arguments = prepared.arguments
+        unknown: Dict[str, Any] = {}
+        for key, value in params.items():
+            name = key if key in self.properties else self.aliases.get(normalize_name(key))
+            if name is None or (self.additional and key not in self.properties):
+                unknown[key] = value
+            elif name not in arguments or key == name:
+                if key != name:
+                    prepared.repairs.append(f"{key} -> {name}")
+                arguments[name] = value
+
+        missing = [name for name in self.required if name not in arguments]
+        if len(unknown) == 1 and len(missing) == 1:
+            # Um argumento desconhecido e um obrigatório faltando: provavelmente o mesmo com outro nome,
+            # desde que o valor já sirva como está ({"recursive": true} não vira path=True)
+            key, value = next(iter(unknown.items()))
+            spec = self.properties.get(missing[0])
+            coerced, ok = spec.coerce(value) if spec else (value, False)
+            if find_references(value) or (ok and type(coerced) is type(value) and coerced == value):
+                del unknown[key]
+                arguments[missing[0]] = value
+                prepared.repairs.append(f"{key} -> {missing[0]}")
+        if self.additional:
+            arguments.update(unknown)
+        else:
+            prepared.repairs.extend(f"{key} ignorado" for key in unknown)
+
+        for name, value in arguments.items():
+            spec = self.properties.get(name)
+            if spec is None or find_references(value):
+                continue
+            coerced, ok = spec.coerce(value)
+            if not ok:
+                prepared.invalid.append(f"{name}: esperado {spec.expected()}, recebido {json.dumps(value, default=str)[:60]}")
+            elif coerced is not value:
+                arguments[name] = coerced
+                prepared.repairs.append(f"{name} convertido")
+
+        for name, spec in self.properties.items():
+            if name not in arguments and spec.default is not None:
+                arguments[name] = copy.deepcopy(spec.default)
+        prepared.missing = [name for name in self.required if name not in arguments]
+        return prepared
+
+
+def compile_arguments(tools: Dict[str, ToolInfo]) -> Dict[str, ToolArguments]:
+    """Compila os validadores de um conjunto de ferramentas"""
+    return {key: ToolArguments(tool.input_schema) for key, tool in tools.items()}
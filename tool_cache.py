@@ -0,0 +1,201 @@
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from llm_scheduler import without_deadline
+from tracing import tracer
+
+logger = logging.getLogger("mcp-groq-client")
+
+# Ferramentas sem efeitos colaterais que podem ser cacheadas por padrão
+DEFAULT_ALLOWLIST = [
+    "*:read_*", "*:list_*", "*:get_*", "*:search_*", "*:*_search",
+    "*:directory_tree", "*:get_file_info",
+]
+
+# Ferramentas com efeitos colaterais: nunca são cacheadas (têm prioridade sobre a allowlist)
+DEFAULT_DENYLIST = [
+    "*:write_*", "*:edit_*", "*:move_*", "*:create_*", "*:delete_*", "*:remove_*",
+]
+
+# TTL (segundos) por ferramenta; padrões no mesmo formato das listas acima
+DEFAULT_TTLS = {
+    "brave-search:*": 300.0,
+    "filesystem:*": 60.0,
+}
+
+# Argumentos que apontam para arquivos: usados para invalidar por mtime e por escrita
+PATH_ARGUMENTS = ("path", "paths", "source", "destination")
+
+
+def canonical_key(tool_key: str, arguments: Dict[str, Any]) -> str:
+    """Chave estável para (servidor, ferramenta, argumentos canonicalizados)"""
+    return f"{tool_key}|{json.dumps(arguments, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+def extract_paths(arguments: Dict[str, Any]) -> Tuple[str, ...]:
+    """Caminhos de arquivo presentes nos argumentos, normalizados"""
+    paths: List[str] = []
+    for name in PATH_ARGUMENTS:
+        value = arguments.get(name)
+        values = value if isinstance(value, list) else [value]
+        for item in values:
+            if isinstance(item, str) and item:
+                paths.append(os.path.normpath(os.path.abspath(os.path.expanduser(item))))
+    return tuple(paths)
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """Indica se um caminho é igual, pai ou filho do outro"""
+    return a == b or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+
+def _matches(tool_key: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch.fnmatchcase(tool_key, pattern) for pattern in patterns)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    paths: Tuple[str, ...] = ()
+    mtimes: Tuple[Optional[float], ...] = field(default_factory=tuple)
+
+
+class ToolResultCache:
+    """Cache de resultados de ferramentas MCP idempotentes (TTL + LRU).
+
+    Chamadas idênticas simultâneas são colapsadas em uma só. Entradas com
+    caminhos de arquivo são invalidadas quando o mtime muda ou quando uma
+    ferramenta de escrita toca o mesmo caminho.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        default_ttl: float = 60.0,
+        ttls: Optional[Dict[str, float]] = None,
+        allowlist: Optional[List[str]] = None,
+        denylist: Optional[List[str]] = None,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.allowlist = list(DEFAULT_ALLOWLIST if allowlist is None else allowlist)
+        self.denylist = list(DEFAULT_DENYLIST if denylist is None else denylist)
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "collapsed": 0, "evictions": 0, "invalidations": 0}
+
+    def is_denied(self, tool_key: str) -> bool:
+        """Ferramenta com efeitos colaterais (denylist)"""
+        return _matches(tool_key, self.denylist)
+
+    def is_cacheable(self, tool_key: str) -> bool:
+        if self.is_denied(tool_key):
+            return False
+        return _matches(tool_key, self.allowlist)
+
+    def ttl_for(self, tool_key: str) -> float:
+        if tool_key in self.ttls:
+            return self.ttls[tool_key]
+        for pattern, ttl in self.ttls.items():
+            if fnmatch.fnmatchcase(tool_key, pattern):
+                return ttl
+        return self.default_ttl
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic() or tuple(_mtime(p) for p in entry.paths) != entry.mtimes:
+            del self._entries[key]
+            self.stats["invalidations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: float, paths: Tuple[str, ...], mtimes: Tuple[Optional[float], ...]):
+        self._entries[key] = CacheEntry(value, time.monotonic() + ttl, paths, mtimes)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get_or_call(self, tool_key: str, arguments: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        """Retorna o resultado cacheado ou executa `call`.
+
+        Resultados com `isError` não são guardados. Ferramentas não cacheáveis
+        invalidam as entradas que tocam os mesmos caminhos.
+        """
+        if not self.is_cacheable(tool_key):
+            tracer.annotate(cache="bypass")
+            try:
+                return await call()
+            finally:
+                self.invalidate_paths(extract_paths(arguments))
+
+        key = canonical_key(tool_key, arguments)
+        entry = self._lookup(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            tracer.annotate(cache="hit")
+            return entry.value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["collapsed"] += 1
+            tracer.annotate(cache="collapsed")
+            return await asyncio.shield(inflight)
+
+        self.stats["misses"] += 1
+        tracer.annotate(cache="miss")
+        paths = extract_paths(arguments)
+        # mtime lido antes da chamada: uma escrita concorrente invalida a entrada
+        mtimes = tuple(_mtime(p) for p in paths)
+        # A chamada é de todos que esperam por ela: nenhum prazo individual a interrompe
+        task = asyncio.ensure_future(without_deadline(call))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        value = await asyncio.shield(task)
+
+        if not getattr(value, "isError", False):
+            self._store(key, value, self.ttl_for(tool_key), paths, mtimes)
+        return value
+
+    def invalidate_paths(self, paths: Iterable[str]):
+        """Remove entradas que tocam (ou contêm) qualquer um dos caminhos"""
+        paths = list(paths)
+        if not paths:
+            return
+        stale = [
+            key for key, entry in self._entries.items()
+            if any(_overlaps(p, q) for p in entry.paths for q in paths)
+        ]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self.stats["invalidations"] += len(stale)
+            logger.info(f"{len(stale)} resultado(s) em cache invalidado(s) por escrita")
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["collapsed"]
+        hit_rate = (self.stats["hits"] + self.stats["collapsed"]) / lookups if lookups else 0.0
+        return {**self.stats, "entries": len(self._entries), "hit_rate": round(hit_rate, 3)}
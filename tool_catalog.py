@@ -0,0 +1,184 @@
+import hashlib
+import json
+import math
+import re
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from text_utils import estimate_tokens, terms
+from tool_info import ToolInfo
+
+# Nomes de função aceitos pela API de tool calling (sem ":")
+FUNCTION_NAME_INVALID = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+@dataclass
+class CompiledTool:
+    """Representações pré-computadas de uma ferramenta para o prompt do planner"""
+    key: str
+    compact: str        # Uma linha: nome, argumentos e descrição curta
+    full: str           # Descrição completa + schema JSON compacto
+    compact_tokens: int
+    full_tokens: int
+    term_counts: Counter
+    length: int
+    function: Dict[str, Any]  # Spec de função no formato OpenAI (tool calling nativo)
+
+
+def _signature(schema: Dict) -> str:
+    properties = schema.get("properties", {}) or {}
+    required = set(schema.get("required", []) or [])
+    args = []
+    for name, prop in properties.items():
+        kind = prop.get("type", "any") if isinstance(prop, dict) else "any"
+        if isinstance(kind, list):
+            kind = "|".join(kind)
+        args.append(f"{name}{'' if name in required else '?'}: {kind}")
+    return ", ".join(args)
+
+
+def _first_sentence(text: str, limit: int = 120) -> str:
+    text = " ".join((text or "").split())
+    sentence = text.split(". ")[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 1] + "…"
+
+
+def function_name(tool_key: str, disambiguate: bool = False) -> str:
+    """`servidor:ferramenta` -> `servidor__ferramenta` (limite de 64 caracteres da API).
+
+    Com `disambiguate`, termina com um hash curto da chave, para chaves
+    diferentes que truncadas (ou com caracteres trocados) dariam o mesmo nome.
+    """
+    name = FUNCTION_NAME_INVALID.sub("_", tool_key.replace(":", "__", 1))
+    if not disambiguate:
+        return name[:64]
+    return f"{name[:55]}_{hashlib.sha1(tool_key.encode()).hexdigest()[:8]}"
+
+
+def compile_tool(tool_key: str, tool: ToolInfo) -> CompiledTool:
+    schema = tool.input_schema or {}
+    compact = f"- {tool_key}({_signature(schema)}): {_first_sentence(tool.description)}"
+    parameters = {
+        "properties": schema.get("properties", {}),
+        "required": schema.get("required", []),
+    }
+    full = (
+        f"**{tool_key}**\n"
+        f"- Descrição: {' '.join((tool.description or '').split())}\n"
+        f"- Parâmetros: {json.dumps(parameters, ensure_ascii=False, separators=(',', ':'))}"
+    )
+
+    properties = schema.get("properties", {}) or {}
+    indexed_text = " ".join([
+        tool_key.replace(":", " "),
+        tool.description or "",
+        " ".join(properties),
+        " ".join(str(prop.get("description", "")) for prop in properties.values() if isinstance(prop, dict)),
+    ])
+    tool_terms = terms(indexed_text)
+    # Nome da ferramenta pesa mais que a descrição
+    tool_terms += terms(tool_key.replace(":", " ")) * 2
+
+    return CompiledTool(
+        key=tool_key,
+        compact=compact,
+        full=full,
+        compact_tokens=estimate_tokens(compact),
+        full_tokens=estimate_tokens(full),
+        term_counts=Counter(tool_terms),
+        length=len(tool_terms),
+        function={
+            "type": "function",
+            "function": {
+                "name": function_name(tool_key),
+                "description": tool.description or "",
+                "parameters": schema or {"type": "object", "properties": {}},
+            },
+        },
+    )
+
+
+class ToolCatalog:
+    """Catálogo de ferramentas compilado uma vez na descoberta.
+
+    Mantém as formas compacta e completa de cada ferramenta e um índice BM25
+    local sobre nomes e descrições, usado para mandar ao planner só as
+    ferramentas relevantes dentro de um orçamento de tokens.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, tools: Dict[str, ToolInfo]):
+        self.tools: List[CompiledTool] = [compile_tool(key, tool) for key, tool in tools.items()]
+        self.avg_length = sum(t.length for t in self.tools) / len(self.tools) if self.tools else 0.0
+        doc_freq: Counter = Counter()
+        for tool in self.tools:
+            doc_freq.update(tool.term_counts.keys())
+        n = len(self.tools)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+        self.by_key = {tool.key: tool for tool in self.tools}
+        # Nomes repetidos ganham o hash da chave; senão a última ferramenta esconderia as outras
+        names = Counter(tool.function["function"]["name"] for tool in self.tools)
+        for tool in self.tools:
+            if names[tool.function["function"]["name"]] > 1:
+                tool.function["function"]["name"] = function_name(tool.key, disambiguate=True)
+        self.by_function = {tool.function["function"]["name"]: tool.key for tool in self.tools}
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+    def score(self, request: str) -> List[float]:
+        query = set(terms(request))
+        scores = []
+        for tool in self.tools:
+            total = 0.0
+            for term in query:
+                tf = tool.term_counts.get(term, 0)
+                if not tf:
+                    continue
+                norm = self.K1 * (1 - self.B + self.B * tool.length / (self.avg_length or 1))
+                total += self.idf[term] * tf * (self.K1 + 1) / (tf + norm)
+            scores.append(total)
+        return scores
+
+    def select(self, request: str, top_k: int = 8) -> List[CompiledTool]:
+        """As `top_k` ferramentas mais relevantes (todas, se o catálogo for pequeno)"""
+        if len(self.tools) <= top_k:
+            return list(self.tools)
+        scores = self.score(request)
+        ranked = sorted(range(len(self.tools)), key=lambda i: scores[i], reverse=True)
+        if scores[ranked[0]] == 0:
+            # Nada casou: mantém a ordem do catálogo e deixa o orçamento decidir
+            return self.tools[:top_k]
+        return [self.tools[i] for i in ranked[:top_k] if scores[i] > 0]
+
+    def render(self, request: str, top_k: int = 8, token_budget: int = 3000) -> str:
+        """Contexto de ferramentas para o planner, limitado a `token_budget` tokens.
+
+        Ferramentas escolhidas entram com schema completo enquanto couber;
+        depois disso, só na forma compacta.
+        """
+        if not self.tools:
+            return "Nenhuma ferramenta disponível."
+
+        parts = []
+        used = 0
+        for tool in self.select(request, top_k):
+            if used + tool.full_tokens <= token_budget:
+                parts.append(tool.full)
+                used += tool.full_tokens
+            elif used + tool.compact_tokens <= token_budget:
+                parts.append(tool.compact)
+                used += tool.compact_tokens
+        return "\n\n".join(parts)
+
+    def function_specs(self, request: str, top_k: int = 8) -> List[Dict[str, Any]]:
+        """Specs de função das ferramentas relevantes, para `tools=` na chamada ao LLM"""
+        return [tool.function for tool in self.select(request, top_k)]
+
+    def resolve_function(self, name: str) -> Optional[str]:
+        """Nome de função devolvido pelo modelo -> chave `servidor:ferramenta`"""
+        return self.by_function.get(name)
@@ -1,5 +1,5 @@
 
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from dataclasses import dataclass
 
 @dataclass
@@ -8,4 +8,5 @@ class ToolInfo:
     name: str
     description: str
     input_schema: Dict[str, Any]
-    server_name: str
\ No newline at end of file
+    server_name: str
+    annotations: Optional[Dict[str, Any]] = None  # Dicas MCP (readOnlyHint, destructiveHint, ...)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Tracing leve por estágio do Agent (spans com contextvars)
+Exporta para JSONL e para OTLP/JSON; `python tracing.py summary <arquivo>` mostra p50/p95/p99
+"""
+import argparse
+import contextvars
+import json
+import logging
+import math
+import os
+import secrets
+import sys
+import threading
+import time
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Deque, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger("mcp-groq-client")
+
+T = TypeVar("T")
+
+
+@dataclass
+class Span:
+    """Um estágio cronometrado (planejamento, chamada de ferramenta, ...)"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["duration_ms"] = round(self.duration_ms, 3)
+        return data
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class JsonlExporter:
+    """Um span por linha, no formato de `Span.to_dict()`"""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def serialize(self, span: Span) -> Dict[str, Any]:
+        return span.to_dict()
+
+    def export(self, span: Span):
+        line = json.dumps(self.serialize(span), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class OtlpJsonExporter(JsonlExporter):
+    """Um ExportTraceServiceRequest OTLP/JSON por linha (lido pelo receiver `otlpjsonfile` do Collector)"""
+
+    def __init__(self, path: str, service_name: str = "groq-mcp-agent"):
+        super().__init__(path)
+        self.service_name = service_name
+
+    @staticmethod
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def serialize(self, span: Span) -> Dict[str, Any]:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": self._value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 1 if span.status == "ok" else 2},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "groq_mcp_agent"}, "spans": [otlp_span]}],
+            }]
+        }
+
+
+class Tracer:
+    """Cria spans aninhados via contextvars (funciona através de tasks asyncio)"""
+
+    def __init__(self, keep_last: int = 10000):
+        self.exporters: List[Any] = []
+        self.recent: Deque[Span] = deque(maxlen=keep_last)
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """Abre um span sem torná-lo corrente (útil em geradores assíncronos)"""
+        parent = parent or _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=dict(attributes),
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        if error is not None:
+            span.status = "error"
+            span.attributes.setdefault("error", repr(error))
+        span.end_ns = time.time_ns()
+        self._finish(span)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes) -> Iterator[Span]:
+        """Span corrente durante o bloco; não use com `yield` dentro do bloco"""
+        span = self.start_span(name, parent, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current_span.reset(token)
+            self.end_span(span, e)
+            raise
+        _current_span.reset(token)
+        self.end_span(span)
+
+    async def activate(self, span: Span, coro: Awaitable[T]) -> T:
+        """Executa `coro` com `span` como corrente (ex.: dentro de uma task nova)"""
+        token = _current_span.set(span)
+        try:
+            return await coro
+        finally:
+            _current_span.reset(token)
+
+    def annotate(self, **attributes):
+        """Adiciona atributos ao span corrente (se houver)"""
+        span = _current_span.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def _finish(self, span: Span):
+        self.recent.append(span)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.warning(f"Falha ao exportar span {span.name}: {e}")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return summarize(span.to_dict() for span in self.recent)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters.clear()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(spans: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Contagem e p50/p95/p99 (ms) por estágio"""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for span in spans:
+        durations[span["name"]].append(span["duration_ms"])
+    return {
+        name: {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+def format_summary(summary: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'estágio':<22}{'n':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}"]
+    for name, stats in summary.items():
+        lines.append(
+            f"{name:<22}{stats['count']:>7}{stats['p50']:>11.1f}{stats['p95']:>11.1f}{stats['p99']:>11.1f}"
+        )
+    return "\n".join(lines)
+
+
+def load_spans(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Tracer global do processo; exportadores configurados por variável de ambiente
+tracer = Tracer()
+if os.getenv("AGENT_TRACE_JSONL"):
+    tracer.add_exporter(JsonlExporter(os.environ["AGENT_TRACE_JSONL"]))
+if os.getenv("AGENT_TRACE_OTLP"):
+    tracer.add_exporter(OtlpJsonExporter(os.environ["AGENT_TRACE_OTLP"]))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Resumo de latência por estágio a partir de traces JSONL")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="Mostra p50/p95/p99 por estágio")
+    summary_parser.add_argument("path", help="Arquivo JSONL gerado com AGENT_TRACE_JSONL")
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        print(format_summary(summarize(load_spans(args.path))))
+
+
+if __name__ == "__main__":
+    sys.exit(main())